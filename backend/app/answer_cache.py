@@ -0,0 +1,219 @@
+# backend/app/answer_cache.py
+"""
+语义答案缓存
+- HashingEmbedder：本地哈希向量（词 + 中文二元组，特征哈希），不依赖网络和模型
+- SemanticAnswerCache：余弦相似度超过阈值、且未过期的历史答案直接复用
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import uuid
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from .database import SessionLocal
+from .state import state_backend
+from .models import AnswerCacheEntry, utcnow
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_CJK_RUN_PATTERN = re.compile(r"[一-鿿]+")
+
+# 常见虚词，不参与相似度计算
+_STOPWORDS = {
+    "a", "an", "the", "of", "on", "in", "for", "to", "and", "or", "with", "about", "is", "are",
+    "me", "please", "find", "show", "what", "latest", "recent", "papers", "paper",
+}
+
+
+def normalize_question(question: str) -> str:
+    """归一化问题文本：小写、压缩空白"""
+    return " ".join(question.lower().split())
+
+
+class HashingEmbedder:
+    """特征哈希向量：英文按词、中文按二元组切分，TF 取对数后哈希到固定维度并做 L2 归一化"""
+
+    def __init__(self, dim: int = 2 ** 18):
+        self.dim = dim
+
+    def tokens(self, text: str) -> List[str]:
+        text = normalize_question(text)
+        tokens = [w for w in _WORD_PATTERN.findall(text) if w not in _STOPWORDS]
+        for run in _CJK_RUN_PATTERN.findall(text):
+            tokens.extend(run[i:i + 2] for i in range(max(len(run) - 1, 1)))
+        return tokens
+
+    def embed(self, text: str) -> Dict[int, float]:
+        counts = Counter(self.tokens(text))
+        vector: Dict[int, float] = {}
+        for token, count in counts.items():
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            index = value % self.dim
+            sign = 1.0 if (value >> 63) & 1 else -1.0
+            vector[index] = vector.get(index, 0.0) + sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {k: v / norm for k, v in vector.items()} if norm else {}
+
+    @staticmethod
+    def similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存
+    条目持久化在 answer_cache 表中，启动后首次使用时载入内存；查询为内存中的线性扫描
+    多 worker 部署时，写入方更新共享状态中的版本号，其他 worker 查询前发现版本变化即重新载入
+    """
+
+    VERSION_KEY = "answer_cache:version"
+
+    def __init__(
+        self,
+        enabled: bool,
+        threshold: float,
+        ttl_seconds: int,
+        max_entries: int,
+        embedder: Optional[HashingEmbedder] = None,
+        session_factory=SessionLocal,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedder = embedder or HashingEmbedder()
+        self.session_factory = session_factory
+        # 内存条目：(创建时间, 向量, 答案)
+        self._entries: List[Tuple[Any, Dict[int, float], Dict[str, Any]]] = []
+        self._loaded = False
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        # 查询与写入在工作线程中执行（alookup/astore），计数需要加锁
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中/写入次数"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _load(self) -> None:
+        """首次使用时从数据库载入未过期的条目"""
+        if self._loaded:
+            return
+        expired_before = utcnow() - timedelta(seconds=self.ttl_seconds)
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(AnswerCacheEntry)
+                .where(AnswerCacheEntry.created_at >= expired_before)
+                .order_by(AnswerCacheEntry.created_at.desc())
+                .limit(self.max_entries)
+            ).scalars().all()
+        entries = []
+        for row in reversed(rows):
+            vector = {int(k): v for k, v in json.loads(row.embedding).items()}
+            entries.append((row.created_at, vector, {
+                "content": row.content,
+                "tool_calls": row.tool_calls,
+                "tool_results": row.tool_results,
+            }))
+        with self._lock:
+            if not self._loaded:
+                self._entries = entries
+                self._loaded = True
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """返回相似度最高且超过阈值、未过期的缓存答案"""
+        self._load()
+        vector = self.embedder.embed(question)
+        if not vector:
+            return None
+        expired_before = utcnow() - timedelta(seconds=self.ttl_seconds)
+        best, best_score = None, self.threshold
+        with self._lock:
+            self._entries = [e for e in self._entries if e[0] >= expired_before]
+            for _, cached_vector, response in self._entries:
+                score = self.embedder.similarity(vector, cached_vector)
+                if score >= best_score:
+                    best, best_score = response, score
+        if best is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        logger.info(f"语义答案缓存命中，相似度 {best_score:.3f}")
+        return best
+
+    def store(self, question: str, response: Dict[str, Any]) -> None:
+        """保存一次完整的Agent回答"""
+        self._load()
+        vector = self.embedder.embed(question)
+        if not vector or not response.get("content"):
+            return
+        now = utcnow()
+        cached = {
+            "content": response["content"],
+            "tool_calls": response.get("tool_calls"),
+            "tool_results": response.get("tool_results"),
+        }
+        with self._lock:
+            self._entries.append((now, vector, cached))
+            del self._entries[:-self.max_entries]
+        self._count("stores")
+        try:
+            with self.session_factory() as db:
+                db.add(AnswerCacheEntry(
+                    question=normalize_question(question),
+                    embedding=json.dumps(vector),
+                    created_at=now,
+                    **cached,
+                ))
+                expired_before = now - timedelta(seconds=self.ttl_seconds)
+                db.execute(delete(AnswerCacheEntry).where(AnswerCacheEntry.created_at < expired_before))
+                db.commit()
+        except Exception as e:
+            logger.warning(f"语义答案缓存写入失败: {e}")
+
+    async def _sync_version(self) -> None:
+        """共享版本号变化说明其他 worker 写入了新条目，下次查询前重新载入"""
+        if not state_backend.shared:
+            return
+        try:
+            version = await state_backend.get(self.VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"读取答案缓存版本失败: {e}")
+            return
+        if version != self._version:
+            with self._lock:
+                self._loaded = False
+            self._version = version
+
+    async def alookup(self, question: str) -> Optional[Dict[str, Any]]:
+        await self._sync_version()
+        return await asyncio.to_thread(self.lookup, question)
+
+    async def astore(self, question: str, response: Dict[str, Any]) -> None:
+        await self._sync_version()
+        await asyncio.to_thread(self.store, question, response)
+        if state_backend.shared:
+            version = uuid.uuid4().hex
+            try:
+                await state_backend.set(self.VERSION_KEY, version)
+                self._version = version
+            except Exception as e:
+                logger.warning(f"更新答案缓存版本失败: {e}")
@@ -1,26 +1,152 @@
 # backend/app/crud.py
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from fastapi import HTTPException, Depends,APIRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import datetime
+from fastapi import HTTPException, Depends, APIRouter, Query, Response, Header
+import asyncio
+import hashlib
 import logging
 import json
+import time
 from app.services import agent_service
 logger = logging.getLogger(__name__)
 
-from app.database import get_db
+from app.database import get_async_db, AsyncSessionLocal
 from app import crud
+from app.papers import asearch_papers
+from app.search import SearchOrder, asearch_messages
+from app.metrics import TurnMetrics
+from app.config import settings
+from app.streaming import DONE_FRAME, coalesce, encode_frame
+from app.turns import StreamTurn, follow_shared, stream_turns
+from app.state import state_backend
+from app.jobs import job_queue
+from app.batch import BatchRun
+from app.scheduler import AdmissionRejected, AdmissionTicket, agent_scheduler
+from app.models import generate_uuid, utcnow
 from app.schemas import (
     SessionCreate, 
     SessionResponse, 
+    SessionSummaryResponse,
     MessageResponse,
     MessageCreate,
+    MessageSearchHit,
     SessionUpdate,
+    SessionWatermark,
     ChatRequest,
-    ChatResponse
+    ChatResponse,
+    BatchRequest,
+    BatchResult,
+    BatchSummary,
+    JobResponse,
+    PaperResponse,
+    TokenUsage,
+    ToolInvocationResponse,
+    ToolUsageStats
 )
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
+papers_router = APIRouter(prefix="/api/papers", tags=["papers"])
+
+def _set_next_cursor(response: Response, items: list, limit: Optional[int]) -> None:
+    """本页已满时，通过 X-Next-Cursor 响应头返回下一页游标"""
+    cursor = crud.next_cursor(items, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+# ===================== 条件请求与增量同步 =====================
+def _etag(*parts) -> str:
+    """由决定响应内容的各部分生成弱 ETag"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+def _not_modified(if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """If-None-Match 命中时返回 304 响应（弱比较），否则返回 None"""
+    if not if_none_match:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def _watermark_etag(watermark, *parts) -> str:
+    """会话类响应的 ETag：消息只追加不修改，会话水位不变即内容不变"""
+    return _etag(
+        watermark.id, watermark.updated_at, watermark.message_count,
+        watermark.last_message_at, watermark.last_message_id, *parts
+    )
+
+def _sync_cursor(messages: list, after: Optional[str]) -> Optional[str]:
+    """增量同步游标：本次返回的最后一条消息；没有新消息时原样返回请求中的游标"""
+    if messages:
+        return crud.encode_cursor(messages[-1].created_at, messages[-1].id)
+    return after
+
+def _session_response(db_session, messages=None) -> SessionResponse:
+    """组装会话响应，显式传入消息，避免在异步会话中懒加载 messages 关系"""
+    return SessionResponse(
+        id=db_session.id,
+        title=db_session.title,
+        created_at=db_session.created_at,
+        updated_at=db_session.updated_at,
+        messages=[MessageResponse.model_validate(m) for m in (messages or [])]
+    )
+
+# 消息接口中工具结果的返回方式：exclude 不返回（只有 tool_calls 简要列表）、truncate 返回开头一段、full 完整返回
+ToolPayloads = Literal["exclude", "truncate", "full"]
+
+async def _message_responses(db: AsyncSession, messages, tool_payloads: ToolPayloads = "exclude") -> List[MessageResponse]:
+    """组装消息响应；需要工具结果时一次查询取回本页 assistant 消息的调用记录"""
+    responses = [MessageResponse.model_validate(m) for m in messages]
+    if tool_payloads == "exclude":
+        return responses
+    invocations = await crud.aget_tool_invocations(
+        db,
+        [m.id for m in responses if m.role == "assistant"],
+        max_result_chars=settings.tool_payload_truncate_chars if tool_payloads == "truncate" else None,
+    )
+    for response in responses:
+        if response.id in invocations:
+            response.tool_invocations = [ToolInvocationResponse(**record) for record in invocations[response.id]]
+    return responses
+
+def _use_cache(chat_request: ChatRequest, db_session) -> bool:
+    """请求或会话任一方要求绕过时，不使用语义答案缓存"""
+    return not (chat_request.bypass_cache or db_session.answer_cache_bypass)
+
+def _admission_error(e: AdmissionRejected) -> HTTPException:
+    """准入被拒绝时返回 503，并提示客户端多久后重试"""
+    return HTTPException(status_code=503, detail=f"服务繁忙：{e.reason}", headers={"Retry-After": str(e.retry_after)})
+
+async def _build_history(db: AsyncSession, db_session) -> List[dict]:
+    """
+    组装发送给Agent的历史：只读取摘要游标之后的消息，
+    由上下文管理器控制在 token 预算内，必要时把更早的轮次折叠进摘要并持久化
+    """
+    history_messages = await crud.aget_messages_by_session(db, db_session.id, cursor=db_session.summary_cursor)
+    # 一次查询取回这些消息的工具调用记录，重建历史时与 ToolMessage 配对
+    invocations = await crud.aget_tool_invocations(
+        db, [msg.id for msg in history_messages if msg.role == "assistant"]
+    )
+    history = []
+    for msg in history_messages:
+        history.append({
+            "id": msg.id,
+            "created_at": msg.created_at,
+            "role": msg.role,
+            "content": msg.content,
+            "tool_invocations": invocations.get(msg.id)
+        })
+
+    window = await agent_service.context_manager.prepare(history, db_session.summary)
+    if window["summary_updated"]:
+        through = window["summarized_through"]
+        await crud.aupdate_session_summary(
+            db, db_session.id, window["summary"], crud.encode_cursor(through["created_at"], through["id"])
+        )
+    logger.info(f"历史消息 {len(history)} 条，发送给模型 {len(window['history'])} 条，约 {window['prompt_tokens']} tokens")
+    return window["history"]
 
 # ===================== 会话相关 API =====================
 
@@ -28,82 +154,130 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 @router.post("/sessions", response_model=SessionResponse)
 async def create_session(
     session_create: SessionCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> SessionResponse:
     """创建一个新的聊天会话"""
-    db_session = crud.create_session(db, session_create)
-    return db_session
+    db_session = await crud.acreate_session(db, session_create)
+    return _session_response(db_session)
 
 # get=>read
-@router.get("/sessions", response_model=List[SessionResponse])
+@router.get("/sessions", response_model=List[SessionSummaryResponse])
 async def get_sessions(
-    db: Session = Depends(get_db)
-) -> List[SessionResponse]:
-    """获取所有聊天会话"""
-    db_sessions = crud.get_sessions(db)
-    return db_sessions
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[SessionSummaryResponse]:
+    """
+    获取聊天会话摘要列表（不含消息内容，支持游标分页，下一页游标在 X-Next-Cursor 响应头中）
+    带 If-None-Match 且列表没有变化时返回 304
+    """
+    try:
+        summaries = await crud.aget_session_summaries(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = _etag("sessions", limit, cursor, *(
+        (row.id, row.title, row.updated_at, row.message_count, row.last_message_at) for row in summaries
+    ))
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    _set_next_cursor(response, summaries, limit)
+    return [SessionSummaryResponse.model_validate(row) for row in summaries]
 
 @router.get("/sessions/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: str, 
-    db: Session = Depends(get_db)
+    response: Response,
+    tool_payloads: ToolPayloads = "exclude",
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ) -> SessionResponse:
-    """根据ID获取聊天会话"""
-    db_session = crud.get_session(db, session_id)
-    if not db_session:
+    """
+    根据ID获取聊天会话（tool_payloads 控制是否附带工具调用结果：exclude / truncate / full）
+    带 If-None-Match 且会话没有变化时返回 304（只查询会话水位，不读取消息）；
+    X-Sync-Cursor 响应头为最后一条消息的游标，之后用 messages?after= 增量拉取
+    """
+    watermark = await crud.aget_session_watermark(db, session_id)
+    if not watermark:
         raise HTTPException(status_code=404, detail="会话未找到")
-    
+    etag = _watermark_etag(watermark, "session", tool_payloads)
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified:
+        return not_modified
+
+    db_session = await crud.aget_session(db, session_id)
     # 获取关联的消息
-    messages=crud.get_messages_by_session(db, session_id)
-    db_session.messages=messages
+    messages = await crud.aget_messages_by_session(db, session_id)
+    response.headers["ETag"] = etag
+    sync_cursor = _sync_cursor(messages, None)
+    if sync_cursor:
+        response.headers["X-Sync-Cursor"] = sync_cursor
+    return _session_response(db_session, await _message_responses(db, messages, tool_payloads))
 
-    return db_session
+@router.get("/sessions/{session_id}/watermark", response_model=SessionWatermark)
+async def get_session_watermark(
+    session_id: str,
+    db: AsyncSession = Depends(get_async_db)
+) -> SessionWatermark:
+    """会话的变更水位：只有 updated_at / 消息数 / 最后一条消息游标，用于判断是否需要增量拉取"""
+    watermark = await crud.aget_session_watermark(db, session_id)
+    if not watermark:
+        raise HTTPException(status_code=404, detail="会话未找到")
+    last_message_at = watermark.last_message_at
+    return SessionWatermark(
+        session_id=watermark.id,
+        updated_at=watermark.updated_at,
+        message_count=watermark.message_count,
+        last_message_at=last_message_at,
+        cursor=crud.encode_cursor(last_message_at, watermark.last_message_id) if last_message_at else None,
+    )
 
 # put=>update
 @router.put("/sessions/{session_id}", response_model=SessionResponse)
 async def update_session(
     session_id: str, 
     session_update: SessionUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> SessionResponse:
     """更新聊天会话的标题"""
-    db_session = crud.update_session(db, session_id, session_update)
+    db_session = await crud.aupdate_session(db, session_id, session_update)
     if not db_session:
         raise HTTPException(status_code=404, detail="会话未找到")
     # 获取关联的消息
-    messages=crud.get_messages_by_session(db, session_id)
-    db_session.messages=messages
-    return db_session
+    messages = await crud.aget_messages_by_session(db, session_id)
+    return _session_response(db_session, messages)
 
 # patch=>partial update
 @router.patch("/sessions/{session_id}", response_model=SessionResponse)
 async def patch_session(
     session_id: str,
     update_data: SessionUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """部分更新会话信息（PATCH方法）"""
-    session = crud.get_session(db, session_id)
+    session = await crud.aget_session(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    updated_session = crud.update_session(db, session_id, update_data)
+    updated_session = await crud.aupdate_session(db, session_id, update_data)
     if not updated_session:
         raise HTTPException(status_code=500, detail="Failed to update session")
     
-    messages = crud.get_messages_by_session(db, session_id)
-    updated_session.messages = messages
+    messages = await crud.aget_messages_by_session(db, session_id)
     
-    return updated_session
+    return _session_response(updated_session, messages)
 
 # delete=>delete
 @router.delete("/sessions/{session_id}", response_model=dict)
 async def delete_session(
     session_id: str, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> dict:
     """删除聊天会话及其关联的消息"""
-    success = crud.delete_session(db, session_id)
+    success = await crud.adelete_session(db, session_id)
     if not success:
         raise HTTPException(status_code=404, detail="会话未找到")
     return {"detail": "会话已删除"}
@@ -112,17 +286,97 @@ async def delete_session(
 @router.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
 async def get_messages_by_session(
     session_id: str, 
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    after: Optional[str] = Query(None, description="增量同步：只返回该游标之后的消息"),
+    tool_payloads: ToolPayloads = "exclude",
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ) -> List[MessageResponse]:
-    """根据会话ID获取所有关联的聊天消息"""
-    messages = crud.get_messages_by_session(db, session_id)
-    return messages
+    """
+    根据会话ID获取关联的聊天消息（支持游标分页，下一页游标在 X-Next-Cursor 响应头中）
+    tool_payloads 控制是否附带工具调用结果：exclude（默认）/ truncate / full
+    增量同步：after 为上次响应 X-Sync-Cursor 中的游标，只返回之后新增的消息，
+    耗时与新消息数量成正比；没有新消息且带 If-None-Match 时返回 304
+    """
+    if cursor and after:
+        raise HTTPException(status_code=400, detail="cursor 与 after 不能同时使用")
+    watermark = await crud.aget_session_watermark(db, session_id)
+    etag = _watermark_etag(watermark, "messages", limit, cursor or after, tool_payloads) if watermark else None
+    not_modified = _not_modified(if_none_match, etag) if etag else None
+    if not_modified:
+        return not_modified
+
+    try:
+        messages = await crud.aget_messages_by_session(db, session_id, limit, cursor or after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if etag:
+        response.headers["ETag"] = etag
+    _set_next_cursor(response, messages, limit)
+    sync_cursor = _sync_cursor(messages, cursor or after)
+    if sync_cursor:
+        response.headers["X-Sync-Cursor"] = sync_cursor
+    return await _message_responses(db, messages, tool_payloads)
+
+
+@router.get("/messages/{message_id}/tools", response_model=List[ToolInvocationResponse])
+async def get_message_tools(
+    message_id: str,
+    db: AsyncSession = Depends(get_async_db)
+) -> List[ToolInvocationResponse]:
+    """获取一条 assistant 消息的工具调用记录（参数、结果、耗时、状态）"""
+    message = await crud.aget_message(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="消息不存在")
+    invocations = await crud.aget_tool_invocations(db, [message_id])
+    return invocations.get(message_id, [])
+
+@router.get("/tools/stats", response_model=List[ToolUsageStats])
+async def get_tool_stats(
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+) -> List[ToolUsageStats]:
+    """按工具汇总调用次数、失败次数与耗时（可用 since 限定起始时间）"""
+    rows = await crud.atool_usage_stats(db, since)
+    return [ToolUsageStats.model_validate(row._asdict()) for row in rows]
+
+
+@router.get("/search", response_model=List[MessageSearchHit])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    order: SearchOrder = "relevance",
+    session_id: Optional[str] = None,
+    role: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+) -> List[MessageSearchHit]:
+    """
+    在全部会话历史中全文检索（消息正文与工具结果中的论文标题）
+    多个词之间为 AND，引号内为短语，以 * 结尾的词按前缀匹配；order=relevance 按相关度，recent 按时间倒序
+    下一页游标在 X-Next-Cursor 响应头中
+    relevance 只对最近的 X-Search-Rank-Window 条命中排序；命中超出该数量时返回 X-Search-Truncated: true，
+    更早的命中不会出现在结果中，需要时改用 recent 遍历
+    """
+    try:
+        hits, next_page, truncated = await asearch_messages(db, q, limit, cursor, order, session_id, role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_page:
+        response.headers["X-Next-Cursor"] = next_page
+    if order == "relevance":
+        response.headers["X-Search-Rank-Window"] = str(settings.search_rank_window)
+        response.headers["X-Search-Truncated"] = "true" if truncated else "false"
+    return [MessageSearchHit.model_validate(hit._asdict()) for hit in hits]
 
 
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     chat_request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """发送消息（非流式）"""
     logger.info("api.py - send_message - 用户发送非流式消息")
@@ -135,53 +389,74 @@ async def send_message(
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id不能为空")
     
-    # 获取历史消息
-    history_messages = crud.get_messages_by_session(db, session_id)
-    history = []
-    for msg in history_messages:
-        history.append({
-            "role": msg.role,
-            "content": msg.content,
-            "tool_calls": msg.tool_calls,
-            "tool_results": msg.tool_results
-        })
-    logger.info(f"本会话历史消息数量: {len(history)}")
-    
-    # 保存用户消息
-    logger.info("保存用户消息到数据库")
-    user_message = crud.create_message(db, MessageCreate(
-        session_id=session_id,
-        role="user",
-        content=chat_request.message
-    ))
-    
-    # 使用Agent处理消息
-    logger.info("调用Agent处理消息")
-    agent_response = await agent_service.process_message(
-        chat_request.message, 
-        history
-    )
-    
-    # 保存Assistant消息
-    logger.info("保存Assistant消息到数据库")
-    assistant_message = crud.create_message(db, MessageCreate(
-        session_id=session_id,
-        role="assistant",
-        content=agent_response["content"],
-        tool_calls=agent_response["tool_calls"],
-        tool_results=agent_response["tool_results"]
-    ))
-    logger.info("Assistant消息保存完成")
+    turn = TurnMetrics("/message").activate()
+    status = "error"
+    # 用户消息与 assistant 消息在回答完成后一起写入，消息时间仍为收到请求的时间
+    received_at = utcnow()
+    try:
+        # 同一会话的轮次串行执行，并受全局并发上限约束
+        async with agent_scheduler.admit(session_id, "/message") as ticket:
+            turn.phases["admission_wait"] = ticket.waited
+            # 检查会话是否存在（同时取得滚动摘要）
+            with turn.phase("history_load"):
+                session = await crud.aget_session(db, session_id)
+                if not session:
+                    raise HTTPException(status_code=404, detail="会话不存在")
+            
+                # 获取历史消息（摘要 + token 预算内的最近轮次）
+                history = await _build_history(db, session)
+            logger.info(f"本会话历史消息数量: {len(history)}")
+        
+            # 使用Agent处理消息
+            logger.info("调用Agent处理消息")
+            with turn.phase("agent_run"):
+                agent_response = await agent_service.process_message(
+                    chat_request.message, 
+                    history,
+                    use_cache=_use_cache(chat_request, session)
+                )
+        
+            # 一个事务保存本轮的用户消息与Assistant消息
+            logger.info("保存本轮消息到数据库")
+            with turn.phase("final_db_write"):
+                try:
+                    _, assistant_message = await crud.acreate_messages(db, [
+                        MessageCreate(
+                            session_id=session_id,
+                            role="user",
+                            content=chat_request.message,
+                            created_at=received_at
+                        ),
+                        MessageCreate(
+                            session_id=session_id,
+                            role="assistant",
+                            content=agent_response["content"],
+                            tool_calls=agent_response["tool_calls"],
+                            tool_invocations=agent_response.get("tool_invocations")
+                        ),
+                    ])
+                except ValueError:
+                    # 生成期间会话被删除
+                    raise HTTPException(status_code=404, detail="会话不存在")
+            logger.info("本轮消息保存完成")
+            status = "success"
+    except AdmissionRejected as e:
+        status = "rejected"
+        raise _admission_error(e)
+    finally:
+        turn.finish(status)
     return ChatResponse(
         session_id=session_id,
         message=assistant_message,
-        is_complete=True
+        is_complete=True,
+        from_cache=agent_response.get("from_cache", False),
+        usage=TokenUsage(**turn.usage())
     )
 
 @router.post("/stream")
 async def stream_message_post(
     chat_request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """流式发送消息（POST方法）- 真正的流式处理"""
     logger.info("Received streaming chat request via POST")
@@ -194,93 +469,208 @@ async def stream_message_post(
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id不能为空")
     
-    # 检查会话是否存在
-    session = crud.get_session(db, session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="会话不存在")
+    turn = TurnMetrics("/stream")
     
-    # 保存用户消息
-    user_message = crud.create_message(db, MessageCreate(
-        session_id=session_id,
-        role="user",
-        content=chat_request.message
-    ))
+    # 同一会话的轮次串行执行，并受全局并发上限约束；名额在后台生成结束时释放
+    try:
+        ticket = await agent_scheduler.acquire(session_id, "/stream")
+    except AdmissionRejected as e:
+        turn.finish("rejected")
+        raise _admission_error(e)
+    turn.phases["admission_wait"] = ticket.waited
     
-    # 获取历史消息（排除刚添加的用户消息）
-    history_messages = crud.get_messages_by_session(db, session_id)
-    history = []
-    for msg in history_messages[:-1]:  # 排除刚添加的用户消息
-        history.append({
-            "role": msg.role,
-            "content": msg.content,
-            "tool_calls": msg.tool_calls,
-            "tool_results": msg.tool_results
-        })
+    try:
+        # 检查会话是否存在
+        with turn.phase("history_load"):
+            session = await crud.aget_session(db, session_id)
+            if not session:
+                raise HTTPException(status_code=404, detail="会话不存在")
+        
+            # 获取历史消息（摘要 + token 预算内的最近轮次，不含本轮用户消息）
+            history = await _build_history(db, session)
     
-    async def generate():
-        logger.info("Starting real stream generation")
-        logger.info(f"消息: {chat_request.message}")
-        logger.info(f"会话ID: {session_id}")
-        logger.info(f"历史消息数量: {len(history)}")
+        # 保存用户消息
+        with turn.phase("user_message_insert"):
+            user_message = await crud.acreate_message(db, MessageCreate(
+                session_id=session_id,
+                role="user",
+                content=chat_request.message
+            ))
+        use_cache = _use_cache(chat_request, session)
+        window_ms = chat_request.coalesce_ms if chat_request.coalesce_ms is not None else settings.stream_coalesce_ms
+        max_chars = chat_request.coalesce_chars if chat_request.coalesce_chars is not None else settings.stream_coalesce_chars
+        db_turn = await crud.acreate_turn(db, session_id)
+        # 释放请求级会话占用的连接，流式生成期间不占用连接池
+        await db.close()
+    except BaseException:
+        await agent_scheduler.release(ticket)
+        raise
+    
+    # 生成过程在后台任务中运行，与 HTTP 连接解耦：客户端断开后继续生成直到完成，且只运行一次
+    stream_turn = StreamTurn(db_turn.id, session_id)
+    stream_turns.start(
+        stream_turn,
+        _run_stream_turn(stream_turn, chat_request, history, use_cache, window_ms, max_chars, turn, ticket),
+    )
+    return _event_stream_response(stream_turn.subscribe(0), stream_turn.id)
+
+
+async def _run_stream_turn(
+    stream_turn: StreamTurn,
+    chat_request: ChatRequest,
+    history: List[dict],
+    use_cache: bool,
+    window_ms: int,
+    max_chars: int,
+    turn: TurnMetrics,
+    ticket: AdmissionTicket,
+) -> None:
+    """后台生成一轮回答：发布事件、定期保存检查点，结束时写入 assistant 消息"""
+    session_id = stream_turn.session_id
+    logger.info(f"开始流式生成，轮次 {stream_turn.id}，历史消息数量: {len(history)}")
+    
+    # 在生成任务的上下文中激活，工具中间件和 services 才能记录到本轮
+    turn.activate()
+    status = "error"
+    # 定期保存部分答案并刷新心跳（工具调用、模型规划期间没有新内容时也刷新），
+    # 进程重启后可从检查点恢复，其他进程也不会把仍在运行的轮次判定为中断
+    checkpointer = asyncio.create_task(_checkpoint_stream_turn(stream_turn))
+    try:
+        tool_calls_data = None
+        tool_invocations = None
+        from_cache = False
+        agent_started = time.perf_counter()
         
-        try:
-            full_content = ""
-            tool_calls_data = None
-            
-            logger.info("开始调用agent_service.process_stream...")
+        # 使用真正的流式处理，相邻 token 按窗口合并为一帧
+        async for chunk in coalesce(
+            agent_service.process_stream(chat_request.message, history, use_cache=use_cache),
+            window_ms=max(window_ms, 0),
+            max_chars=max(max_chars, 0),
+        ):
+            if chunk["is_final"]:
+                # process_stream 出错时在最终块中带 error，按失败处理（轮次标记为 failed，发布错误）
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                # 最终块，包含工具调用信息
+                tool_calls_data = chunk.get("tool_calls")
+                tool_invocations = chunk.get("tool_invocations")
+                from_cache = chunk.get("from_cache", False)
+                logger.info(f"收到最终块，工具调用: {tool_calls_data}")
+                turn.phases["agent_run"] = time.perf_counter() - agent_started
+                continue
             
-            # 使用真正的流式处理
-            async for chunk in agent_service.process_stream(
-                chat_request.message, 
-                history
-            ):
-                if chunk["is_final"]:
-                    # 最终块，包含工具调用信息
-                    tool_calls_data = chunk.get("tool_calls")
-                    logger.info(f"收到最终块，工具调用: {tool_calls_data}")
-                    
-                    # 保存完整的Assistant消息到数据库
-                    if full_content:
-                        assistant_message = crud.create_message(db, MessageCreate(
-                            session_id=session_id,
-                            role="assistant",
-                            content=full_content,
-                            tool_calls=json.dumps(tool_calls_data) if tool_calls_data else None
-                        ))
-                        logger.info(f"Assistant消息保存成功，ID: {assistant_message.id}")
-                    
-                    # 发送最终消息
-                    final_data = {
-                        "content": "",
-                        "is_final": True,
-                        "tool_calls": tool_calls_data
-                    }
-                    yield f"data: {json.dumps(final_data)}\n\n"
-                else:
-                    # 内容块
-                    content_chunk = chunk.get("content", "")
-                    if content_chunk:
-                        full_content += content_chunk
-                        
-                        # 发送内容块
-                        chunk_data = {
-                            "content": content_chunk,
-                            "is_final": False
-                        }
-                        yield f"data: {json.dumps(chunk_data)}\n\n"
-                
+            # 内容块
+            content_chunk = chunk.get("content", "")
+            if content_chunk:
+                turn.mark_first_token()
+                await stream_turn.publish({"content": content_chunk, "is_final": False})
+        
+        # 保存完整的Assistant消息到数据库（轮次仍为 running 时）
+        checkpointer.cancel()
+        full_content = stream_turn.content
+        tool_calls_json = json.dumps(tool_calls_data) if tool_calls_data else None
+        with turn.phase("final_db_write"):
+            async with AsyncSessionLocal() as write_db:
+                finished = await crud.afinish_turn(
+                    write_db, stream_turn.id, "completed", full_content, stream_turn.offset + 1,
+                    tool_calls=tool_calls_json, from_cache=from_cache,
+                    message=MessageCreate(
+                        session_id=session_id,
+                        role="assistant",
+                        content=full_content,
+                        tool_calls=tool_calls_json,
+                        tool_invocations=tool_invocations
+                    ) if full_content else None
+                )
+        if not finished:
+            logger.warning(f"轮次 {stream_turn.id} 已被标记为中断，不再保存 assistant 消息")
+        status = "success"
+        
+        # 发送最终消息
+        await stream_turn.publish({
+            "content": "",
+            "is_final": True,
+            "tool_calls": tool_calls_data,
+            "from_cache": from_cache,
+            "usage": turn.usage(),
+            "turn_id": stream_turn.id
+        }, final=True)
+    
+    except Exception as e:
+        logger.error(f"流式处理异常: {e}", exc_info=True)
+        async with AsyncSessionLocal() as write_db:
+            await crud.afinish_turn(write_db, stream_turn.id, "failed", stream_turn.content, stream_turn.offset + 1)
+        await stream_turn.publish({
+            "content": f"错误: {str(e)}",
+            "is_final": True,
+            "tool_calls": None,
+            "turn_id": stream_turn.id
+        }, final=True)
+    finally:
+        checkpointer.cancel()
+        await agent_scheduler.release(ticket)
+        turn.finish(status)
+        await stream_turn.close()
+        logger.info(f"流式生成结束，轮次 {stream_turn.id}")
+
+
+async def _checkpoint_stream_turn(stream_turn: StreamTurn) -> None:
+    """每 STREAM_CHECKPOINT_SECONDS 保存一次部分答案（同时作为轮次仍在运行的心跳）"""
+    while True:
+        await asyncio.sleep(settings.stream_checkpoint_seconds)
+        try:
+            async with AsyncSessionLocal() as write_db:
+                await crud.acheckpoint_turn(write_db, stream_turn.id, stream_turn.content, stream_turn.offset)
         except Exception as e:
-            logger.error(f"流式处理异常: {e}", exc_info=True)
-            error_data = {
-                "content": f"错误: {str(e)}",
+            logger.warning(f"保存轮次 {stream_turn.id} 的检查点失败: {e}")
+
+
+async def _checkpoint_events(turn_id: str, after: int):
+    """
+    轮次不在本进程内（另一个 worker 或进程已重启）：从数据库检查点回放，
+    仍在运行时轮询检查点，检查点长时间不更新则视为生成已中断
+    """
+    while True:
+        async with AsyncSessionLocal() as db:
+            db_turn = await crud.aget_turn(db, turn_id)
+            if not db_turn:
+                return
+            stale = (
+                db_turn.status == "running"
+                and (utcnow() - db_turn.updated_at).total_seconds() > settings.stream_turn_stale_seconds
+            )
+            if stale:
+                await crud.ainterrupt_turn(db, db_turn)
+                await db.refresh(db_turn)
+        
+        content = db_turn.content or ""
+        if len(content) > after:
+            yield len(content), {"content": content[after:], "is_final": False}
+            after = len(content)
+        if db_turn.status != "running":
+            final = {
+                "content": "",
                 "is_final": True,
-                "tool_calls": None
+                "tool_calls": json.loads(db_turn.tool_calls) if db_turn.tool_calls else None,
+                "from_cache": bool(db_turn.from_cache),
+                "turn_id": turn_id
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
+            if db_turn.status != "completed":
+                final["interrupted"] = True
+            yield len(content) + 1, final
+            return
+        await asyncio.sleep(settings.stream_checkpoint_seconds)
+
+
+def _event_stream_response(events, turn_id: str) -> StreamingResponse:
+    """把 (事件ID, 数据) 序列编码为带 id 的 SSE 帧"""
+    async def generate():
+        try:
+            async for event_id, data in events:
+                yield encode_frame(data, event_id)
         finally:
             # 确保发送结束标记
-            yield "data: [DONE]\n\n"
-            logger.info("流式响应结束")
+            yield DONE_FRAME
     
     return StreamingResponse(
         generate(),
@@ -289,6 +679,291 @@ async def stream_message_post(
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-            "Access-Control-Allow-Origin": "*"
+            "X-Turn-Id": turn_id,
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "X-Turn-Id"
         }
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/stream/{turn_id}")
+async def resume_stream(
+    turn_id: str,
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """断线重连：从 Last-Event-ID（请求头或查询参数）之后继续接收该轮次的事件"""
+    after = last_event_id
+    if after is None and last_event_id_header:
+        try:
+            after = max(int(last_event_id_header), 0)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID 无效")
+    after = after or 0
+    
+    stream_turn = stream_turns.get(turn_id)
+    if stream_turn:
+        # 本进程内的轮次：先回放缓冲事件，再接收实时事件
+        return _event_stream_response(stream_turn.subscribe(after), turn_id)
+    if state_backend.shared and await state_backend.stream_state(turn_id) is not None:
+        # 其他 worker 上的轮次：从共享缓冲回放并跟随
+        return _event_stream_response(follow_shared(turn_id, after), turn_id)
+    
+    db_turn = await crud.aget_turn(db, turn_id)
+    if not db_turn:
+        raise HTTPException(status_code=404, detail="轮次不存在")
+    await db.close()
+    return _event_stream_response(_checkpoint_events(turn_id, after), turn_id)
+
+# ===================== 后台任务 API =====================
+async def _run_job(job_id: str) -> None:
+    """在任务队列的 worker 中执行一个后台任务，运行期间定期保存部分输出"""
+    async with AsyncSessionLocal() as db:
+        job = await crud.aget_job(db, job_id)
+        if not job or job.status != "queued":
+            return
+        
+        # 后台任务不设排队期限，但同样遵守会话串行和全局并发上限
+        ticket = await agent_scheduler.acquire(job.session_id, "/jobs", timeout=None)
+        # 多个 worker 进程启动时都会重新入队排队中的任务，只有抢到的一个执行
+        if not await crud.aclaim_job(db, job_id):
+            await agent_scheduler.release(ticket)
+            return
+        turn = TurnMetrics("/jobs").activate()
+        turn.phases["admission_wait"] = ticket.waited
+        status = "error"
+        content_parts = []
+        job_queue.notify(job_id)
+        # 用户消息在回答完成后与 assistant 消息一起写入；失败时单独写入，保留提问记录
+        user_message = MessageCreate(
+            session_id=job.session_id, role="user", content=job.message, created_at=utcnow()
+        )
+        user_written = False
+        try:
+            with turn.phase("history_load"):
+                session = await crud.aget_session(db, job.session_id)
+                if not session:
+                    raise ValueError("会话不存在")
+                history = await _build_history(db, session)
+            
+            tool_calls_data = None
+            tool_invocations = None
+            agent_started = time.perf_counter()
+            last_checkpoint = time.monotonic()
+            async for chunk in agent_service.process_stream(job.message, history, use_cache=job.use_cache):
+                if chunk["is_final"]:
+                    # process_stream 出错时在最终块中带 error
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    tool_calls_data = chunk.get("tool_calls")
+                    tool_invocations = chunk.get("tool_invocations")
+                    turn.phases["agent_run"] = time.perf_counter() - agent_started
+                    continue
+                if chunk.get("content"):
+                    turn.mark_first_token()
+                    content_parts.append(chunk["content"])
+                    if time.monotonic() - last_checkpoint >= settings.stream_checkpoint_seconds:
+                        await crud.aupdate_job(db, job_id, content="".join(content_parts))
+                        job_queue.notify(job_id)
+                        last_checkpoint = time.monotonic()
+            
+            full_content = "".join(content_parts)
+            tool_calls_json = json.dumps(tool_calls_data) if tool_calls_data else None
+            with turn.phase("final_db_write"):
+                _, assistant_message = await crud.acreate_messages(db, [user_message, MessageCreate(
+                    session_id=job.session_id,
+                    role="assistant",
+                    content=full_content,
+                    tool_calls=tool_calls_json,
+                    tool_invocations=tool_invocations
+                )])
+                user_written = True
+                await crud.aupdate_job(
+                    db, job_id, status="completed", content=full_content, tool_calls=tool_calls_json,
+                    assistant_message_id=assistant_message.id, finished_at=utcnow()
+                )
+            status = "success"
+        except Exception as e:
+            logger.error(f"后台任务 {job_id} 失败: {e}", exc_info=True)
+            if not user_written:
+                try:
+                    await crud.acreate_message(db, user_message)
+                except ValueError:
+                    pass  # 会话已不存在
+            await crud.aupdate_job(
+                db, job_id, status="failed", content="".join(content_parts), error=str(e), finished_at=utcnow()
+            )
+        finally:
+            await agent_scheduler.release(ticket)
+            turn.finish(status)
+
+
+job_queue.runner = _run_job
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(
+    chat_request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """提交后台任务：立即返回任务ID，由任务队列异步运行 Agent；队列已满时返回 429"""
+    if not chat_request.message:
+        raise HTTPException(status_code=400, detail="消息不能为空")
+    if not chat_request.session_id:
+        raise HTTPException(status_code=400, detail="session_id不能为空")
+    
+    session = await crud.aget_session(db, chat_request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    
+    if not job_queue.started:
+        job_queue.start()
+    if not job_queue.reserve():
+        raise HTTPException(
+            status_code=429,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": str(job_queue.retry_after())}
+        )
+    try:
+        job = await crud.acreate_job(db, session.id, chat_request.message, _use_cache(chat_request, session))
+    except Exception:
+        job_queue.release()
+        raise
+    job_queue.enqueue(job.id)
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="任务未结束时最多等待的秒数（长轮询）"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """查询后台任务的状态和（部分）输出"""
+    job = await crud.aget_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if wait and job.status in ("queued", "running"):
+        await job_queue.wait(job_id, wait)
+        await db.refresh(job)
+    return job
+
+# ===================== 批量问答 API =====================
+# 批量问答创建的会话标题取问题的开头
+BATCH_TITLE_CHARS = 100
+
+
+def _batch_messages(session_id: str, question: str, received_at, content: str, agent_response: Optional[dict] = None) -> list:
+    """批量中一个问题要写入其会话的用户消息与 assistant 消息"""
+    agent_response = agent_response or {}
+    return [
+        MessageCreate(session_id=session_id, role="user", content=question, created_at=received_at),
+        MessageCreate(
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            tool_calls=agent_response.get("tool_calls"),
+            tool_invocations=agent_response.get("tool_invocations"),
+        ),
+    ]
+
+
+async def _answer_batch_question(index: int, question: str, use_cache: bool) -> tuple:
+    """
+    回答批量中的一个问题（新会话，没有历史），返回 (结果行, 待写入的消息)；
+    失败的问题同样写入会话：assistant 消息为与流式接口一致的 "错误: ..."，会话中的记录与 NDJSON 结果一致
+    """
+    session_id = generate_uuid()
+    turn = TurnMetrics("/batch").activate()
+    status = "error"
+    received_at = utcnow()
+    result = BatchResult(index=index, question=question, status="error", session_id=session_id)
+    try:
+        # 与后台任务相同：不设排队期限，遵守全局并发上限
+        async with agent_scheduler.admit(session_id, "/batch", timeout=None) as ticket:
+            turn.phases["admission_wait"] = ticket.waited
+            with turn.phase("agent_run"):
+                agent_response = await agent_service.process_message(question, [], use_cache=use_cache)
+        if agent_response.get("error"):
+            result.error = agent_response["error"]
+            return result, _batch_messages(session_id, question, received_at, f"错误: {result.error}")
+        result.status = "success"
+        result.content = agent_response["content"]
+        result.tool_calls = agent_response["tool_calls"]
+        result.from_cache = agent_response.get("from_cache", False)
+        status = "success"
+        return result, _batch_messages(session_id, question, received_at, result.content, agent_response)
+    except Exception as e:
+        logger.error(f"批量问答第 {index} 题失败: {e}", exc_info=True)
+        result.error = str(e)
+        return result, _batch_messages(session_id, question, received_at, f"错误: {result.error}")
+    finally:
+        result.latency_ms = (time.perf_counter() - turn.started) * 1000
+        turn.finish(status)
+
+
+async def _persist_batch_group(run: BatchRun, group: list) -> None:
+    """一个事务创建本组问题（成功与失败）的会话并写入其消息，把 assistant 消息ID填回结果行"""
+    message_creates = [mc for _, mcs in group for mc in mcs]
+    if message_creates:
+        titles = {r.session_id: " ".join(r.question.split())[:BATCH_TITLE_CHARS] for r, mcs in group if mcs}
+        try:
+            async with AsyncSessionLocal() as db:
+                messages = await crud.acreate_sessions_with_messages(db, titles, message_creates)
+            run.transactions += 1
+            assistant_ids = {m.session_id: m.id for m in messages if m.role == "assistant"}
+            for result, _ in group:
+                result.message_id = assistant_ids.get(result.session_id)
+        except Exception as e:
+            logger.error(f"批量问答写库失败: {e}", exc_info=True)
+            for result, mcs in group:
+                if mcs:
+                    result.session_id = None
+                    if result.status == "success":
+                        result.status, result.error = "error", f"保存失败: {e}"
+    for result, _ in group:
+        run.record(result.status)
+
+
+async def _batch_lines(batch_request: BatchRequest, concurrency: int):
+    """按完成顺序输出每个问题的结果（NDJSON），最后一行为汇总"""
+    run = BatchRun(len(batch_request.questions), concurrency)
+    use_cache = not batch_request.bypass_cache
+
+    async def answer(index: int, question: str) -> tuple:
+        return await _answer_batch_question(index, question, use_cache)
+
+    async for group in run.run(batch_request.questions, answer):
+        await _persist_batch_group(run, group)
+        yield "".join(result.model_dump_json() + "\n" for result, _ in group)
+    yield BatchSummary(**run.summary()).model_dump_json() + "\n"
+
+
+@router.post("/batch")
+async def batch_questions(batch_request: BatchRequest):
+    """
+    批量问答：每个问题在自己的新会话中回答，以有限的并发运行，
+    按完成顺序以 NDJSON 逐行返回结果（application/x-ndjson），最后一行为吞吐汇总
+    """
+    questions = batch_request.questions
+    if not questions or any(not q.strip() for q in questions):
+        raise HTTPException(status_code=400, detail="问题不能为空")
+    if len(questions) > settings.batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"一次最多提交 {settings.batch_max_questions} 个问题")
+    concurrency = max(min(batch_request.concurrency or settings.batch_concurrency, settings.batch_max_concurrency), 1)
+    return StreamingResponse(
+        _batch_lines(batch_request, concurrency),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ===================== 本地论文库 API =====================
+@papers_router.get("/search", response_model=List[PaperResponse])
+async def search_papers(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[PaperResponse]:
+    """在本地论文库中全文检索之前通过 arXiv 获取过的论文"""
+    return await asearch_papers(db, q, limit)
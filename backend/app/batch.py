@@ -0,0 +1,100 @@
+# backend/app/batch.py
+"""
+批量问答
+- 固定数量的 worker 协程从问题列表中依次取题，限制一次批量请求同时运行的 Agent 数量
+  （每个问题仍经过 agent_scheduler，受全局并发上限约束）
+- 完成的结果进入队列；消费方每次取走当时已完成的全部结果（最多 BATCH_WRITE_MAX_ITEMS 个），
+  一个事务写库后再逐条输出，完成得越集中，一次提交的问题越多，不额外等待
+- 相同的 arXiv 查询由 CachedArxivTool 合并为一次（进行中的查询共享结果，完成后进入缓存）
+单个问题的执行逻辑（调用 Agent、组装结果）由调用方提供
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from .config import settings
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+
+BATCH_QUESTIONS_TOTAL = REGISTRY.register(Counter(
+    "chat_batch_questions_total", "Questions answered through the batch endpoint", ["status"]))
+BATCH_THROUGHPUT = REGISTRY.register(Histogram(
+    "chat_batch_questions_per_second", "Aggregate throughput of finished batch requests",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)))
+
+
+class BatchRun:
+    """一次批量请求的进度与吞吐统计"""
+
+    active: Dict[int, "BatchRun"] = {}
+
+    def __init__(self, total: int, concurrency: int):
+        self.total = total
+        self.concurrency = concurrency
+        self.started = time.perf_counter()
+        self.succeeded = 0
+        self.failed = 0
+        self.transactions = 0
+
+    def record(self, status: str) -> None:
+        if status == "success":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        BATCH_QUESTIONS_TOTAL.inc(status=status)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        finished = self.succeeded + self.failed
+        return {
+            "questions": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "concurrency": self.concurrency,
+            "transactions": self.transactions,
+            "elapsed_seconds": elapsed,
+            "questions_per_second": finished / elapsed if elapsed > 0 else 0.0,
+        }
+
+    async def run(self, items: List[Any], answer: Callable[[int, Any], Awaitable[Any]]) -> AsyncIterator[List[Any]]:
+        """
+        以 concurrency 个 worker 执行 answer(序号, 问题)，按完成顺序分组产出结果；
+        answer 需要自行处理异常并返回结果对象。提前结束迭代（客户端断开）时取消尚未完成的问题
+        """
+        pending = deque(enumerate(items))
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            while pending:
+                index, item = pending.popleft()
+                await done.put(await answer(index, item))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(items)))]
+        BatchRun.active[id(self)] = self
+        try:
+            remaining = len(items)
+            while remaining:
+                group = [await done.get()]
+                while not done.empty() and len(group) < settings.batch_write_max_items:
+                    group.append(done.get_nowait())
+                remaining -= len(group)
+                yield group
+            summary = self.summary()
+            BATCH_THROUGHPUT.observe(summary["questions_per_second"])
+        finally:
+            BatchRun.active.pop(id(self), None)
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _batch_metrics():
+    """渲染 /metrics 时读取正在进行的批量请求"""
+    batches = Gauge("chat_batch_questions", "Questions of in-flight batch requests by state", ["state"])
+    runs = list(BatchRun.active.values())
+    batches.set(sum(run.succeeded + run.failed for run in runs), state="finished")
+    batches.set(sum(run.total - run.succeeded - run.failed for run in runs), state="pending")
+    return [batches]
+
+
+REGISTRY.register_collector(_batch_metrics)
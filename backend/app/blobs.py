@@ -0,0 +1,87 @@
+# backend/app/blobs.py
+"""
+内容寻址的大字段存储
+- 工具结果和较长的消息正文按 sha256 存入 content_blobs 表，相同内容只存一份
+- 写入时压缩（BLOB_COMPRESSION=zlib|zstd|none），压缩收益不明显或内容很短时保存原文
+- 读取时才解压；只需要开头一段时（截断返回）只解压所需的部分
+zstd 为可选依赖（pip install zstandard），每行记录自己的编码，切换算法后旧数据仍可读取
+"""
+import hashlib
+import logging
+import zlib
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .config import settings
+from .models import ContentBlob, utcnow
+
+logger = logging.getLogger(__name__)
+
+# 压缩后至少要比原文小这个比例才保存压缩结果
+MIN_SAVING_RATIO = 0.1
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("BLOB_COMPRESSION=zstd 需要安装 zstandard 包（pip install zstandard）") from e
+    return zstandard
+
+
+def compress(raw: bytes, algorithm: Optional[str] = None) -> tuple:
+    """按配置压缩，返回 (编码, 数据)；不值得压缩时返回原文"""
+    algorithm = (algorithm or settings.blob_compression).lower()
+    if algorithm == "none" or len(raw) < settings.blob_compress_min_bytes:
+        return "raw", raw
+    if algorithm == "zstd":
+        data = _zstd().ZstdCompressor(level=settings.blob_compression_level).compress(raw)
+    else:
+        data = zlib.compress(raw, settings.blob_compression_level)
+        algorithm = "zlib"
+    if len(data) > len(raw) * (1 - MIN_SAVING_RATIO):
+        return "raw", raw
+    return algorithm, data
+
+
+def decode(encoding: str, data: bytes, max_chars: Optional[int] = None) -> str:
+    """
+    解压并解码；指定 max_chars 时只解压开头足够的部分（UTF-8 每个字符最多 4 字节）
+    """
+    limit = max_chars * 4 if max_chars is not None else None
+    if encoding == "zlib":
+        if limit is None:
+            raw = zlib.decompress(data)
+        else:
+            raw = zlib.decompressobj().decompress(data, limit)
+    elif encoding == "zstd":
+        reader = _zstd().ZstdDecompressor().stream_reader(data)
+        raw = reader.read(limit if limit is not None else -1)
+    else:
+        raw = data[:limit] if limit is not None else data
+    text = raw.decode("utf-8", errors="ignore" if limit is not None else "strict")
+    return text[:max_chars] if max_chars is not None else text
+
+
+def blob_row(content: str, created_at=None) -> Dict[str, Any]:
+    """构造一行 content_blobs 记录"""
+    raw = content.encode("utf-8")
+    encoding, data = compress(raw)
+    return {
+        "hash": content_hash(content),
+        "encoding": encoding,
+        "data": data,
+        "size": len(content),
+        "stored_size": len(data),
+        "created_at": created_at or utcnow(),
+    }
+
+
+def insert_blobs_stmt(rows: List[Dict[str, Any]]):
+    """批量插入；已存在的哈希直接跳过"""
+    return sqlite_insert(ContentBlob).values(rows).on_conflict_do_nothing(index_elements=["hash"])
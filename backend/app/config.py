@@ -12,16 +12,121 @@ class Settings(BaseSettings):
     BAI_LIAN_BASE_URL: str = os.getenv("BAI_LIAN_BASE_URL", "")
 
     #数据库设置
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./academic_research_agent.db")
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./academic_agent.db")
+    # 异步引擎连接池配置
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # SQLite 存储配置：default（回滚日志，SQLite 默认行为）或 wal（WAL + 调优 PRAGMA）
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "wal")
+    # 单项 PRAGMA 覆盖（留空则使用所选配置的默认值）
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "")
+    SQLITE_BUSY_TIMEOUT_MS: str = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "")
+    SQLITE_MMAP_SIZE: str = os.getenv("SQLITE_MMAP_SIZE", "")
+    SQLITE_CACHE_SIZE: str = os.getenv("SQLITE_CACHE_SIZE", "")
+    # 组提交：把并发轮次的消息插入合并到同一个事务
+    SQLITE_GROUP_COMMIT: bool = os.getenv("SQLITE_GROUP_COMMIT", "false").lower() == "true"
+    SQLITE_GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("SQLITE_GROUP_COMMIT_WINDOW_MS", "5"))
+    SQLITE_GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("SQLITE_GROUP_COMMIT_MAX_BATCH", "64"))
     
     # 服务器配置
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000").strip('"\' '))
     debug: bool = os.getenv("DEBUG", "true").lower() == "true"
+    # 慢请求日志阈值（秒），0 表示关闭
+    slow_turn_seconds: float = float(os.getenv("SLOW_TURN_SECONDS", "0"))
     
     # Agent配置
     agent_temperature: float = float(os.getenv("AGENT_TEMPERATURE", "0.1"))
     agent_max_tokens: int = int(os.getenv("AGENT_MAX_TOKENS", "2000"))
+    # Agent不支持异步调用时，用于执行同步调用的线程池大小
+    agent_executor_workers: int = int(os.getenv("AGENT_EXECUTOR_WORKERS", "8"))
+    # 同一条模型输出中的多个工具调用并发执行：最大并发数与单次调用超时（秒）
+    tool_max_concurrency: int = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+    tool_timeout_seconds: float = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+    # 按工具覆盖超时（秒），例如 "arxiv=20,local_papers=2"；未列出的工具使用 TOOL_TIMEOUT_SECONDS
+    tool_timeouts: str = os.getenv("TOOL_TIMEOUTS", "")
+
+    # 对话上下文配置：历史消息的 token 预算、原文保留的最近轮数、滚动摘要的长度上限
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+    context_keep_turns: int = int(os.getenv("CONTEXT_KEEP_TURNS", "6"))
+    context_summary_max_tokens: int = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "800"))
+    # 窗口外累计多少轮后才折叠进摘要（批量折叠，避免每轮都调用一次摘要模型）
+    context_summary_batch_turns: int = int(os.getenv("CONTEXT_SUMMARY_BATCH_TURNS", "4"))
+
+    # arXiv 查询缓存：内存 LRU + SQLite 持久化，条目超过 TTL 后重新查询
+    arxiv_cache_enabled: bool = os.getenv("ARXIV_CACHE_ENABLED", "true").lower() == "true"
+    arxiv_cache_ttl_seconds: int = int(os.getenv("ARXIV_CACHE_TTL_SECONDS", "86400"))
+    arxiv_cache_max_entries: int = int(os.getenv("ARXIV_CACHE_MAX_ENTRIES", "512"))
+    # arXiv 预取（默认关闭）：第一次模型调用的同时按用户消息中的关键词发起查询，
+    # 模型的 arxiv 调用与预取查询的词项相似度不低于阈值时直接使用预取结果
+    arxiv_prefetch_enabled: bool = os.getenv("ARXIV_PREFETCH_ENABLED", "false").lower() == "true"
+    arxiv_prefetch_max_queries: int = int(os.getenv("ARXIV_PREFETCH_MAX_QUERIES", "1"))
+    arxiv_prefetch_match_threshold: float = float(os.getenv("ARXIV_PREFETCH_MATCH_THRESHOLD", "0.6"))
+    # 本地论文库：arXiv 结果自动入库，并向Agent提供 local_papers 工具
+    local_papers_enabled: bool = os.getenv("LOCAL_PAPERS_ENABLED", "true").lower() == "true"
+
+    # 语义答案缓存（默认关闭）：相似度超过阈值且未过期时直接返回缓存的答案
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    answer_cache_threshold: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+    answer_cache_ttl_seconds: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "21600"))
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+    answer_cache_replay_chunk_chars: int = int(os.getenv("ANSWER_CACHE_REPLAY_CHUNK_CHARS", "20"))
+    
+    # SSE 合并窗口：相邻 token 在窗口时间内或累计到指定字符数后合并为一帧，0 表示逐 token 发送
+    # 客户端可在请求中用 coalesce_ms / coalesce_chars 覆盖
+    stream_coalesce_ms: int = int(os.getenv("STREAM_COALESCE_MS", "0"))
+    stream_coalesce_chars: int = int(os.getenv("STREAM_COALESCE_CHARS", "0"))
+    
+    # 断线续传：部分答案的检查点间隔（秒）、结束后事件缓冲保留时间（秒）、
+    # 以及检查点多久未更新即视为生成进程已丢失（秒）
+    stream_checkpoint_seconds: float = float(os.getenv("STREAM_CHECKPOINT_SECONDS", "2"))
+    stream_turn_retention_seconds: float = float(os.getenv("STREAM_TURN_RETENTION_SECONDS", "300"))
+    stream_turn_stale_seconds: float = float(os.getenv("STREAM_TURN_STALE_SECONDS", "120"))
+    # 写入共享事件缓冲的合并窗口（毫秒）：窗口内的事件一次批量写入，写入进行中到达的事件并入下一批
+    stream_shared_flush_ms: float = float(os.getenv("STREAM_SHARED_FLUSH_MS", "50"))
+    
+    # 应用启动时在后台预热 Agent（就绪检查 /ready 在预热完成后才返回 200）
+    agent_warmup: bool = os.getenv("AGENT_WARMUP", "true").lower() == "true"
+    # 访问模型服务的共享 HTTP 连接池
+    llm_http_max_connections: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+    llm_http_keepalive_seconds: float = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+    llm_http_timeout_seconds: float = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120"))
+    
+    # Agent 准入调度：全局同时运行的轮次上限、排队等待期限（秒，0 表示不限）、排队数量上限（0 表示不限）
+    agent_max_concurrent_runs: int = int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", "8"))
+    agent_queue_timeout_seconds: float = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "30"))
+    agent_max_waiting: int = int(os.getenv("AGENT_MAX_WAITING", "100"))
+    
+    # 多 worker 共享状态：memory（单进程）/ sqlite（同机多进程）/ redis（跨机器，需安装 redis）
+    state_backend: str = os.getenv("STATE_BACKEND", "memory")
+    state_sqlite_path: str = os.getenv("STATE_SQLITE_PATH", "./academic_agent_state.db")
+    redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    state_lock_ttl_seconds: float = float(os.getenv("STATE_LOCK_TTL_SECONDS", "30"))
+    
+    # 大字段存储：工具结果与较长的消息正文按内容哈希去重、压缩存放（zlib / zstd（需安装 zstandard）/ none）
+    blob_compression: str = os.getenv("BLOB_COMPRESSION", "zlib")
+    blob_compression_level: int = int(os.getenv("BLOB_COMPRESSION_LEVEL", "6"))
+    blob_compress_min_bytes: int = int(os.getenv("BLOB_COMPRESS_MIN_BYTES", "256"))
+    # 正文超过该字符数的消息外置到大字段存储（0 表示不外置），消息表中只保留开头 MESSAGE_INLINE_CHARS 个字符
+    message_blob_min_chars: int = int(os.getenv("MESSAGE_BLOB_MIN_CHARS", "4096"))
+    message_inline_chars: int = int(os.getenv("MESSAGE_INLINE_CHARS", "512"))
+    # 消息接口 tool_payloads=truncate 时每个工具结果返回的字符数
+    tool_payload_truncate_chars: int = int(os.getenv("TOOL_PAYLOAD_TRUNCATE_CHARS", "500"))
+    
+    # 会话历史检索：按相关度排序时只对最近的这么多条命中计算 bm25（命中更少时为完整排序）
+    search_rank_window: int = int(os.getenv("SEARCH_RANK_WINDOW", "1000"))
+    
+    # 后台任务：并发执行的 worker 数量与排队上限（超过上限返回 429）
+    job_workers: int = int(os.getenv("JOB_WORKERS", "2"))
+    job_queue_max_size: int = int(os.getenv("JOB_QUEUE_MAX_SIZE", "100"))
+    
+    # 批量问答：一次请求的问题数上限、默认与最大并发数、一个写库事务最多包含的问题数
+    batch_max_questions: int = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    batch_max_concurrency: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    batch_write_max_items: int = int(os.getenv("BATCH_WRITE_MAX_ITEMS", "50"))
     
     class Config:
         env_file = ".env"
@@ -1,10 +1,127 @@
 # backend/app/crud.py
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import base64
+from sqlalchemy import (
+    DateTime, select, insert, delete, update, func, and_, or_, case, union, bindparam, literal_column
+)
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import ChatSession, ChatMessage
+from app import database
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import (
+    ChatSession, ChatMessage, ChatTurn, ChatJob, ContentBlob, ToolInvocation, generate_uuid, utcnow
+)
 from app.schemas import SessionCreate, SessionUpdate, MessageCreate
+from app.blobs import blob_row, decode, insert_blobs_stmt
+from app.tool_records import build_invocations, invocation_record
+from app.search import INDEX_SQL, index_params
+
+# 会话列表中最后一条消息预览的最大长度
+PREVIEW_LENGTH = 100
+
+# ===================== 游标（keyset）分页 =====================
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """把排序键 (created_at, id) 编码为不透明游标"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception as e:
+        raise ValueError("无效的分页游标") from e
+
+def next_cursor(items: list, limit: Optional[int]) -> Optional[str]:
+    """本页已满时返回下一页游标，否则返回 None"""
+    if not limit or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+def _sessions_stmt(limit: Optional[int] = None, cursor: Optional[str] = None):
+    """会话按创建时间倒序，游标之后的一页"""
+    stmt = select(ChatSession).order_by(ChatSession.created_at.desc(), ChatSession.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            ChatSession.created_at < created_at,
+            and_(ChatSession.created_at == created_at, ChatSession.id < row_id),
+        ))
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def _messages_stmt(session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """会话消息按创建时间正序，游标之后的一页（走 (session_id, created_at) 复合索引）"""
+    stmt = (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+    )
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            ChatMessage.created_at > created_at,
+            and_(ChatMessage.created_at == created_at, ChatMessage.id > row_id),
+        ))
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def _session_summaries_stmt(limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    会话摘要：一条语句同时取出消息数量（会话表上随写入维护的计数）和最后一条消息预览
+    相关子查询只针对当前页的会话执行，且都命中 (session_id, created_at) 复合索引
+    """
+    page = _sessions_stmt(limit, cursor).subquery()
+    last_message = (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == page.c.id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(1)
+    )
+    last_preview = (
+        last_message.with_only_columns(func.substr(ChatMessage.content, 1, PREVIEW_LENGTH))
+        .scalar_subquery()
+    )
+    last_at = last_message.with_only_columns(ChatMessage.created_at).scalar_subquery()
+
+    return select(
+        page.c.id,
+        page.c.title,
+        page.c.created_at,
+        page.c.updated_at,
+        page.c.message_count,
+        last_preview.label("last_message_preview"),
+        last_at.label("last_message_at"),
+    ).select_from(page).order_by(page.c.created_at.desc(), page.c.id.desc())
+
+def _session_watermark_stmt(session_id: str):
+    """
+    会话的变更水位：会话的 updated_at、消息数与最后一条消息
+    只走 (session_id, created_at) 复合索引，不读取任何消息内容
+    """
+    last_message = (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(1)
+    )
+    return select(
+        ChatSession.id,
+        ChatSession.updated_at,
+        ChatSession.message_count,
+        last_message.with_only_columns(ChatMessage.created_at).scalar_subquery().label("last_message_at"),
+        last_message.with_only_columns(ChatMessage.id).scalar_subquery().label("last_message_id"),
+    ).where(ChatSession.id == session_id)
 
 # ===================== 会话相关 CRUD 操作 =====================
 def create_session(db: Session, session_create: SessionCreate) -> ChatSession:
@@ -22,9 +139,13 @@ def get_session(db: Session, session_id: str) -> Optional[ChatSession]:
     """根据ID获取聊天会话"""
     return db.query(ChatSession).filter(ChatSession.id == session_id).first()
 
-def get_sessions(db: Session) -> List[ChatSession]:
-    """获取所有聊天会话"""
-    return db.query(ChatSession).order_by(ChatSession.created_at.desc()).all()
+def get_sessions(db: Session, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[ChatSession]:
+    """获取聊天会话（按创建时间倒序，支持游标分页）"""
+    return list(db.execute(_sessions_stmt(limit, cursor)).scalars().all())
+
+def get_session_summaries(db: Session, limit: Optional[int] = None, cursor: Optional[str] = None) -> list:
+    """获取会话摘要列表：消息数量 + 最后一条消息预览，单条查询完成，不加载消息"""
+    return list(db.execute(_session_summaries_stmt(limit, cursor)).all())
 
 
 def update_session(db: Session, session_id: str, session_update: SessionUpdate) -> Optional[ChatSession]:
@@ -45,42 +166,661 @@ def delete_session(db: Session, session_id: str) -> bool:
     """删除聊天会话及其关联的消息"""
     db_session = get_session(db, session_id)
     if db_session:
+        hashes = list(db.execute(_session_blob_hashes_stmt(session_id)).scalars().all())
+        db.query(ToolInvocation).filter(ToolInvocation.session_id == session_id).delete()
+        db.query(ChatTurn).filter(ChatTurn.session_id == session_id).delete()
+        db.query(ChatJob).filter(ChatJob.session_id == session_id).delete()
         db.delete(db_session)
+        db.flush()
+        for chunk in _chunks(hashes):
+            db.execute(_orphan_blobs_delete(chunk))
         db.commit()
         return True
     return False
 
+# ===================== 大字段回收 =====================
+# 单条语句中 IN 列表的最大长度（SQLite 绑定参数数量有限）
+_IN_CHUNK = 500
+
+def _session_blob_hashes_stmt(session_id: str):
+    """会话引用的大字段：工具结果与外置的正文"""
+    return union(
+        select(ToolInvocation.result_hash).where(
+            ToolInvocation.session_id == session_id, ToolInvocation.result_hash.isnot(None)
+        ),
+        select(ChatMessage.content_hash).where(
+            ChatMessage.session_id == session_id, ChatMessage.content_hash.isnot(None)
+        ),
+    )
+
+def _orphan_blobs_delete(hashes: List[str]):
+    """删除已不被任何消息或工具调用引用的大字段（内容去重后可能仍被其他会话引用）"""
+    return delete(ContentBlob).where(
+        ContentBlob.hash.in_(hashes),
+        ~select(ToolInvocation.id).where(ToolInvocation.result_hash == ContentBlob.hash).exists(),
+        ~select(ChatMessage.id).where(ChatMessage.content_hash == ContentBlob.hash).exists(),
+    )
+
+def _chunks(items: List[str]):
+    for start in range(0, len(items), _IN_CHUNK):
+        yield items[start:start + _IN_CHUNK]
+
 # ===================== 消息相关 CRUD 操作 =====================
-def create_message(db: Session, message_create: MessageCreate) -> ChatMessage:
-    """创建一条新的聊天消息"""
-    # 确保会话存在
-    db_session = get_session(db, message_create.session_id)
-    if not db_session:
+_sessions_table = ChatSession.__table__
+_messages_table = ChatMessage.__table__
+
+# 追加消息后更新会话：updated_at 取最后一条消息的时间，消息数累加（多个会话时 executemany）
+_TOUCH_SESSION = (
+    update(_sessions_table)
+    .where(_sessions_table.c.id == bindparam("touch_id"))
+    .values(
+        updated_at=bindparam("touched_at", type_=DateTime),
+        message_count=func.coalesce(_sessions_table.c.message_count, 0) + bindparam("added"),
+    )
+)
+# 多条消息一条语句插入，RETURNING 取回全文索引需要的 rowid；其余字段都由应用生成，提交后不需要 refresh
+_INSERT_MESSAGES = insert(_messages_table).returning(_messages_table.c.id, literal_column("rowid"))
+
+def _new_messages(
+    message_creates: List[MessageCreate],
+) -> Tuple[List[ChatMessage], List[dict], List[ToolInvocation], List[dict]]:
+    """
+    构造一批消息，返回 (交给调用方的消息对象, 消息表的行, 工具调用行, 大字段行)
+    正文较长时完整内容外置到 content_blobs，消息表只保留开头一段，返回的消息对象仍带完整正文
+    未指定 created_at 的消息取当前时间；同一会话内严格递增，(created_at, id) 的顺序与写入顺序一致
+    """
+    messages, rows, invocations = [], [], []
+    blobs: Dict[str, dict] = {}
+    latest: Dict[str, datetime] = {}
+    for message_create in message_creates:
+        created_at = message_create.created_at or utcnow()
+        previous = latest.get(message_create.session_id)
+        if previous is not None and created_at <= previous:
+            created_at = previous + timedelta(microseconds=1)
+        latest[message_create.session_id] = created_at
+        content = message_create.content
+        content_hash = None
+        if 0 < settings.message_blob_min_chars <= len(content):
+            row = blob_row(content, created_at)
+            blobs[row["hash"]] = row
+            content_hash = row["hash"]
+        message = ChatMessage(
+            id=generate_uuid(),
+            session_id=message_create.session_id,
+            role=message_create.role,
+            content=content,
+            content_hash=content_hash,
+            created_at=created_at,
+            tool_calls=message_create.tool_calls,
+            tool_results=message_create.tool_results,
+        )
+        messages.append(message)
+        rows.append({
+            "id": message.id,
+            "session_id": message.session_id,
+            "role": message.role,
+            "content": content[:settings.message_inline_chars] if content_hash else content,
+            "content_hash": content_hash,
+            "created_at": created_at,
+            "tool_calls": message.tool_calls,
+            "tool_results": message.tool_results,
+        })
+        message_invocations, invocation_blobs = build_invocations(
+            message.id, message.session_id, message_create.tool_invocations or [], created_at=created_at,
+        )
+        invocations.extend(message_invocations)
+        blobs.update((row["hash"], row) for row in invocation_blobs)
+    return messages, rows, invocations, list(blobs.values())
+
+def _clear_session_stmt(session_id: str):
+    """清空会话消息后归零消息数，并更新 updated_at（客户端据此发现变化）"""
+    return (
+        update(_sessions_table)
+        .where(_sessions_table.c.id == session_id)
+        .values(message_count=0, updated_at=utcnow())
+    )
+
+def _touch_params(messages: List[ChatMessage]) -> List[dict]:
+    """每个会话一组 _TOUCH_SESSION 参数"""
+    touches: Dict[str, dict] = {}
+    for message in messages:
+        touch = touches.setdefault(
+            message.session_id, {"touch_id": message.session_id, "touched_at": message.created_at, "added": 0}
+        )
+        touch["touched_at"] = max(touch["touched_at"], message.created_at)
+        touch["added"] += 1
+    return list(touches.values())
+
+def _search_index_rows(
+    messages: List[ChatMessage], message_creates: List[MessageCreate], rowids: Dict[str, int]
+) -> List[dict]:
+    """全文索引行的参数（索引完整正文，不是消息表中的预览）；没有 FTS5 时为空"""
+    if not database.FTS5_AVAILABLE:
+        return []
+    return [
+        index_params(
+            rowids[message.id], message.session_id, message.role, message.content, message_create.tool_invocations
+        )
+        for message, message_create in zip(messages, message_creates)
+    ]
+
+def _blob_contents_stmt(hashes):
+    return select(ContentBlob.hash, ContentBlob.encoding, ContentBlob.data).where(ContentBlob.hash.in_(hashes))
+
+def _apply_contents(messages: List[ChatMessage], rows) -> List[ChatMessage]:
+    """用解压后的完整正文替换消息对象上的预览（只改内存中的值，不会写回数据库）"""
+    contents = {row.hash: decode(row.encoding, row.data) for row in rows}
+    for message in messages:
+        if message.content_hash in contents:
+            set_committed_value(message, "content", contents[message.content_hash])
+    return messages
+
+def resolve_contents(db: Session, messages: List[ChatMessage]) -> List[ChatMessage]:
+    """还原外置正文的消息"""
+    hashes = {m.content_hash for m in messages if m.content_hash}
+    if not hashes:
+        return messages
+    return _apply_contents(messages, db.execute(_blob_contents_stmt(hashes)).all())
+
+async def aresolve_contents(db: AsyncSession, messages: List[ChatMessage]) -> List[ChatMessage]:
+    """还原外置正文的消息（异步）：只读取并解压本次返回的消息引用的内容"""
+    hashes = {m.content_hash for m in messages if m.content_hash}
+    if not hashes:
+        return messages
+    result = await db.execute(_blob_contents_stmt(hashes))
+    return _apply_contents(messages, result.all())
+
+def create_messages(db: Session, message_creates: List[MessageCreate]) -> List[ChatMessage]:
+    """写入同一会话的一批消息（一个事务），语句顺序与 acreate_messages 相同"""
+    if not message_creates:
+        return []
+    _single_session(message_creates)
+    messages, rows, invocations, blobs = _new_messages(message_creates)
+    touch = _touch_params(messages)[0]
+    if db.execute(_TOUCH_SESSION.returning(_sessions_table.c.id), touch).first() is None:
+        db.rollback()
         raise ValueError("会话不存在")
-    
-    db_message = ChatMessage(
-        session_id=message_create.session_id,
-        role=message_create.role,
-        content=message_create.content,
-        tool_calls=getattr(message_create, "tool_calls", None),
-        tool_results=getattr(message_create, "tool_results", None),
-    )
-    db.add(db_message)
+    if blobs:
+        db.execute(insert_blobs_stmt(blobs))
+    rowids = dict(db.execute(_INSERT_MESSAGES, rows).all())
+    index_rows = _search_index_rows(messages, message_creates, rowids)
+    if index_rows:
+        db.execute(INDEX_SQL, index_rows)
+    db.add_all(invocations)
     db.commit()
-    db.refresh(db_message)
-    return db_message
+    return messages
 
+def create_message(db: Session, message_create: MessageCreate) -> ChatMessage:
+    """创建一条新的聊天消息"""
+    return create_messages(db, [message_create])[0]
 
-def get_messages_by_session(db: Session, session_id: str) -> List[ChatMessage]:
-    """根据会话ID获取所有关联的聊天消息"""
-    return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at.asc()).all()
+
+def get_messages_by_session(
+    db: Session, session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None
+) -> List[ChatMessage]:
+    """根据会话ID获取关联的聊天消息（按时间正序，支持游标分页）"""
+    return resolve_contents(db, list(db.execute(_messages_stmt(session_id, limit, cursor)).scalars().all()))
 
 def get_message(db: Session, message_id: str) -> Optional[ChatMessage]:
     """根据ID获取单条聊天消息"""
-    return db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+    message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+    return resolve_contents(db, [message])[0] if message else None
 
 def delete_messages_by_session(db: Session, session_id: str) -> int:
     """删除某个会话下的所有聊天消息，返回删除的消息数量"""
+    hashes = list(db.execute(_session_blob_hashes_stmt(session_id)).scalars().all())
+    db.query(ToolInvocation).filter(ToolInvocation.session_id == session_id).delete()
     deleted_count = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete()
+    db.execute(_clear_session_stmt(session_id))
+    for chunk in _chunks(hashes):
+        db.execute(_orphan_blobs_delete(chunk))
     db.commit()
-    return deleted_count
\ No newline at end of file
+    return deleted_count
+
+
+# ===================== 异步 CRUD 操作（供 FastAPI 路由使用，不阻塞事件循环） =====================
+async def acreate_session(db: AsyncSession, session_create: SessionCreate) -> ChatSession:
+    """创建一个新的聊天会话（异步）"""
+    title = session_create.title if session_create.title else "New Chat Session"
+    db_session = ChatSession(title=title)
+
+    db.add(db_session)
+    await db.commit()
+    await db.refresh(db_session)
+    return db_session
+
+async def aget_session(db: AsyncSession, session_id: str) -> Optional[ChatSession]:
+    """根据ID获取聊天会话（异步）"""
+    result = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+    return result.scalars().first()
+
+async def aget_sessions(db: AsyncSession, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[ChatSession]:
+    """获取聊天会话（异步，按创建时间倒序，支持游标分页）"""
+    result = await db.execute(_sessions_stmt(limit, cursor))
+    return list(result.scalars().all())
+
+async def aget_session_summaries(db: AsyncSession, limit: Optional[int] = None, cursor: Optional[str] = None) -> list:
+    """获取会话摘要列表：消息数量 + 最后一条消息预览，单条查询完成，不加载消息"""
+    result = await db.execute(_session_summaries_stmt(limit, cursor))
+    return list(result.all())
+
+async def aget_session_watermark(db: AsyncSession, session_id: str):
+    """会话的变更水位（会话不存在时返回 None），用于 ETag 与增量同步"""
+    result = await db.execute(_session_watermark_stmt(session_id))
+    return result.first()
+
+async def aupdate_session(db: AsyncSession, session_id: str, session_update: SessionUpdate) -> Optional[ChatSession]:
+    """更新聊天会话的标题（异步）"""
+    db_session = await aget_session(db, session_id)
+    if db_session:
+        update_dict = {k: v for k, v in session_update.dict().items() if v is not None}
+        if update_dict:
+            for key, value in update_dict.items():
+                if hasattr(db_session, key):
+                    setattr(db_session, key, value)
+            await db.commit()
+            await db.refresh(db_session)
+    return db_session
+
+async def aupdate_session_summary(db: AsyncSession, session_id: str, summary: str, summary_cursor: str) -> None:
+    """保存会话的滚动摘要及其覆盖到的消息游标（不改变会话的更新时间）"""
+    await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(summary=summary, summary_cursor=summary_cursor, updated_at=ChatSession.updated_at)
+    )
+    await db.commit()
+
+async def adelete_session(db: AsyncSession, session_id: str) -> bool:
+    """删除聊天会话及其关联的消息（异步）"""
+    db_session = await aget_session(db, session_id)
+    if db_session:
+        hashes = list((await db.execute(_session_blob_hashes_stmt(session_id))).scalars().all())
+        # 直接按会话删除消息，避免 ORM 级联时逐条加载消息
+        await db.execute(delete(ToolInvocation).where(ToolInvocation.session_id == session_id))
+        await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+        await db.execute(delete(ChatTurn).where(ChatTurn.session_id == session_id))
+        await db.execute(delete(ChatJob).where(ChatJob.session_id == session_id))
+        for chunk in _chunks(hashes):
+            await db.execute(_orphan_blobs_delete(chunk))
+        await db.delete(db_session)
+        await db.commit()
+        return True
+    return False
+
+def _single_session(message_creates: List[MessageCreate]) -> str:
+    session_ids = {message_create.session_id for message_create in message_creates}
+    if len(session_ids) != 1:
+        raise ValueError("一次写入的消息必须属于同一会话")
+    return session_ids.pop()
+
+async def _ainsert_messages(
+    db: AsyncSession, message_creates: List[MessageCreate], messages: List[ChatMessage],
+    rows: List[dict], invocations: List[ToolInvocation], blobs: List[dict],
+) -> None:
+    """写入大字段、消息（INSERT ... RETURNING rowid）、全文索引行与工具调用行，由调用方提交"""
+    if blobs:
+        await db.execute(insert_blobs_stmt(blobs))
+    rowids = dict((await db.execute(_INSERT_MESSAGES, rows)).all())
+    index_rows = _search_index_rows(messages, message_creates, rowids)
+    if index_rows:
+        await db.execute(INDEX_SQL, index_rows)
+    db.add_all(invocations)
+
+async def acreate_messages(db: AsyncSession, message_creates: List[MessageCreate]) -> List[ChatMessage]:
+    """
+    一轮的消息写入（例如用户消息 + assistant 消息），一个事务：
+    - 先更新会话的 updated_at 与消息数，UPDATE ... RETURNING 同时确认会话存在，不再单独查询会话
+    - 所有消息一条 INSERT ... RETURNING 写入；返回的消息对象由应用构造，提交后不 refresh
+    会话不存在时抛出 ValueError；开启组提交时整批交给 message_group_committer，与其他轮次合并提交
+    """
+    if not message_creates:
+        return []
+    _single_session(message_creates)
+    if message_group_committer.enabled:
+        return await message_group_committer.submit(message_creates)
+
+    messages, rows, invocations, blobs = _new_messages(message_creates)
+    touched = await db.execute(_TOUCH_SESSION.returning(_sessions_table.c.id), _touch_params(messages)[0])
+    if touched.first() is None:
+        await db.rollback()
+        raise ValueError("会话不存在")
+    await _ainsert_messages(db, message_creates, messages, rows, invocations, blobs)
+    await db.commit()
+    return messages
+
+async def acreate_sessions_with_messages(
+    db: AsyncSession, titles: Dict[str, str], message_creates: List[MessageCreate]
+) -> List[ChatMessage]:
+    """
+    批量创建会话并写入各自的消息（批量问答，titles 为 会话ID => 标题），一个事务：
+    会话一条 executemany（创建时间、updated_at 与消息数直接按本批消息写好），消息一条 INSERT ... RETURNING
+    """
+    if not message_creates:
+        return []
+    messages, rows, invocations, blobs = _new_messages(message_creates)
+    sessions: Dict[str, dict] = {}
+    for message in messages:
+        session = sessions.setdefault(message.session_id, {
+            "id": message.session_id, "title": titles[message.session_id],
+            "created_at": message.created_at, "updated_at": message.created_at, "message_count": 0,
+        })
+        session["updated_at"] = max(session["updated_at"], message.created_at)
+        session["message_count"] += 1
+    await db.execute(insert(_sessions_table), list(sessions.values()))
+    await _ainsert_messages(db, message_creates, messages, rows, invocations, blobs)
+    await db.commit()
+    return messages
+
+async def acreate_message(db: AsyncSession, message_create: MessageCreate) -> ChatMessage:
+    """创建一条新的聊天消息（异步）"""
+    return (await acreate_messages(db, [message_create]))[0]
+
+async def aget_messages_by_session(
+    db: AsyncSession, session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None
+) -> List[ChatMessage]:
+    """根据会话ID获取关联的聊天消息（异步，按时间正序，支持游标分页）"""
+    result = await db.execute(_messages_stmt(session_id, limit, cursor))
+    return await aresolve_contents(db, list(result.scalars().all()))
+
+async def aget_message(db: AsyncSession, message_id: str) -> Optional[ChatMessage]:
+    """根据ID获取单条聊天消息（异步）"""
+    result = await db.execute(select(ChatMessage).where(ChatMessage.id == message_id))
+    message = result.scalars().first()
+    return (await aresolve_contents(db, [message]))[0] if message else None
+
+async def adelete_messages_by_session(db: AsyncSession, session_id: str) -> int:
+    """删除某个会话下的所有聊天消息，返回删除的消息数量（异步）"""
+    hashes = list((await db.execute(_session_blob_hashes_stmt(session_id))).scalars().all())
+    await db.execute(delete(ToolInvocation).where(ToolInvocation.session_id == session_id))
+    result = await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+    await db.execute(_clear_session_stmt(session_id))
+    for chunk in _chunks(hashes):
+        await db.execute(_orphan_blobs_delete(chunk))
+    await db.commit()
+    return result.rowcount
+
+
+# ===================== 工具调用记录 =====================
+async def aget_tool_invocations(
+    db: AsyncSession, message_ids: List[str], include_results: bool = True, max_result_chars: Optional[int] = None
+) -> Dict[str, List[dict]]:
+    """
+    批量读取多条消息的工具调用记录，按消息ID分组、按调用顺序排列
+    include_results=False 时不读取结果内容；max_result_chars 指定时只解压并返回结果的开头部分
+    """
+    if not message_ids:
+        return {}
+    # 不需要结果内容时不读取压缩数据列
+    columns = (ContentBlob.size, ContentBlob.encoding, ContentBlob.data) if include_results else (ContentBlob.size,)
+    result = await db.execute(
+        select(ToolInvocation, *columns)
+        .outerjoin(ContentBlob, ContentBlob.hash == ToolInvocation.result_hash)
+        .where(ToolInvocation.message_id.in_(message_ids))
+        .order_by(ToolInvocation.message_id, ToolInvocation.position)
+    )
+    partial = max_result_chars is not None or not include_results
+    grouped: Dict[str, List[dict]] = {}
+    for row in result.all():
+        invocation, size = row[0], row[1]
+        content = None
+        if include_results and row[3] is not None:
+            content = decode(row[2], row[3], max_result_chars)
+        grouped.setdefault(invocation.message_id, []).append(
+            invocation_record(invocation, content, size if partial else None)
+        )
+    return grouped
+
+async def atool_usage_stats(db: AsyncSession, since: Optional[datetime] = None) -> list:
+    """按工具汇总调用次数、失败次数与耗时；只扫描调用记录表，不解析消息"""
+    stmt = select(
+        ToolInvocation.tool_name,
+        func.count().label("calls"),
+        func.sum(case((ToolInvocation.status == "success", 0), else_=1)).label("errors"),
+        func.avg(ToolInvocation.latency_ms).label("avg_latency_ms"),
+        func.max(ToolInvocation.latency_ms).label("max_latency_ms"),
+    ).group_by(ToolInvocation.tool_name).order_by(func.count().desc())
+    if since is not None:
+        stmt = stmt.where(ToolInvocation.created_at >= since)
+    result = await db.execute(stmt)
+    return list(result.all())
+
+
+# ===================== 流式轮次（断线续传）=====================
+async def acreate_turn(db: AsyncSession, session_id: str) -> ChatTurn:
+    """登记一次新的流式生成"""
+    db_turn = ChatTurn(session_id=session_id)
+    db.add(db_turn)
+    await db.commit()
+    return db_turn
+
+async def aget_turn(db: AsyncSession, turn_id: str) -> Optional[ChatTurn]:
+    """根据ID获取流式轮次"""
+    result = await db.execute(select(ChatTurn).where(ChatTurn.id == turn_id))
+    return result.scalars().first()
+
+async def acheckpoint_turn(db: AsyncSession, turn_id: str, content: str, last_event_id: int) -> None:
+    """
+    保存部分答案的检查点，同时刷新 updated_at；生成期间定期调用（没有新内容时也调用，作为仍在运行的心跳）
+    """
+    await db.execute(
+        update(ChatTurn)
+        .where(ChatTurn.id == turn_id, ChatTurn.status == "running")
+        .values(content=content, last_event_id=last_event_id, updated_at=utcnow())
+    )
+    await db.commit()
+
+async def afinish_turn(
+    db: AsyncSession,
+    turn_id: str,
+    status: str,
+    content: str,
+    last_event_id: int,
+    tool_calls: Optional[str] = None,
+    from_cache: bool = False,
+    message: Optional[MessageCreate] = None,
+) -> bool:
+    """
+    记录流式轮次的最终状态和完整内容，并保存 assistant 消息（message）
+    只有状态仍为 running 时才生效：轮次已被其他进程判定为中断（部分答案已保存）时返回 False，不再写入消息
+    """
+    result = await db.execute(
+        update(ChatTurn)
+        .where(ChatTurn.id == turn_id, ChatTurn.status == "running")
+        .values(
+            status=status,
+            content=content,
+            last_event_id=last_event_id,
+            tool_calls=tool_calls,
+            from_cache=from_cache,
+        )
+    )
+    await db.commit()
+    if not result.rowcount:
+        return False
+    if message is not None:
+        assistant_message = await acreate_message(db, message)
+        await db.execute(
+            update(ChatTurn).where(ChatTurn.id == turn_id).values(assistant_message_id=assistant_message.id)
+        )
+        await db.commit()
+    return True
+
+async def ainterrupt_turn(db: AsyncSession, db_turn: ChatTurn) -> bool:
+    """
+    把已失去生成进程的轮次标记为 interrupted，并把检查点中的部分答案保存为 assistant 消息
+    只有状态仍为 running 时才生效，多个进程同时发现时只会保存一次
+    """
+    result = await db.execute(
+        update(ChatTurn)
+        .where(ChatTurn.id == db_turn.id, ChatTurn.status == "running")
+        .values(status="interrupted")
+    )
+    await db.commit()
+    if not result.rowcount:
+        return False
+    if db_turn.content:
+        message = await acreate_message(db, MessageCreate(
+            session_id=db_turn.session_id, role="assistant", content=db_turn.content
+        ))
+        await db.execute(
+            update(ChatTurn).where(ChatTurn.id == db_turn.id).values(assistant_message_id=message.id)
+        )
+        await db.commit()
+    return True
+
+async def arecover_stale_turns(db: AsyncSession, stale_before: datetime) -> int:
+    """启动时清理上次进程遗留的 running 轮次，返回处理的数量"""
+    result = await db.execute(
+        select(ChatTurn).where(ChatTurn.status == "running", ChatTurn.updated_at < stale_before)
+    )
+    recovered = 0
+    for db_turn in result.scalars().all():
+        if await ainterrupt_turn(db, db_turn):
+            recovered += 1
+    return recovered
+
+
+# ===================== 后台任务 =====================
+async def acreate_job(db: AsyncSession, session_id: str, message: str, use_cache: bool = True) -> ChatJob:
+    """登记一个排队中的后台任务"""
+    db_job = ChatJob(session_id=session_id, message=message, use_cache=use_cache)
+    db.add(db_job)
+    await db.commit()
+    return db_job
+
+async def aget_job(db: AsyncSession, job_id: str) -> Optional[ChatJob]:
+    """根据ID获取后台任务"""
+    result = await db.execute(select(ChatJob).where(ChatJob.id == job_id))
+    return result.scalars().first()
+
+async def aupdate_job(db: AsyncSession, job_id: str, **values) -> None:
+    """更新后台任务的状态、部分输出等字段"""
+    await db.execute(update(ChatJob).where(ChatJob.id == job_id).values(**values))
+    await db.commit()
+
+async def aclaim_job(db: AsyncSession, job_id: str) -> bool:
+    """
+    把排队中的任务原子地改为 running；多个 worker 进程同时取到同一任务时只有一个成功
+    """
+    result = await db.execute(
+        update(ChatJob)
+        .where(ChatJob.id == job_id, ChatJob.status == "queued")
+        .values(status="running", started_at=utcnow())
+    )
+    await db.commit()
+    return bool(result.rowcount)
+
+async def arecover_jobs(db: AsyncSession, stale_before: datetime) -> List[str]:
+    """
+    启动时调用：超过 stale_before 未更新的 running 任务视为所在进程已退出，标记为 interrupted（保留部分输出）；
+    仍在更新的任务可能属于其他 worker 进程，不做处理
+    返回仍在排队的任务ID（按创建时间），由任务队列继续执行
+    """
+    await db.execute(
+        update(ChatJob)
+        .where(ChatJob.status == "running", ChatJob.updated_at < stale_before)
+        .values(status="interrupted", error="服务重启，任务中断", finished_at=utcnow())
+    )
+    await db.commit()
+    result = await db.execute(
+        select(ChatJob.id).where(ChatJob.status == "queued").order_by(ChatJob.created_at)
+    )
+    return list(result.scalars().all())
+
+
+# ===================== 组提交：合并并发轮次的消息写入 =====================
+class MessageGroupCommitter:
+    """
+    组提交写入器
+    在一个很短的时间窗口内收集来自不同请求的消息插入，用一个事务统一提交，
+    把 N 次写锁 + fsync 合并为 1 次；每个调用方仍拿到自己的 ChatMessage 列表
+    """
+
+    def __init__(self, session_factory, window_ms: float, max_batch: int, enabled: bool = True):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._pending: List[Tuple[List[MessageCreate], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    async def submit(self, message_creates: List[MessageCreate]) -> List[ChatMessage]:
+        """提交同一会话的一组消息（一轮），等待所在批次提交完成后返回"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message_creates, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush(loop, immediate=True)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop)
+        return await future
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, immediate: bool = False) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if immediate:
+            batch, self._pending = self._pending, []
+            loop.create_task(self._flush(batch))
+        else:
+            self._flush_handle = loop.call_later(self.window, self._on_window_elapsed, loop)
+
+    def _on_window_elapsed(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            loop.create_task(self._flush(batch))
+
+    async def _flush(self, batch: List[Tuple[List[MessageCreate], asyncio.Future]]) -> None:
+        """
+        一个事务写入整批消息：一次查询确认会话存在，各会话的 updated_at / 消息数一次 executemany 更新，
+        全部消息一条 INSERT ... RETURNING；不存在的会话只让对应的调用方失败
+        """
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            try:
+                async with self.session_factory() as db:
+                    session_ids = {mcs[0].session_id for mcs, _ in batch}
+                    result = await db.execute(select(ChatSession.id).where(ChatSession.id.in_(session_ids)))
+                    existing = set(result.scalars().all())
+
+                    accepted = []
+                    for message_creates, future in batch:
+                        if message_creates[0].session_id not in existing:
+                            # 调用方可能已取消（例如客户端在提交窗口内断开）
+                            if not future.done():
+                                future.set_exception(ValueError("会话不存在"))
+                            continue
+                        accepted.append((message_creates, future))
+                    if accepted:
+                        message_creates = [mc for mcs, _ in accepted for mc in mcs]
+                        messages, rows, invocations, blobs = _new_messages(message_creates)
+                        await db.execute(_TOUCH_SESSION, _touch_params(messages))
+                        await _ainsert_messages(db, message_creates, messages, rows, invocations, blobs)
+                        await db.commit()
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            # 按提交顺序把消息分还给各调用方
+            position = 0
+            for message_creates, future in accepted:
+                written = messages[position:position + len(message_creates)]
+                position += len(message_creates)
+                if not future.done():
+                    future.set_result(written)
+
+
+# 全局组提交写入器（由 SQLITE_GROUP_COMMIT 开启）
+message_group_committer = MessageGroupCommitter(
+    AsyncSessionLocal,
+    window_ms=settings.SQLITE_GROUP_COMMIT_WINDOW_MS,
+    max_batch=settings.SQLITE_GROUP_COMMIT_MAX_BATCH,
+    enabled=settings.SQLITE_GROUP_COMMIT,
+)
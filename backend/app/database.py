@@ -1,14 +1,94 @@
 # backend/app/database.py
 # 1. 导入核心依赖：引擎创建+会话工厂+模型基类
-from sqlalchemy import create_engine
+import logging
+from typing import Dict
+from sqlalchemy import create_engine, event, text, inspect, select, update, or_, func
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from .config import settings
 from .models import Base
 
+# 数据库地址统一来自配置；异步引擎使用对应的异步驱动（SQLite => aiosqlite）
+DATABASE_URL = settings.DATABASE_URL
+
+def to_async_url(url: str) -> str:
+    """将同步数据库地址转换为异步驱动地址"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# SQLite 存储配置：连接建立时通过 PRAGMA 应用
+SQLITE_PROFILES: Dict[str, Dict[str, object]] = {
+    # SQLite 默认行为：回滚日志，每次提交都需要独占写锁和 fsync
+    "default": {},
+    # WAL：读写互不阻塞，synchronous=NORMAL 只在检查点时 fsync
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,   # 负数表示 KiB，即 64MiB
+        "temp_store": "MEMORY",
+    },
+}
+
+def resolve_sqlite_pragmas(profile: str) -> Dict[str, object]:
+    """根据配置名称和单项覆盖，得到最终要执行的 PRAGMA"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"未知的 SQLite 配置: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    overrides = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+    pragmas.update({k: v for k, v in overrides.items() if v})
+    return pragmas
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, object]) -> None:
+    """注册连接钩子：每个新建的 SQLite 连接都执行一遍 PRAGMA（异步引擎需传入 sync_engine）"""
+    if not pragmas or engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+SQLITE_PRAGMAS = resolve_sqlite_pragmas(settings.SQLITE_PROFILE)
+
 # 2. 创建数据库引擎
 engine = create_engine(
-    'sqlite:///./academic_agent.db', 
+    DATABASE_URL, 
     connect_args={"check_same_thread": False}   # 关闭 SQLite 的线程检查，允许多线程共享同一个数据库连接，适配 FastAPI 的并发场景，不加必报错！
     )
+
+# 异步引擎：显式设置连接池大小，内存数据库只能使用单连接的静态池，不支持连接池参数
+_pool_kwargs = {}
+if ":memory:" not in ASYNC_DATABASE_URL:
+    _pool_kwargs = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    **_pool_kwargs
+    )
+
+# 同步/异步引擎都应用同一套存储配置
+apply_sqlite_pragmas(engine, SQLITE_PRAGMAS)
+apply_sqlite_pragmas(async_engine.sync_engine, SQLITE_PRAGMAS)
+
 # 3. 创建数据库会话工厂
 SessionLocal = sessionmaker(
     autocommit=False, 
@@ -16,6 +96,14 @@ SessionLocal = sessionmaker(
     bind=engine
     )
 
+# 异步会话工厂：提交后不过期对象，避免在事件循环中触发隐式的同步加载
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+    )
+
 # 4. 封装：获取数据库会话的依赖函数
 def get_db():
     db = SessionLocal()
@@ -24,10 +112,288 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """获取异步数据库会话的依赖函数（供 FastAPI 路由使用）"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # 5. 封装：创建所有数据库表的函数
 def create_tables():
     """
     创建所有数据库表
     可以多次调用此函数，只有在表不存在时才会创建表
+    已存在的表上新增的索引也会补建
     """
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    # 先补列再补索引：新索引可能建在新增的列上
+    _add_missing_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _create_fts_tables()
+    _run_data_migrations()
+
+# SQLite 是否支持 FTS5 全文索引（create_tables 时检测，不支持时检索退化为 LIKE 查询）
+FTS5_AVAILABLE = False
+
+# 全文索引 DDL：外部内容表 + 触发器，与源表自动保持同步
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+        title, authors, abstract, content='papers', content_rowid='rowid'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_ai AFTER INSERT ON papers BEGIN
+        INSERT INTO papers_fts(rowid, title, authors, abstract)
+        VALUES (new.rowid, new.title, new.authors, new.abstract);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_ad AFTER DELETE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, authors, abstract)
+        VALUES ('delete', old.rowid, old.title, old.authors, old.abstract);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS papers_fts_au AFTER UPDATE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, authors, abstract)
+        VALUES ('delete', old.rowid, old.title, old.authors, old.abstract);
+        INSERT INTO papers_fts(rowid, title, authors, abstract)
+        VALUES (new.rowid, new.title, new.authors, new.abstract);
+    END""",
+]
+
+def _create_fts_tables():
+    """创建 FTS5 全文索引（论文库与会话历史）及同步触发器；SQLite 未编译 FTS5 时跳过"""
+    from .search import FTS_DDL as MESSAGES_FTS_DDL
+
+    global FTS5_AVAILABLE
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            for ddl in FTS_DDL + MESSAGES_FTS_DDL:
+                conn.execute(text(ddl))
+        FTS5_AVAILABLE = True
+    except Exception as e:
+        FTS5_AVAILABLE = False
+        logging.getLogger(__name__).warning(f"SQLite 不支持 FTS5，全文检索退化为 LIKE 查询: {e}")
+
+def _add_missing_columns():
+    """轻量迁移：为已存在的表补充模型中新增的（可为空的）列"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _normalize_legacy_timestamps():
+    """
+    旧数据的时间戳由 SQLite now() 生成，只精确到秒（'YYYY-MM-DD HH:MM:SS'），
+    补齐为与新数据一致的微秒格式，保证按时间比较和游标分页时的顺序正确
+    新数据都由应用生成微秒格式，整表更新只需执行一次
+    """
+    with engine.begin() as conn:
+        for table, column in (
+            ("chat_sessions", "created_at"),
+            ("chat_sessions", "updated_at"),
+            ("chat_messages", "created_at"),
+        ):
+            conn.execute(text(
+                f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+            ))
+
+def _run_data_migrations():
+    """
+    按版本号依次执行数据迁移，版本号记录在 SQLite 的 PRAGMA user_version 中，
+    每个迁移完成后更新版本号，之后启动不再执行
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as conn:
+        current = conn.execute(text("PRAGMA user_version")).scalar()
+    for version, migration in DATA_MIGRATIONS:
+        if current >= version:
+            continue
+        migration()
+        with engine.begin() as conn:
+            conn.execute(text(f"PRAGMA user_version = {version}"))
+
+def _migrate_tool_invocations(batch_size: int = 500):
+    """
+    把旧版本存放在 chat_messages.tool_calls / tool_results 中的 JSON 拆分为 tool_invocations 记录，
+    结果内容写入 content_blobs 后清空 tool_results（tool_calls 保留给前端展示）；按消息ID分批处理
+    """
+    from .blobs import insert_blobs_stmt
+    from .models import ChatMessage, ToolInvocation
+    from .tool_records import build_invocations, legacy_records
+
+    migrated = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            already = select(ToolInvocation.id).where(ToolInvocation.message_id == ChatMessage.id).exists()
+            rows = db.execute(
+                select(ChatMessage.id, ChatMessage.session_id, ChatMessage.created_at,
+                       ChatMessage.tool_calls, ChatMessage.tool_results)
+                .where(
+                    ChatMessage.id > last_id,
+                    or_(ChatMessage.tool_calls.isnot(None), ChatMessage.tool_results.isnot(None)),
+                    ~already,
+                )
+                .order_by(ChatMessage.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            blobs = {}
+            for row in rows:
+                invocations, message_blobs = build_invocations(
+                    row.id, row.session_id, legacy_records(row.tool_calls, row.tool_results), created_at=row.created_at
+                )
+                db.add_all(invocations)
+                blobs.update((blob["hash"], blob) for blob in message_blobs)
+                migrated += 1
+            if blobs:
+                db.execute(insert_blobs_stmt(list(blobs.values())))
+            db.execute(
+                update(ChatMessage)
+                .where(ChatMessage.id.in_([row.id for row in rows]))
+                .values(tool_results=None)
+            )
+            db.commit()
+            last_id = rows[-1].id
+    if migrated:
+        logging.getLogger(__name__).info(f"已把 {migrated} 条消息的工具调用迁移到 tool_invocations")
+
+def _migrate_content_blobs(batch_size: int = 500):
+    """
+    - 旧的 tool_result_blobs 表（未压缩）中的结果内容压缩后移入 content_blobs，然后删除旧表
+    - 超过 MESSAGE_BLOB_MIN_CHARS 的已有消息正文外置到 content_blobs
+    迁移后的空闲页需要手动执行 VACUUM 才会归还给文件系统
+    """
+    from .blobs import blob_row, insert_blobs_stmt
+    from .models import ChatMessage
+
+    logger = logging.getLogger(__name__)
+    if inspect(engine).has_table("tool_result_blobs"):
+        moved = 0
+        last_hash = ""
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    text("SELECT hash, content, created_at FROM tool_result_blobs WHERE hash > :last ORDER BY hash LIMIT :n"),
+                    {"last": last_hash, "n": batch_size},
+                ).all()
+                if not rows:
+                    break
+                blobs = []
+                for row in rows:
+                    blob = blob_row(row.content)
+                    # 沿用原有的哈希，tool_invocations.result_hash 不需要改写
+                    blob["hash"] = row.hash
+                    blobs.append(blob)
+                conn.execute(insert_blobs_stmt(blobs))
+                moved += len(rows)
+                last_hash = rows[-1].hash
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE tool_result_blobs"))
+        logger.info(f"已把 {moved} 条工具结果移入 content_blobs")
+
+    if settings.message_blob_min_chars <= 0:
+        return
+    externalized = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(ChatMessage.id, ChatMessage.content, ChatMessage.created_at)
+                .where(
+                    ChatMessage.id > last_id,
+                    ChatMessage.content_hash.is_(None),
+                    func.length(ChatMessage.content) >= settings.message_blob_min_chars,
+                )
+                .order_by(ChatMessage.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            blobs = {}
+            for row in rows:
+                blob = blob_row(row.content, row.created_at)
+                blobs[blob["hash"]] = blob
+                db.execute(
+                    update(ChatMessage)
+                    .where(ChatMessage.id == row.id)
+                    .values(content=row.content[:settings.message_inline_chars], content_hash=blob["hash"])
+                )
+            db.execute(insert_blobs_stmt(list(blobs.values())))
+            db.commit()
+            externalized += len(rows)
+            last_id = rows[-1].id
+    if externalized:
+        logger.info(f"已把 {externalized} 条较长的消息正文外置到 content_blobs")
+
+def _migrate_message_search(batch_size: int = 500):
+    """为已有消息建立会话历史全文索引（新消息由 crud 在写入时同步索引）；按 rowid 分批处理"""
+    from .blobs import decode
+    from .models import ContentBlob, ToolInvocation
+    from .search import INDEX_SQL, index_params
+
+    if not FTS5_AVAILABLE:
+        return
+    indexed = 0
+    last_rowid = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                text(
+                    "SELECT m.rowid, m.id, m.session_id, m.role, m.content, b.encoding, b.data FROM chat_messages m "
+                    "LEFT JOIN content_blobs b ON b.hash = m.content_hash "
+                    "WHERE m.rowid > :last ORDER BY m.rowid LIMIT :n"
+                ),
+                {"last": last_rowid, "n": batch_size},
+            ).all()
+            if not rows:
+                break
+            results = {}
+            for message_id, encoding, data in db.execute(
+                select(ToolInvocation.message_id, ContentBlob.encoding, ContentBlob.data)
+                .join(ContentBlob, ContentBlob.hash == ToolInvocation.result_hash)
+                .where(ToolInvocation.message_id.in_([row.id for row in rows]))
+            ):
+                results.setdefault(message_id, []).append(decode(encoding, data))
+            db.execute(INDEX_SQL, [
+                index_params(
+                    row.rowid, row.session_id, row.role,
+                    decode(row.encoding, row.data) if row.encoding else row.content,
+                    [{"result": result} for result in results.get(row.id, [])],
+                )
+                for row in rows
+            ])
+            db.commit()
+            indexed += len(rows)
+            last_rowid = rows[-1].rowid
+    if indexed:
+        logging.getLogger(__name__).info(f"已为 {indexed} 条已有消息建立全文索引")
+
+def _migrate_session_counters():
+    """
+    会话表新增的消息数由写入消息时维护，为已有会话补齐；
+    updated_at 同时取到最后一条消息的时间（之前写入消息不更新会话）
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE chat_sessions SET "
+            "message_count = (SELECT count(*) FROM chat_messages m WHERE m.session_id = chat_sessions.id), "
+            "updated_at = max(updated_at, coalesce("
+            "  (SELECT max(m.created_at) FROM chat_messages m WHERE m.session_id = chat_sessions.id), updated_at"
+            "))"
+        ))
+
+# (版本号, 迁移函数)，按版本号升序排列
+DATA_MIGRATIONS = [
+    (1, _migrate_tool_invocations),
+    (2, _migrate_content_blobs),
+    (3, _migrate_message_search),
+    (4, _migrate_session_counters),
+    (5, _normalize_legacy_timestamps),
+]
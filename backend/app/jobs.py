@@ -0,0 +1,127 @@
+# backend/app/jobs.py
+"""
+进程内的后台任务队列
+- 固定数量的 worker 协程从队列中取任务执行，限制同时运行的 Agent 数量
+- 排队数量达到上限时 reserve() 返回 False，由 API 返回 429 和 Retry-After
+- 任务状态变化时唤醒长轮询的请求
+任务本身的执行逻辑（构建历史、调用 Agent、写库）由 runner 提供
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .config import settings
+from .metrics import REGISTRY, Gauge
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """有界的后台任务队列"""
+
+    def __init__(self, workers: int, max_size: int):
+        self.workers = max(workers, 1)
+        self.max_size = max(max_size, 1)
+        self.runner: Optional[Callable[[str], Awaitable[None]]] = None
+        self.queued = 0                    # 已占用的排队名额（含已登记但尚未入队的任务）
+        self.running = 0
+        self.avg_seconds = 30.0            # 任务耗时的滑动平均，用于估算 Retry-After
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, pending: Iterable[str] = ()) -> None:
+        """启动 worker，并把数据库中仍在排队的任务重新入队"""
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        for job_id in pending:
+            self.queued += 1
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"后台任务队列已启动: {self.workers} 个 worker，恢复 {self.queued} 个排队任务")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def reserve(self) -> bool:
+        """占用一个排队名额；队列已满时返回 False"""
+        if self.queued >= self.max_size:
+            return False
+        self.queued += 1
+        return True
+
+    def release(self) -> None:
+        """登记任务失败时归还名额"""
+        self.queued = max(self.queued - 1, 0)
+
+    def enqueue(self, job_id: str) -> None:
+        """把已占用名额的任务放入队列"""
+        self._queue.put_nowait(job_id)
+
+    def retry_after(self) -> int:
+        """估算多久后会空出排队名额（秒）"""
+        return max(math.ceil(self.avg_seconds / self.workers), 1)
+
+    def notify(self, job_id: str) -> None:
+        """任务状态变化，唤醒等待该任务的长轮询请求"""
+        for waiter in self._waiters.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """等待任务状态变化或超时"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    self._waiters.pop(job_id, None)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self.queued = max(self.queued - 1, 0)
+            self.running += 1
+            started = time.perf_counter()
+            try:
+                await self.runner(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"后台任务 {job_id} 执行失败: {e}", exc_info=True)
+            finally:
+                self.running -= 1
+                self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * (time.perf_counter() - started)
+                self.notify(job_id)
+                self._queue.task_done()
+
+
+# 全局任务队列
+job_queue = JobQueue(settings.job_workers, settings.job_queue_max_size)
+
+
+def _job_metrics():
+    """渲染 /metrics 时读取任务队列的当前状态"""
+    jobs = Gauge("chat_jobs", "Background jobs in the in-process queue by state", ["state"])
+    jobs.set(job_queue.queued, state="queued")
+    jobs.set(job_queue.running, state="running")
+    return [jobs]
+
+
+REGISTRY.register_collector(_job_metrics)
@@ -1,9 +1,19 @@
 # backend/app/main.py
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse
 from contextlib import contextmanager, asynccontextmanager
+import asyncio
 import logging
-from .database import create_tables
-from .api import router as api_router
+from datetime import timedelta
+from .config import settings
+from .database import create_tables, AsyncSessionLocal
+from . import crud
+from .models import utcnow
+from .api import router as api_router, papers_router
+from .metrics import REGISTRY
+from .jobs import job_queue
+from .services import agent_service
+from .state import state_backend
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,7 +26,26 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting up the application...")
     create_tables()
+    # 上次进程退出时仍在生成的流式轮次：保存检查点中的部分答案并标记为中断
+    async with AsyncSessionLocal() as db:
+        recovered = await crud.arecover_stale_turns(
+            db, utcnow() - timedelta(seconds=settings.stream_turn_stale_seconds)
+        )
+        # 上次进程中仍在排队的后台任务继续执行
+        pending_jobs = await crud.arecover_jobs(
+            db, utcnow() - timedelta(seconds=settings.stream_turn_stale_seconds)
+        )
+    if recovered:
+        logger.info(f"已恢复 {recovered} 个中断的流式轮次")
+    job_queue.start(pending_jobs)
+    # 在后台预热 Agent：服务立即开始监听，/ready 在 Agent 构建完成后变为就绪
+    warmup = asyncio.create_task(agent_service.warm_up()) if settings.agent_warmup else None
     yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await job_queue.stop()
+    await agent_service.aclose()
+    await state_backend.aclose()
     logger.info("Shutting down the application...")
 
 app=FastAPI(
@@ -26,4 +55,20 @@ app=FastAPI(
     lifespan=lifespan   # 注册lifespan
 )
 
-app.include_router(api_router)  
\ No newline at end of file
+app.include_router(api_router)
+app.include_router(papers_router)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """以 Prometheus 文本格式输出指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """就绪检查：Agent 构建完成前返回 503"""
+    if agent_service.ready:
+        return JSONResponse({"status": "ready", "init_seconds": agent_service.init_seconds})
+    status = "error" if agent_service.init_error else "starting"
+    return JSONResponse({"status": status, "error": agent_service.init_error}, status_code=503)
@@ -0,0 +1,289 @@
+# backend/app/metrics.py
+"""
+请求级指标
+- 轻量的 Prometheus 指标实现（Counter / Gauge / Histogram），由 /metrics 以文本格式输出
+- TurnMetrics：记录一轮对话各阶段耗时、首 token 时间、工具调用、token 数，可选记录慢请求日志
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签组合 => [各桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative:g}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {data[-1]:g}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {data[-2]:g}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {data[-1]:g}"
+
+
+class Registry:
+    """指标注册表；collector 在输出时被调用，用于导出其他组件自带的计数（如缓存命中数）"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception as e:
+                logger.warning(f"指标收集失败: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TURN_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "chat_turn_phase_seconds", "Duration of each phase of a chat turn", ["endpoint", "phase"]))
+TOOL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "chat_tool_call_seconds", "Latency of individual tool calls", ["endpoint", "tool", "status"]))
+TURN_TOOL_CALLS = REGISTRY.register(Histogram(
+    "chat_turn_tool_calls", "Number of tool calls per chat turn", ["endpoint"], buckets=(0, 1, 2, 3, 5, 8, 13)))
+TURN_TOKENS = REGISTRY.register(Counter(
+    "chat_tokens_total", "Prompt and completion tokens reported by the model", ["endpoint", "kind"]))
+# 首 token 时间按本轮是否命中模型服务的前缀缓存分开统计，用于确认前缀稳定带来的收益
+FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "chat_first_token_seconds", "Time to first token by provider prompt cache outcome", ["endpoint", "prompt_cache"]))
+TURNS_TOTAL = REGISTRY.register(Counter(
+    "chat_turns_total", "Completed chat turns", ["endpoint", "status"]))
+SLOW_TURNS_TOTAL = REGISTRY.register(Counter(
+    "chat_slow_turns_total", "Chat turns slower than SLOW_TURN_SECONDS", ["endpoint"]))
+
+# 当前请求正在记录的 TurnMetrics（供 services / 工具中间件在调用链深处记录）
+current_turn: ContextVar[Optional["TurnMetrics"]] = ContextVar("current_turn", default=None)
+
+
+class TurnMetrics:
+    """一轮对话的指标记录器"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.tool_calls: List[Tuple[str, float, float, str]] = []   # (工具名, 开始时间, 耗时, 状态)
+        self.tool_timings: Dict[str, Tuple[float, str]] = {}        # 调用ID => (耗时, 状态)，写入 tool_invocations
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0   # 命中模型服务前缀缓存的输入 token（OpenAI 兼容接口的 cached_tokens）
+        self._first_token_marked = False
+        self._token = None
+
+    def activate(self) -> "TurnMetrics":
+        """设为当前上下文的记录器"""
+        self._token = current_turn.set(self)
+        return self
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个阶段的耗时（同一阶段多次进入时累加）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def mark_first_token(self) -> None:
+        if not self._first_token_marked:
+            self._first_token_marked = True
+            self.phases["time_to_first_token"] = time.perf_counter() - self.started
+
+    def add_tool_call(
+        self, tool: str, started: float, seconds: float, status: str = "success", call_id: Optional[str] = None
+    ) -> None:
+        self.tool_calls.append((tool, started, seconds, status))
+        if call_id:
+            self.tool_timings[call_id] = (seconds, status)
+
+    def _tool_wall_seconds(self) -> float:
+        """工具调用占用的墙钟时间（并发调用的时间区间取并集）"""
+        intervals = sorted((started, started + seconds) for _, started, seconds, _ in self.tool_calls)
+        total, current_start, current_end = 0.0, None, None
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    total += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            total += current_end - current_start
+        return total
+
+    def add_usage(self, usage: Optional[Dict]) -> None:
+        """累加模型返回的 usage_metadata"""
+        if not usage:
+            return
+        self.prompt_tokens += int(usage.get("input_tokens") or 0)
+        self.completion_tokens += int(usage.get("output_tokens") or 0)
+        self.cached_prompt_tokens += int((usage.get("input_token_details") or {}).get("cache_read") or 0)
+
+    def usage(self) -> Dict[str, int]:
+        """本轮累计的 token 用量（响应中返回）"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+        }
+
+    def finish(self, status: str = "success") -> None:
+        """结束本轮：写入各项指标，超过阈值时记录慢请求日志"""
+        if self._token is not None:
+            current_turn.reset(self._token)
+            self._token = None
+        total = time.perf_counter() - self.started
+        self.phases["total"] = total
+        # 模型生成耗时 = Agent 运行耗时 - 工具调用占用的墙钟时间
+        if "agent_run" in self.phases:
+            self.phases["llm_generation"] = max(self.phases["agent_run"] - self._tool_wall_seconds(), 0.0)
+
+        for name, seconds in self.phases.items():
+            TURN_PHASE_SECONDS.observe(seconds, endpoint=self.endpoint, phase=name)
+        for tool, _, seconds, tool_status in self.tool_calls:
+            TOOL_CALL_SECONDS.observe(seconds, endpoint=self.endpoint, tool=tool, status=tool_status)
+        TURN_TOOL_CALLS.observe(len(self.tool_calls), endpoint=self.endpoint)
+        TURN_TOKENS.inc(self.prompt_tokens, endpoint=self.endpoint, kind="prompt")
+        TURN_TOKENS.inc(self.completion_tokens, endpoint=self.endpoint, kind="completion")
+        TURN_TOKENS.inc(self.cached_prompt_tokens, endpoint=self.endpoint, kind="cached_prompt")
+        if "time_to_first_token" in self.phases and self.prompt_tokens:
+            FIRST_TOKEN_SECONDS.observe(
+                self.phases["time_to_first_token"], endpoint=self.endpoint,
+                prompt_cache="hit" if self.cached_prompt_tokens else "miss",
+            )
+        TURNS_TOTAL.inc(endpoint=self.endpoint, status=status)
+
+        if settings.slow_turn_seconds > 0 and total >= settings.slow_turn_seconds:
+            SLOW_TURNS_TOTAL.inc(endpoint=self.endpoint)
+            logger.warning(
+                f"慢请求 {self.endpoint}: 总耗时 {total:.2f}s, 阶段 "
+                + ", ".join(f"{k}={v:.3f}s" for k, v in self.phases.items())
+                + f", 工具调用 {[(t, round(s, 3), st) for t, _, s, st in self.tool_calls]}"
+                + f", tokens {self.prompt_tokens}/{self.completion_tokens} (cached {self.cached_prompt_tokens})"
+            )
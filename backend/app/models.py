@@ -3,20 +3,26 @@
 SQLAlchemy ORM 数据库模型代码
 包含了所有依赖导入 + UUID 工具函数 + 两个核心数据表模型：ChatSession 和 ChatMessage
 一个聊天会话（ChatSession）能包含多条聊天消息（ChatMessage），多条消息一定属于某一个会话
+assistant 消息的工具调用记录在 ToolInvocation 中，结果内容与较长的正文按哈希去重、压缩存放在 ContentBlob 中
 """
 
 # 1. 导入所有依赖库
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, func
-from sqlalchemy.types import DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, Text, Index, Boolean, LargeBinary, func
+from sqlalchemy.types import DateTime, Date
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
+from datetime import datetime, timezone
 
 # 2. UUID生成工具函数
 def generate_uuid():
     # 生成uuid4类型的UUID，转为字符串返回
     return str(uuid.uuid4())
 
+# 时间戳工具函数：微秒精度的UTC时间（SQLite 的 now() 只精确到秒，同一秒内的消息无法稳定排序和分页）
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # 3. 声明ORM基类
 Base = declarative_base()
 
@@ -27,8 +33,15 @@ class ChatSession(Base):
 
     id = Column(String(36), primary_key=True, index=True,default=generate_uuid)
     title = Column(String(255), nullable=False, default="New Chat Session")
-    created_at = Column(DateTime, nullable=False, default=func.now())
-    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    # 消息数：写入消息时与 updated_at 在同一事务中维护，会话列表与变更水位不必逐个 COUNT
+    message_count = Column(Integer, nullable=True, default=0)
+    # 滚动摘要：已折叠进摘要的历史消息不再逐轮发送给模型
+    summary = Column(Text, nullable=True)
+    summary_cursor = Column(String(255), nullable=True)  # 最后一条已摘要消息的分页游标
+    # 为 True 时该会话不使用语义答案缓存（总是完整运行Agent）
+    answer_cache_bypass = Column(Boolean, nullable=True, default=False)
 
     # 定义与ChatMessage的关系：一个会话对应多条消息
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
@@ -36,13 +49,131 @@ class ChatSession(Base):
 # ===================== 核心表2：聊天消息表 =====================
 class ChatMessage(Base):
     __tablename__ = 'chat_messages'
+    # 复合索引：按会话读取消息并按时间排序/分页时只需一次索引扫描
+    __table_args__ = (
+        Index("ix_chat_messages_session_created", "session_id", "created_at"),
+    )
 
     id = Column(String(36), primary_key=True, index=True, default=generate_uuid)
     session_id = Column(String(36), ForeignKey('chat_sessions.id',ondelete="CASCADE"), nullable=False,index=True)       
     role = Column(String(50), nullable=False)  # 'user','assistant','system','tool'
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, nullable=False, default=func.now())
-    tool_calls=Column(Text, nullable=True)  # Text
-    tool_results=Column(Text, nullable=True)  # Text
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    # 工具调用的简要列表（名称/参数/ID 的 JSON），仅供前端展示；结构化记录在 tool_invocations 表
+    tool_calls=Column(Text, nullable=True)
+    # 旧版本的工具结果 JSON；新消息不再写入，旧数据由 database.create_tables 迁移到 tool_invocations
+    tool_results=Column(Text, nullable=True)
+    # 正文较长时完整内容存入 content_blobs，content 只保留开头一段（用于预览），读取消息时再解压还原
+    content_hash = Column(String(64), ForeignKey('content_blobs.hash'), nullable=True, index=True)
+
+    session = relationship("ChatSession", back_populates="messages")
+
+# ===================== 工具调用：结构化的调用记录与去重的结果内容 =====================
+class ContentBlob(Base):
+    """
+    内容寻址的大字段：工具结果与较长的消息正文按内容哈希去重，压缩后存放（见 app/blobs.py）
+    相同的内容（例如不同会话中重复的 arXiv 摘要）只存一份
+    """
+    __tablename__ = 'content_blobs'
+
+    hash = Column(String(64), primary_key=True)      # 原文的 sha256
+    encoding = Column(String(10), nullable=False)     # raw / zlib / zstd
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)            # 原文字符数
+    stored_size = Column(Integer, nullable=False)     # 存储的字节数
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+class ToolInvocation(Base):
+    """assistant 消息中的一次工具调用：名称、参数、结果引用、耗时与状态"""
+    __tablename__ = 'tool_invocations'
+    __table_args__ = (
+        # 按消息重建历史时按调用顺序读取；按工具统计时按时间范围扫描
+        Index("ix_tool_invocations_message_position", "message_id", "position"),
+        Index("ix_tool_invocations_tool_created", "tool_name", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    message_id = Column(String(36), ForeignKey('chat_messages.id', ondelete="CASCADE"), nullable=False)
+    session_id = Column(String(36), ForeignKey('chat_sessions.id', ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)   # 在本轮中的调用顺序
+    step = Column(Integer, nullable=True)                    # 发起调用的模型输出在本轮中的序号（旧数据为空）
+    tool_call_id = Column(String(100), nullable=True)        # 模型给出的调用ID，重建历史时与 ToolMessage 配对
+    tool_name = Column(String(100), nullable=False)
+    args = Column(Text, nullable=True)                       # 参数 JSON
+    result_hash = Column(String(64), ForeignKey('content_blobs.hash'), nullable=True, index=True)
+    status = Column(String(20), nullable=False, default="success")   # success / error / timeout / no_result
+    latency_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+# ===================== 流式轮次：可断线续传的生成过程 =====================
+class ChatTurn(Base):
+    """
+    一次流式生成（一轮回答）的状态与部分内容检查点
+    事件 ID 即已发送内容的字符偏移，断线后按 Last-Event-ID 从 content 的对应位置继续
+    """
+    __tablename__ = 'chat_turns'
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    session_id = Column(String(36), ForeignKey('chat_sessions.id', ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="running")  # running / completed / failed / interrupted
+    content = Column(Text, nullable=False, default="")   # 最近一次检查点时的部分答案
+    last_event_id = Column(Integer, nullable=False, default=0)
+    tool_calls = Column(Text, nullable=True)
+    from_cache = Column(Boolean, nullable=True, default=False)
+    assistant_message_id = Column(String(36), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
+
+# ===================== 后台任务：长时间的研究轮次 =====================
+class ChatJob(Base):
+    """异步执行的一轮问答；排队中的任务持久化在数据库中，进程重启后继续执行"""
+    __tablename__ = 'chat_jobs'
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    session_id = Column(String(36), ForeignKey('chat_sessions.id', ondelete="CASCADE"), nullable=False, index=True)
+    message = Column(Text, nullable=False)
+    use_cache = Column(Boolean, nullable=False, default=True)
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued / running / completed / failed / interrupted
+    content = Column(Text, nullable=False, default="")   # 运行中为部分输出，完成后为完整答案
+    tool_calls = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    assistant_message_id = Column(String(36), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+# ===================== 缓存表：arXiv 查询结果 =====================
+class ArxivCacheEntry(Base):
+    """arXiv 工具查询结果的持久化缓存，按归一化后的查询作为键"""
+    __tablename__ = 'arxiv_cache'
+
+    key = Column(String(64), primary_key=True)   # 归一化查询的哈希
+    query = Column(Text, nullable=False)          # 归一化后的查询
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow, index=True)
+
+# ===================== 缓存表：语义答案缓存 =====================
+class AnswerCacheEntry(Base):
+    """研究问题的答案缓存，按问题的本地哈希向量做相似度匹配"""
+    __tablename__ = 'answer_cache'
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    question = Column(Text, nullable=False)
+    embedding = Column(Text, nullable=False)      # 稀疏向量的 JSON：{"维度": 权重}
+    content = Column(Text, nullable=False)
+    tool_calls = Column(Text, nullable=True)
+    tool_results = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow, index=True)
+
+# ===================== 本地论文库 =====================
+class Paper(Base):
+    """arXiv 工具返回过的论文，配合 papers_fts 全文索引用于本地检索"""
+    __tablename__ = 'papers'
 
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    id = Column(String(64), primary_key=True)     # 归一化标题的哈希
+    title = Column(Text, nullable=False)
+    authors = Column(Text, nullable=True)
+    abstract = Column(Text, nullable=True)
+    published = Column(Date, nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
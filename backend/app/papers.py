@@ -0,0 +1,177 @@
+# backend/app/papers.py
+"""
+本地论文库
+- 解析 arXiv 工具的输出，写入规范化的 papers 表（FTS5 索引由触发器同步）
+- PaperIndexCallbackHandler：挂在 arXiv 工具上，每次联网检索返回后自动入库
+- LocalPapersTool：提供给Agent的 local_papers 工具，毫秒级检索已见过的论文
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    BaseCallbackHandler,
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import BaseTool
+from sqlalchemy import or_, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database
+from .database import SessionLocal
+from .models import Paper
+
+logger = logging.getLogger(__name__)
+
+# arXiv 工具输出中每篇论文以 "Published: YYYY-MM-DD\nTitle: " 开头
+_ENTRY_SPLIT = re.compile(r"(?=^Published: \d{4}-\d{2}-\d{2}\s*\nTitle: )", re.MULTILINE)
+_ENTRY_PATTERN = re.compile(
+    r"Published: (?P<published>\d{4}-\d{2}-\d{2})\s*\n"
+    r"Title: (?P<title>.*?)\n"
+    r"Authors: (?P<authors>.*?)\n"
+    r"Summary: (?P<abstract>.*)",
+    re.DOTALL,
+)
+_QUERY_TERM = re.compile(r"\w{2,}", re.UNICODE)
+
+
+def paper_id(title: str) -> str:
+    """以归一化标题的哈希作为论文ID（arXiv 工具输出中不包含论文编号）"""
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def parse_arxiv_output(output: str) -> List[Dict[str, Any]]:
+    """把 arXiv 工具的文本输出解析为论文字典列表"""
+    papers = []
+    for chunk in _ENTRY_SPLIT.split(output or ""):
+        match = _ENTRY_PATTERN.match(chunk.strip())
+        if not match:
+            continue
+        title = " ".join(match.group("title").split())
+        try:
+            published = date.fromisoformat(match.group("published"))
+        except ValueError:
+            published = None
+        papers.append({
+            "id": paper_id(title),
+            "title": title,
+            "authors": match.group("authors").strip(),
+            "abstract": match.group("abstract").strip(),
+            "published": published,
+        })
+    return papers
+
+
+def index_arxiv_output(output: str, session_factory=SessionLocal) -> int:
+    """解析并入库，返回写入的论文数量；已存在的论文只在摘要更完整时更新"""
+    papers = parse_arxiv_output(output)
+    if not papers:
+        return 0
+    with session_factory() as db:
+        for data in papers:
+            existing = db.get(Paper, data["id"])
+            if existing is None:
+                db.add(Paper(**data))
+            elif len(data["abstract"] or "") > len(existing.abstract or ""):
+                existing.abstract = data["abstract"]
+        db.commit()
+    return len(papers)
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """把自然语言查询转换为 FTS5 MATCH 表达式（词项 OR 连接，按 bm25 排序）"""
+    terms = _QUERY_TERM.findall(query)
+    if not terms:
+        return None
+    return " OR ".join('"{}"'.format(term.replace('"', '')) for term in dict.fromkeys(terms))
+
+
+def _search_stmt(query: str, limit: int):
+    """有 FTS5 时按 bm25 排序检索，否则退化为标题/摘要的 LIKE 查询"""
+    if database.FTS5_AVAILABLE:
+        expression = _match_expression(query)
+        if expression is None:
+            return None
+        return (
+            select(Paper)
+            .from_statement(text(
+                "SELECT papers.* FROM papers_fts JOIN papers ON papers.rowid = papers_fts.rowid "
+                "WHERE papers_fts MATCH :expression ORDER BY bm25(papers_fts, 10.0, 2.0, 1.0) LIMIT :limit"
+            ).bindparams(expression=expression, limit=limit))
+        )
+    terms = _QUERY_TERM.findall(query)
+    if not terms:
+        return None
+    conditions = [or_(Paper.title.ilike(f"%{t}%"), Paper.abstract.ilike(f"%{t}%")) for t in terms]
+    return select(Paper).where(or_(*conditions)).order_by(Paper.published.desc()).limit(limit)
+
+
+def search_papers(db: Session, query: str, limit: int = 10) -> List[Paper]:
+    """在本地论文库中检索"""
+    stmt = _search_stmt(query, limit)
+    return list(db.execute(stmt).scalars().all()) if stmt is not None else []
+
+
+async def asearch_papers(db: AsyncSession, query: str, limit: int = 10) -> List[Paper]:
+    """在本地论文库中检索（异步）"""
+    stmt = _search_stmt(query, limit)
+    if stmt is None:
+        return []
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+def format_papers(papers: List[Paper]) -> str:
+    """按 arXiv 工具相同的格式输出，模型无需区分来源"""
+    return "\n\n".join(
+        f"Published: {p.published}\nTitle: {p.title}\nAuthors: {p.authors}\nSummary: {p.abstract}"
+        for p in papers
+    )
+
+
+class PaperIndexCallbackHandler(BaseCallbackHandler):
+    """挂在 arXiv 工具上的回调：工具每次返回结果后写入本地论文库"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        content = getattr(output, "content", output)
+        if not isinstance(content, str):
+            return
+        try:
+            count = index_arxiv_output(content, self.session_factory)
+            if count:
+                logger.info(f"本地论文库写入 {count} 篇论文")
+        except Exception as e:
+            # 入库失败不影响工具结果
+            logger.warning(f"本地论文库写入失败: {e}")
+
+
+class LocalPapersTool(BaseTool):
+    """local_papers 工具：检索之前通过 arXiv 获取过的论文"""
+
+    name: str = "local_papers"
+    description: str = (
+        "Search papers previously retrieved from arXiv in the local library. "
+        "Answers in milliseconds; try it before the arxiv tool and fall back to arxiv "
+        "when the local results are missing or not relevant. Input should be a search query."
+    )
+    limit: int = 5
+    session_factory: Any = SessionLocal
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        with self.session_factory() as db:
+            papers = search_papers(db, query, self.limit)
+        if not papers:
+            return "No local papers found, use the arxiv tool."
+        return format_papers(papers)
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        return await asyncio.to_thread(self._run, query)
@@ -0,0 +1,189 @@
+# backend/app/prefetch.py
+"""
+arXiv 预取
+一轮研究问答中，模型通常要先完整地想一次才决定调用 arxiv，而查询词往往就是用户问题中的关键词。
+开启后（ARXIV_PREFETCH_ENABLED），在第一次模型调用的同时：
+- 用本地规则从用户消息中提取候选查询（引号短语、去掉停用词后的英文关键词），并发发起 arXiv 查询
+- 模型随后发起的 arxiv 调用与某个候选查询足够接近（归一化词项集合的 Jaccard 相似度不低于阈值）时，
+  由 ToolExecutionMiddleware 直接用预取的结果（已完成或仍在进行的）作答，不再重新查询
+- 本轮结束时取消没有用上的预取
+查询走与 Agent 相同的工具实例（CachedArxivTool 时结果同样进入缓存与本地论文库）
+中文问题中没有英文关键词时不预取（模型通常会先翻译成英文查询）
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+
+from .metrics import REGISTRY, Counter, Histogram
+from .tools import normalize_query
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_TOTAL = REGISTRY.register(Counter(
+    "arxiv_prefetch_total", "Speculative arXiv lookups by outcome", ["result"]))
+PREFETCH_SAVED_SECONDS = REGISTRY.register(Histogram(
+    "arxiv_prefetch_saved_seconds", "arXiv latency taken off the critical path by prefetch hits",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30)))
+
+# 至少有这么多个关键词才预取，避免“总结一下第二篇”这类追问触发无意义的查询
+MIN_TERMS = 2
+MAX_TERMS = 6
+
+# 英文停用词，以及检索请求中常见但不属于检索主题的词
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who will with we you i me my our how why do does did can could would should "
+    "about any some into than then there these those please show find search look looking give list tell "
+    "explain summarize summarise paper papers article articles work works research study studies "
+    "recent latest new newest state art arxiv related recommend recommendations".split()
+)
+_QUOTED = re.compile(r'"([^"]{3,})"|“([^”]{3,})”')
+_TERM = re.compile(r"[A-Za-z][A-Za-z0-9+\-]*")
+
+
+def candidate_queries(message: str, max_queries: int = 1) -> List[str]:
+    """从用户消息中提取候选查询：先是引号中的短语，再是按出现顺序的关键词（最多 MAX_TERMS 个）"""
+    candidates: List[str] = []
+    for match in _QUOTED.finditer(message):
+        candidates.append(" ".join((match.group(1) or match.group(2)).split()))
+    terms: Dict[str, None] = {}
+    for term in _TERM.findall(message):
+        term = term.rstrip("-")
+        if len(term) > 1 and term.lower() not in STOPWORDS:
+            terms.setdefault(term, None)
+    if len(terms) >= MIN_TERMS:
+        candidates.append(" ".join(list(terms)[:MAX_TERMS]))
+    unique: Dict[str, str] = {}
+    for candidate in candidates:
+        unique.setdefault(normalize_query(candidate), candidate)
+    return list(unique.values())[:max(max_queries, 0)]
+
+
+def similarity(a: str, b: str) -> float:
+    """两个查询归一化词项集合的 Jaccard 相似度"""
+    left, right = set(normalize_query(a).split()), set(normalize_query(b).split())
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+@dataclass
+class _Lookup:
+    """一次预取查询"""
+    query: str
+    started: float
+    task: Optional[asyncio.Task] = None
+    finished: Optional[float] = None
+    served: bool = False
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # 没有用上的预取失败时不应产生 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+
+class ArxivPrefetcher:
+    """
+    预取调度：start() 在一轮开始时发起查询（按本轮用户消息的 ID 登记），
+    take() 供工具中间件在 arxiv 调用时取用匹配的结果，finish() 在本轮结束时清理
+    """
+
+    def __init__(self, tool: BaseTool, max_queries: int = 1, threshold: float = 0.6):
+        self.tool = tool
+        self.max_queries = max_queries
+        self.threshold = threshold
+        self._turns: Dict[str, List[_Lookup]] = {}
+        self._stats = {"started": 0, "hits": 0, "misses": 0, "unused": 0, "errors": 0, "saved_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """预取次数、命中率（命中 / 本轮有预取时的 arxiv 调用）与节省的总耗时"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        calls = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / calls if calls else 0.0
+        return stats
+
+    async def _lookup(self, lookup: _Lookup) -> Any:
+        try:
+            return await self.tool.ainvoke(lookup.query)
+        finally:
+            lookup.finished = time.perf_counter()
+
+    def start(self, turn_id: str, message: str) -> int:
+        """为一轮发起预取，返回发起的查询数；必须在事件循环中调用"""
+        queries = candidate_queries(message, self.max_queries)
+        if not queries:
+            return 0
+        lookups = []
+        for query in queries:
+            lookup = _Lookup(query=query, started=time.perf_counter())
+            lookup.task = asyncio.create_task(self._lookup(lookup))
+            lookup.task.add_done_callback(_retrieve_exception)
+            lookups.append(lookup)
+        self._turns[turn_id] = lookups
+        self._count("started", len(queries))
+        PREFETCH_TOTAL.inc(len(queries), result="started")
+        logger.info(f"arXiv 预取: {queries}")
+        return len(queries)
+
+    def active(self, turn_id: Optional[str]) -> bool:
+        return turn_id is not None and turn_id in self._turns
+
+    async def take(self, turn_id: str, query: str) -> Optional[str]:
+        """
+        返回与 query 匹配的预取结果（仍在进行时等待其完成）；没有匹配、预取失败或返回错误文本时返回 None，
+        由调用方照常执行工具
+        """
+        lookups = self._turns.get(turn_id)
+        if lookups is None:
+            return None
+        called = time.perf_counter()
+        best, best_score = None, 0.0
+        for lookup in lookups:
+            if lookup.served:
+                continue
+            score = similarity(lookup.query, query)
+            if score > best_score:
+                best, best_score = lookup, score
+        if best is None or best_score < self.threshold:
+            self._count("misses")
+            PREFETCH_TOTAL.inc(result="miss")
+            return None
+        best.served = True
+        try:
+            result = await best.task
+        except Exception as e:
+            logger.warning(f"arXiv 预取失败，改为直接查询: {e}")
+            result = None
+        if not isinstance(result, str) or not result or result.startswith("Arxiv exception"):
+            self._count("errors")
+            PREFETCH_TOTAL.inc(result="error")
+            return None
+        # 节省的时间：查询在模型发起调用之前已经进行的部分（已完成时即整个查询耗时）
+        saved = min(best.finished or called, called) - best.started
+        self._count("hits")
+        self._count("saved_seconds", saved)
+        PREFETCH_TOTAL.inc(result="hit")
+        PREFETCH_SAVED_SECONDS.observe(saved)
+        return result
+
+    def finish(self, turn_id: str) -> None:
+        """本轮结束：取消没有用上的预取"""
+        unused = [lookup for lookup in self._turns.pop(turn_id, []) if not lookup.served]
+        for lookup in unused:
+            lookup.task.cancel()
+        if unused:
+            self._count("unused", len(unused))
+            PREFETCH_TOTAL.inc(len(unused), result="unused")
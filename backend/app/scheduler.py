@@ -0,0 +1,192 @@
+# backend/app/scheduler.py
+"""
+Agent 准入调度
+- 每个会话串行：同一 session_id 的轮次按到达顺序依次执行，历史读取与消息写入不会交错；
+  配置了共享状态后端（STATE_BACKEND=sqlite/redis）时，再通过共享租约锁在所有 worker 之间串行
+- 全局并发上限：同时运行的 Agent 轮次不超过 max_concurrent（按 worker 计）
+- 公平排队：每个会话同一时刻最多只有一个轮次在全局队列中等待，
+  全局队列按先进先出分配名额，相当于在会话之间轮转，单个会话的大量请求不会挤占其他会话
+- 过载保护：等待超过期限或排队请求过多时拒绝（AdmissionRejected），由 API 返回 503
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from .config import settings
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+from .state import SharedLock, StateBackend, state_backend
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "agent_admission_wait_seconds", "Time a chat turn waited for admission", ["endpoint"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)))
+ADMISSION_REJECTED_TOTAL = REGISTRY.register(Counter(
+    "agent_admission_rejected_total", "Chat turns rejected by admission control", ["endpoint", "reason"]))
+
+
+class AdmissionRejected(Exception):
+    """准入被拒绝（排队超时或排队过多）"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionTicket:
+    """已获得的运行名额，结束时交给 release()"""
+    session_id: str
+    waited: float
+    shared_lock: Optional[SharedLock] = None
+
+
+class AgentScheduler:
+    """全局并发上限 + 会话内串行的准入调度器"""
+
+    def __init__(self, max_concurrent: int, queue_timeout: float, max_waiting: int, backend: Optional[StateBackend] = None):
+        self.backend = backend
+        self.max_concurrent = max(max_concurrent, 1)
+        self.queue_timeout = queue_timeout
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0                                   # 正在排队（会话锁或全局名额）的轮次数
+        self._slot_waiters: Deque[asyncio.Future] = deque()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._session_refs: Dict[str, int] = {}
+
+    def _retry_after(self) -> int:
+        return max(int(self.queue_timeout / 2), 1)
+
+    async def acquire(self, session_id: str, endpoint: str = "", timeout: Optional[float] = -1) -> AdmissionTicket:
+        """
+        排队获取运行名额：先取得会话锁，再取得全局名额
+        timeout 为 -1 时使用配置的期限，为 None 时无限等待（后台任务）
+        """
+        if timeout == -1:
+            timeout = self.queue_timeout if self.queue_timeout > 0 else None
+        if self.max_waiting > 0 and self.waiting >= self.max_waiting:
+            ADMISSION_REJECTED_TOTAL.inc(endpoint=endpoint, reason="queue_full")
+            raise AdmissionRejected("排队请求过多", self._retry_after())
+
+        started = time.perf_counter()
+        deadline = started + timeout if timeout is not None else None
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        self._session_refs[session_id] = self._session_refs.get(session_id, 0) + 1
+        self.waiting += 1
+        shared_lock = None
+        try:
+            await asyncio.wait_for(lock.acquire(), self._remaining(deadline))
+            try:
+                if self.backend is not None and self.backend.shared:
+                    shared_lock = self.backend.lock(f"session:{session_id}")
+                    if not await shared_lock.acquire(self._remaining(deadline)):
+                        shared_lock = None
+                        raise asyncio.TimeoutError()
+                await self._acquire_slot(self._remaining(deadline))
+            except BaseException:
+                if shared_lock is not None:
+                    await shared_lock.release()
+                lock.release()
+                raise
+        except asyncio.TimeoutError:
+            self._unref(session_id)
+            ADMISSION_REJECTED_TOTAL.inc(endpoint=endpoint, reason="timeout")
+            raise AdmissionRejected("排队超时", self._retry_after())
+        except BaseException:
+            self._unref(session_id)
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        ADMISSION_WAIT_SECONDS.observe(waited, endpoint=endpoint)
+        return AdmissionTicket(session_id=session_id, waited=waited, shared_lock=shared_lock)
+
+    async def release(self, ticket: AdmissionTicket) -> None:
+        """归还全局名额并释放会话锁"""
+        self._release_slot()
+        if ticket.shared_lock is not None:
+            try:
+                await ticket.shared_lock.release()
+            except Exception as e:
+                # 释放失败时租约会自行过期
+                logger.warning(f"释放会话共享锁失败: {e}")
+        lock = self._session_locks.get(ticket.session_id)
+        if lock is not None and lock.locked():
+            lock.release()
+        self._unref(ticket.session_id)
+
+    @asynccontextmanager
+    async def admit(self, session_id: str, endpoint: str = "", timeout: Optional[float] = -1):
+        ticket = await self.acquire(session_id, endpoint, timeout)
+        try:
+            yield ticket
+        finally:
+            await self.release(ticket)
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(deadline - time.perf_counter(), 0)
+
+    async def _acquire_slot(self, timeout: Optional[float]) -> None:
+        if self.active < self.max_concurrent and not self._slot_waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._slot_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已转交给本请求，但调用方放弃了：转交给下一个等待者
+                self._release_slot()
+            else:
+                waiter.cancel()
+                if waiter in self._slot_waiters:
+                    self._slot_waiters.remove(waiter)
+            raise
+
+    def _release_slot(self) -> None:
+        # 有人排队时直接把名额转交给队首，active 不变
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active = max(self.active - 1, 0)
+
+    def _unref(self, session_id: str) -> None:
+        refs = self._session_refs.get(session_id, 0) - 1
+        if refs <= 0:
+            self._session_refs.pop(session_id, None)
+            self._session_locks.pop(session_id, None)
+        else:
+            self._session_refs[session_id] = refs
+
+
+# 全局调度器
+agent_scheduler = AgentScheduler(
+    settings.agent_max_concurrent_runs,
+    settings.agent_queue_timeout_seconds,
+    settings.agent_max_waiting,
+    state_backend,
+)
+
+
+def _scheduler_metrics():
+    """渲染 /metrics 时读取调度器的当前状态"""
+    runs = Gauge("agent_runs", "Chat turns admitted or waiting for admission", ["state"])
+    runs.set(agent_scheduler.active, state="active")
+    runs.set(agent_scheduler.waiting, state="waiting")
+    return [runs]
+
+
+REGISTRY.register_collector(_scheduler_metrics)
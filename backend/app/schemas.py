@@ -1,7 +1,7 @@
 # /backend/app/schemas.py
 from pydantic import BaseModel,ConfigDict
 from typing import Any, Dict, Optional,List
-from datetime import datetime
+from datetime import datetime, date
 
 # 消息基类
 class MessageBase(BaseModel):
@@ -15,12 +15,48 @@ class MessageBase(BaseModel):
 
 # 消息创建请求
 class MessageCreate(MessageBase):
-    pass
+    # 本轮的工具调用记录：[{tool_call_id, name, args, result, status, latency_ms, step}]，写入 tool_invocations 表
+    tool_invocations: Optional[List[Dict[str, Any]]] = None
+    # 消息时间；为空时取写入时刻（与 assistant 消息一起写入的用户消息传入收到请求的时间）
+    created_at: Optional[datetime] = None
+
+# 工具调用记录
+class ToolInvocationResponse(BaseModel):
+    tool_call_id: Optional[str] = None
+    name: str
+    args: Optional[Dict[str, Any]] = None
+    result: Optional[str] = None
+    status: str
+    latency_ms: Optional[float] = None
+    step: Optional[int] = None               # 发起调用的模型输出在本轮中的序号
+    result_size: Optional[int] = None        # 结果原文的字符数（截断或省略结果时返回）
+    result_truncated: bool = False
 
 # 消息响应模型
 class MessageResponse(MessageBase):
     id: str
     created_at: datetime
+    # 仅在请求 tool_payloads=truncate/full 时返回
+    tool_invocations: Optional[List[ToolInvocationResponse]] = None
+
+# 会话历史检索的命中
+class MessageSearchHit(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    message_id: str
+    session_id: str
+    session_title: Optional[str] = None
+    role: str
+    created_at: datetime
+    snippet: str                      # 命中片段，匹配词用 <mark></mark> 标出
+    score: Optional[float] = None     # bm25 得分，越小越相关（按时间排序或退化查询时为空）
+
+# 按工具汇总的调用统计
+class ToolUsageStats(BaseModel):
+    tool_name: str
+    calls: int
+    errors: int
+    avg_latency_ms: Optional[float] = None
+    max_latency_ms: Optional[float] = None
 
 # 会话基类
 class SessionBase(BaseModel):
@@ -40,21 +76,106 @@ class SessionResponse(SessionBase):
     messages: List[MessageResponse] = []
 
 
+# 会话摘要响应模型（会话列表使用，不包含消息内容）
+class SessionSummaryResponse(SessionBase):
+    id: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+
+
+# 会话的变更水位（轻量轮询：没有变化时不需要重新拉取会话）
+class SessionWatermark(BaseModel):
+    session_id: str
+    updated_at: datetime                       # 会话更新时间与最后一条消息时间中较晚的一个
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    cursor: Optional[str] = None               # 最后一条消息的游标，作为 messages?after= 的参数
+
+
 # 会话更新请求
 class SessionUpdate(BaseModel):
     title: Optional[str] = None
+    answer_cache_bypass: Optional[bool] = None
+
+# 论文检索结果
+class PaperResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: str
+    title: str
+    authors: Optional[str] = None
+    abstract: Optional[str] = None
+    published: Optional[date] = None
 
 #聊天请求
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     stream: Optional[bool] = False
+    bypass_cache: Optional[bool] = False   # 本次请求不使用语义答案缓存
+    coalesce_ms: Optional[int] = None      # 流式合并窗口（毫秒），为空时使用服务端配置
+    coalesce_chars: Optional[int] = None   # 流式合并的字符数上限，为空时使用服务端配置
+
+#批量问答请求：每个问题在自己的新会话中回答
+class BatchRequest(BaseModel):
+    questions: List[str]
+    concurrency: Optional[int] = None      # 同时运行的问题数，为空时使用服务端配置（不超过配置的上限）
+    bypass_cache: Optional[bool] = False   # 不使用语义答案缓存
+
+#批量问答的一行结果（NDJSON，type=result）
+class BatchResult(BaseModel):
+    type: str = "result"
+    index: int
+    question: str
+    status: str                            # success / error
+    session_id: Optional[str] = None
+    message_id: Optional[str] = None
+    content: str = ""
+    tool_calls: Optional[str] = None
+    from_cache: bool = False
+    error: Optional[str] = None
+    latency_ms: float = 0.0
+
+#批量问答的汇总（NDJSON 最后一行，type=summary）
+class BatchSummary(BaseModel):
+    type: str = "summary"
+    questions: int
+    succeeded: int
+    failed: int
+    concurrency: int
+    transactions: int                      # 写库事务数
+    elapsed_seconds: float
+    questions_per_second: float
+
+#后台任务响应
+class JobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: str
+    session_id: str
+    status: str
+    content: str = ""
+    tool_calls: Optional[str] = None
+    error: Optional[str] = None
+    assistant_message_id: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+#一轮的 token 用量（模型服务返回的累计值）；cached_prompt_tokens 为命中服务端前缀缓存的输入 token
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
 
 #聊天响应
 class ChatResponse(BaseModel):
     session_id: str
     message: MessageResponse
     is_complete: bool = True
+    from_cache: bool = False
+    usage: Optional[TokenUsage] = None
 
 #流式聊天响应
 class ChatStreamChunk(BaseModel):
@@ -0,0 +1,251 @@
+# backend/app/search.py
+"""
+会话历史全文检索
+- messages_fts：FTS5 索引，rowid 与 chat_messages.rowid 一致
+  - content：消息的完整正文；tool_titles：本轮工具结果中的论文标题
+  - scope：会话与角色标记（s<会话ID> r<角色>），按会话/角色过滤时作为 AND 条件交给 FTS5，
+    由最短的倒排列表驱动查找，不需要先取出全部命中再过滤
+- 较长的正文外置到 content_blobs 后消息表只剩开头一段，触发器拿不到完整内容，
+  所以索引行由 crud 在写入消息的同一事务中插入（rowid 来自 INSERT ... RETURNING）；
+  删除由 chat_messages 上的触发器同步
+- 排序：recent 按写入顺序倒序，由 FTS5 直接按 rowid 给出；
+  relevance 按 bm25（标题列权重更高），只对最近的 SEARCH_RANK_WINDOW 条命中计算得分，
+  高频词也能在毫秒级返回；命中数少于窗口时即为完整排序。
+  命中超出窗口时更早的命中不参与排序、也翻不到，检索结果标记 truncated（接口返回 X-Search-Truncated），
+  需要遍历全部命中时使用 recent
+SQLite 未编译 FTS5 时退化为消息表上的 LIKE 查询（外置正文只能匹配开头一段）
+"""
+import base64
+import re
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database
+from .config import settings
+
+SearchOrder = Literal["relevance", "recent"]
+
+# bm25 的列权重（content, tool_titles, scope）：问“哪次讨论过某篇论文”时标题命中更相关
+RANK_WEIGHTS = (1.0, 4.0, 0.0)
+# 摘要片段的最大词数与高亮标记
+SNIPPET_TOKENS = 16
+SNIPPET_OPEN, SNIPPET_CLOSE, SNIPPET_ELLIPSIS = "<mark>", "</mark>", "…"
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, tool_titles, scope, tokenize='porter unicode61'
+    )""",
+    "INSERT INTO messages_fts(messages_fts, rank) VALUES ('rank', 'bm25({})')".format(
+        ", ".join(str(w) for w in RANK_WEIGHTS)
+    ),
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON chat_messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.rowid;
+    END""",
+]
+
+# 写入消息后（同一事务，rowid 由消息表的 INSERT ... RETURNING 取回）插入索引行
+INDEX_SQL = text(
+    "INSERT INTO messages_fts(rowid, content, tool_titles, scope) VALUES (:rowid, :content, :tool_titles, :scope)"
+)
+
+# arXiv / local_papers 工具输出中每篇论文一行 "Title: ..."
+_TITLE_LINE = re.compile(r"^Title: (.+)$", re.MULTILINE)
+# 英文停用词：bm25 要统计每个词项的文档数，高频词会读完几乎整个倒排列表，
+# 查询中还有其他词时忽略它们（引号短语中的保留）
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who will with we you i how why do does did can about".split()
+)
+# 查询中的引号短语或单个词（可带 * 表示前缀）
+_QUERY_TOKEN = re.compile(r'"([^"]+)"|(\w+\*?)', re.UNICODE)
+
+
+def tool_titles(results: Iterable[Optional[str]]) -> str:
+    """从工具结果中提取论文标题（去重，每行一个）"""
+    titles: Dict[str, None] = {}
+    for result in results:
+        if result:
+            titles.update((" ".join(t.split()), None) for t in _TITLE_LINE.findall(result))
+    return "\n".join(titles)
+
+
+def _session_token(session_id: str) -> str:
+    return "s" + session_id.replace("-", "").lower()
+
+
+def _role_token(role: str) -> str:
+    return "r" + re.sub(r"\W", "", role).lower()
+
+
+def scope(session_id: str, role: str) -> str:
+    return f"{_session_token(session_id)} {_role_token(role)}"
+
+
+def index_params(
+    rowid: int, session_id: str, role: str, content: str,
+    records: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """一条消息的索引参数；rowid 为 chat_messages.rowid，records 为工具调用记录（{name, args, result, ...}）"""
+    return {
+        "rowid": rowid,
+        "content": content,
+        "tool_titles": tool_titles(r.get("result") for r in records or [] if isinstance(r.get("result"), str)),
+        "scope": scope(session_id, role),
+    }
+
+
+def _only_stopwords(tokens: List[tuple]) -> bool:
+    return all(not phrase and word.lower() in STOPWORDS for phrase, word in tokens)
+
+
+def match_expression(query: str, session_id: Optional[str] = None, role: Optional[str] = None) -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 MATCH 表达式：各词项之间为 AND，引号内为短语，以 * 结尾的词按前缀匹配
+    （前缀需要合并所有以它开头的词的倒排列表，比完整词慢，所以不自动加）；
+    有其他词时去掉停用词；只匹配正文与标题列，会话/角色条件匹配 scope 列
+    """
+    tokens = _QUERY_TOKEN.findall(query)
+    if not _only_stopwords(tokens):
+        tokens = [(phrase, word) for phrase, word in tokens if phrase or word.lower() not in STOPWORDS]
+    parts = []
+    for phrase, word in tokens:
+        if phrase:
+            value = " ".join(phrase.replace('"', "").split())
+            if value:
+                parts.append('"{}"'.format(value))
+        elif word.endswith("*"):
+            parts.append('"{}"*'.format(word[:-1]))
+        else:
+            parts.append('"{}"'.format(word))
+    if not parts:
+        return None
+    expression = "{content tool_titles} : (" + " AND ".join(parts) + ")"
+    if session_id:
+        expression += ' AND scope : "{}"'.format(_session_token(session_id))
+    if role:
+        expression += ' AND scope : "{}"'.format(_role_token(role))
+    return expression
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"search|{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """解析检索结果的分页游标，格式不正确时抛出 ValueError"""
+    if not cursor:
+        return 0
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        if prefix != "search" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except Exception as e:
+        raise ValueError("无效的分页游标") from e
+
+
+def _fts_stmt(order: SearchOrder):
+    """
+    先在 FTS5 中取出一页命中（排序与 LIMIT 都在虚拟表内完成，snippet() 只对这一页计算），
+    再按 rowid 关联消息与会话；片段优先取正文，正文没有命中时取论文标题
+    relevance：先按 rowid 倒序找到第 :window 条命中的 rowid 作为下界，
+    rowid 范围条件由 FTS5 处理，bm25 只对窗口内的命中计算
+    """
+    if order == "relevance":
+        where = (
+            "messages_fts MATCH :expression AND rowid >= coalesce(("
+            "  SELECT min(rowid) FROM ("
+            "    SELECT rowid FROM messages_fts WHERE messages_fts MATCH :expression ORDER BY rowid DESC LIMIT :window"
+            "  )"
+            "), 0)"
+        )
+        score, inner_order, outer_order = "rank", "rank", "hits.score"
+    else:
+        # 不计算 bm25：它需要统计每个词项的全局文档数，会读完高频词的整个倒排列表
+        where = "messages_fts MATCH :expression"
+        score, inner_order, outer_order = "NULL", "rowid DESC", "hits.rowid DESC"
+    return text(
+        "SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at, "
+        "CASE WHEN instr(hits.content_snippet, :open) > 0 OR hits.title_snippet = '' "
+        "  THEN hits.content_snippet ELSE hits.title_snippet END AS snippet, "
+        "hits.score "
+        "FROM ("
+        f"  SELECT rowid, {score} AS score, "
+        f"  snippet(messages_fts, 0, :open, :close, :ellipsis, {SNIPPET_TOKENS}) AS content_snippet, "
+        f"  snippet(messages_fts, 1, :open, :close, :ellipsis, {SNIPPET_TOKENS}) AS title_snippet "
+        f"  FROM messages_fts WHERE {where} ORDER BY {inner_order} LIMIT :limit OFFSET :offset"
+        ") AS hits "
+        "JOIN chat_messages m ON m.rowid = hits.rowid "
+        "JOIN chat_sessions s ON s.id = m.session_id "
+        f"ORDER BY {outer_order}"
+    ).columns(created_at=DateTime)
+
+
+# 按 rowid 倒序的第 window + 1 条命中是否存在：存在即有命中落在相关度排序窗口之外
+_BEYOND_WINDOW_SQL = text(
+    "SELECT 1 FROM messages_fts WHERE messages_fts MATCH :expression ORDER BY rowid DESC LIMIT 1 OFFSET :window"
+)
+
+
+def _like_stmt(term_count: int, session_id: Optional[str], role: Optional[str]):
+    """没有 FTS5 时的退化查询：正文包含全部词项，按时间倒序"""
+    filters = [f"m.content LIKE :term{i}" for i in range(term_count)]
+    if session_id:
+        filters.append("m.session_id = :session_id")
+    if role:
+        filters.append("m.role = :role")
+    return text(
+        "SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at, "
+        "substr(m.content, 1, 200) AS snippet, NULL AS score "
+        "FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id "
+        f"WHERE {' AND '.join(filters)} "
+        "ORDER BY m.created_at DESC, m.id DESC LIMIT :limit OFFSET :offset"
+    ).columns(created_at=DateTime)
+
+
+async def asearch_messages(
+    db: AsyncSession,
+    query: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    order: SearchOrder = "relevance",
+    session_id: Optional[str] = None,
+    role: Optional[str] = None,
+) -> tuple:
+    """
+    检索消息，返回 (命中行列表, 下一页游标, 是否截断)；命中行包含 message_id / session_id / session_title /
+    role / created_at / snippet / score（bm25，越小越相关；按时间排序时为空）
+    按相关度排序时只对最近的 SEARCH_RANK_WINDOW 条命中排序、只能翻到窗口末尾，
+    命中超出窗口时“是否截断”为 True，需要遍历全部命中时使用 order=recent
+    """
+    offset = decode_cursor(cursor)
+    params: Dict[str, Any] = {"limit": limit, "offset": offset}
+    if database.FTS5_AVAILABLE:
+        expression = match_expression(query, session_id, role)
+        if expression is None:
+            return [], None, False
+        if order == "relevance" and _only_stopwords(_QUERY_TOKEN.findall(query)):
+            # 只有停用词时 bm25 区分不出相关度，而统计文档数要读完整个倒排列表，直接按时间排序
+            order = "recent"
+        stmt = _fts_stmt(order)
+        params.update(expression=expression, open=SNIPPET_OPEN, close=SNIPPET_CLOSE, ellipsis=SNIPPET_ELLIPSIS)
+        if order == "relevance":
+            params["window"] = settings.search_rank_window
+    else:
+        terms = [phrase or word.rstrip("*") for phrase, word in _QUERY_TOKEN.findall(query)]
+        if not terms:
+            return [], None, False
+        stmt = _like_stmt(len(terms), session_id, role)
+        params.update((f"term{i}", f"%{term}%") for i, term in enumerate(terms))
+        params.update({k: v for k, v in (("session_id", session_id), ("role", role)) if v})
+    rows = (await db.execute(stmt, params)).all()
+    next_page = encode_cursor(offset + limit) if len(rows) == limit else None
+    truncated = False
+    if order == "relevance" and database.FTS5_AVAILABLE:
+        if offset + limit >= settings.search_rank_window:
+            next_page = None
+        window_params = {"expression": params["expression"], "window": settings.search_rank_window}
+        truncated = (await db.execute(_BEYOND_WINDOW_SQL, window_params)).first() is not None
+    return rows, next_page, truncated
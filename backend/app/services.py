@@ -1,111 +1,560 @@
 # backend/app/services.py
-from typing import Dict, List, Optional, Any,AsyncIterator
-from langchain.agents import create_agent
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage,ToolMessage
-from langchain_community.agent_toolkits.load_tools import load_tools
+from typing import Dict, List, Optional, Any,AsyncIterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import textwrap
+import threading
+import time
+import uuid
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, SystemMessage,ToolMessage
 import logging
 import json
+import re
 from .config import settings
+from .tools import CachedArxivTool, ToolExecutionMiddleware, parse_tool_timeouts
+from .answer_cache import SemanticAnswerCache
+from .prefetch import ArxivPrefetcher
+from .papers import LocalPapersTool, PaperIndexCallbackHandler
+from .metrics import REGISTRY, Counter, current_turn
 
 
 logger = logging.getLogger(__name__)
 
+# 摘要模型的提示词
+SUMMARY_PROMPT = """你是对话摘要助手。请把已有摘要和新增的对话合并为一份新的摘要，
+保留用户的研究主题、关注的论文（标题/作者/年份）、已得出的结论和尚未解决的问题，
+不要编造内容，不超过{max_tokens}字。只输出摘要本身。"""
+
+# Agent 的系统提示词：构建 Agent 时确定一次，此后每轮逐字节相同。
+# OpenAI 兼容的模型服务（包括百炼）对与之前请求前缀相同的输入命中前缀缓存，计费更低、首 token 更快，
+# 所以提示词中不放时间、会话等逐轮变化的内容，这类内容放在历史末尾
+SYSTEM_PROMPT = textwrap.dedent("""\
+    你是一个专业的研究助手，专门帮助用户查找、理解和总结学术论文。
+    你可以使用以下工具：
+    1. arxiv - 在arXiv上搜索和获取学术论文{local_papers_hint}
+
+    请按照以下步骤帮助用户：
+    1. 理解用户的研究需求
+    2. 使用合适的工具搜索相关论文
+    3. 提供论文的关键信息：标题、作者、摘要、关键贡献
+    4. 如果用户要求，可以提供论文的详细总结
+    5. 保持回答专业、准确、有用
+
+    **重要提示**：
+    - 优先搜索最近2-3年的论文
+    - 使用具体的搜索词，避免过于宽泛的查询
+    - 最多搜索2-3次，避免过多API调用
+
+    记住：始终用中文回答，除非用户特别要求使用其他语言。
+""")
+LOCAL_PAPERS_HINT = "\n2. local_papers - 在本地论文库中检索之前获取过的论文（毫秒级，优先使用，结果不相关时再使用 arxiv）"
+
+
+def build_system_prompt(tools: List[Any]) -> str:
+    return SYSTEM_PROMPT.format(
+        local_papers_hint=LOCAL_PAPERS_HINT if any(tool.name == "local_papers" for tool in tools) else ""
+    )
+
+
+def research_tools(tools: List[Any]) -> List[Any]:
+    """按配置把 arXiv 工具接入本地论文库（结果入库 + local_papers 工具）与缓存"""
+    # arXiv 每次联网返回的结果写入本地论文库，并提供 local_papers 工具
+    if settings.local_papers_enabled:
+        for tool in tools:
+            if tool.name == "arxiv":
+                tool.callbacks = [PaperIndexCallbackHandler()]
+        tools = [LocalPapersTool()] + tools
+    # 为 arXiv 工具加上内存 + SQLite 两级缓存
+    if settings.arxiv_cache_enabled:
+        tools = [
+            CachedArxivTool.wrap(
+                tool,
+                ttl_seconds=settings.arxiv_cache_ttl_seconds,
+                max_entries=settings.arxiv_cache_max_entries,
+            ) if tool.name == "arxiv" else tool
+            for tool in tools
+        ]
+    return tools
+
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+class ConversationContextManager:
+    """
+    对话上下文管理：把历史消息控制在 token 预算内
+    - 最近 keep_turns 轮保留原文
+    - 更早的轮次批量折叠进滚动摘要，摘要随会话持久化，不会每轮重新计算
+    - 两次折叠之间历史只在末尾追加，发给模型的前缀保持不变，可以命中模型服务的前缀缓存；
+      超出预算需要折叠时也至少折叠 summary_batch_turns 轮，留出余量，避免之后每轮都改写摘要
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        keep_turns: int,
+        summary_max_tokens: int,
+        summary_batch_turns: int,
+        chat_model=None,
+    ):
+        self.token_budget = token_budget
+        self.keep_turns = max(keep_turns, 1)
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_batch_turns = max(summary_batch_turns, 1)
+        self.chat_model = chat_model
+
+    @staticmethod
+    def estimate_tokens(text: Optional[str]) -> int:
+        """粗略估计 token 数：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token"""
+        if not text:
+            return 0
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def message_tokens(self, msg: Dict) -> int:
+        """一条历史消息的 token 数，包括重建历史时一并发送的工具调用参数与结果"""
+        tokens = self.estimate_tokens(msg.get("content"))
+        for invocation in msg.get("tool_invocations") or ():
+            tokens += self.estimate_tokens(json.dumps(invocation.get("args"), ensure_ascii=False))
+            tokens += self.estimate_tokens(invocation.get("result"))
+        return tokens
+
+    def _turn_tokens(self, turns: List[List[Dict]]) -> int:
+        return sum(self.message_tokens(msg) for turn in turns for msg in turn)
+
+    @staticmethod
+    def split_turns(history: List[Dict]) -> List[List[Dict]]:
+        """按用户消息切分为轮次，每轮以一条用户消息开始"""
+        turns: List[List[Dict]] = []
+        for msg in history:
+            if msg["role"] == "user" or not turns:
+                turns.append([])
+            turns[-1].append(msg)
+        return turns
+
+    async def prepare(self, history: List[Dict], summary: Optional[str] = None) -> Dict[str, Any]:
+        """
+        组装本轮发送给模型的历史
+        history 为摘要游标之后的消息；返回窗口内的历史、（可能更新后的）摘要，
+        以及本次新折叠进摘要的最后一条消息（用于持久化摘要游标）
+        """
+        turns = self.split_turns(history)
+        older = len(turns) - self.keep_turns
+
+        # 窗口外的轮次累计到一批后再折叠；超出预算时继续从最旧的轮次开始折叠，至少保留最后一轮
+        fold_count = older if older >= self.summary_batch_turns else 0
+        budget_fold = 0
+        while budget_fold < len(turns) - 1:
+            summary_tokens = self.summary_max_tokens if budget_fold else self.estimate_tokens(summary)
+            if summary_tokens + self._turn_tokens(turns[budget_fold:]) <= self.token_budget:
+                break
+            budget_fold += 1
+        if budget_fold > fold_count:
+            fold_count = min(max(budget_fold, self.summary_batch_turns), len(turns) - 1)
+
+        folded = [msg for turn in turns[:fold_count] for msg in turn]
+        window = [msg for turn in turns[fold_count:] for msg in turn]
+        if folded:
+            summary = await self.summarize(summary, folded)
+
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"以下是本会话较早对话的摘要：\n{summary}"})
+        messages.extend(window)
+
+        return {
+            "history": messages,
+            "summary": summary,
+            "summary_updated": bool(folded),
+            "summarized_through": folded[-1] if folded else None,
+            "prompt_tokens": sum(self.message_tokens(m) for m in messages),
+        }
+
+    async def summarize(self, summary: Optional[str], messages: List[Dict]) -> str:
+        """把新折叠的消息合并进已有摘要；模型不可用或调用失败时退化为截断式摘要"""
+        if self.chat_model is not None:
+            try:
+                dialogue = "\n".join(
+                    f"{'用户' if m['role'] == 'user' else '助手'}：{m.get('content') or ''}"
+                    for m in messages if m["role"] in ("user", "assistant")
+                )
+                result = await self.chat_model.ainvoke([
+                    SystemMessage(content=SUMMARY_PROMPT.format(max_tokens=self.summary_max_tokens)),
+                    HumanMessage(content=f"已有摘要：\n{summary or '（无）'}\n\n新增对话：\n{dialogue}"),
+                ])
+                content = result.content if isinstance(result.content, str) else ""
+                if content.strip():
+                    return self._clip(content.strip())
+            except Exception as e:
+                logger.warning(f"生成对话摘要失败，使用截断式摘要: {e}")
+        return self._extractive_summary(summary, messages)
+
+    def _extractive_summary(self, summary: Optional[str], messages: List[Dict]) -> str:
+        """截断式摘要：每条消息保留开头一段，整体只保留最新的部分"""
+        lines = [summary] if summary else []
+        for m in messages:
+            if m["role"] in ("user", "assistant") and m.get("content"):
+                prefix = "用户" if m["role"] == "user" else "助手"
+                lines.append(f"{prefix}：{m['content'][:120]}")
+        return self._clip("\n".join(lines), keep_tail=True)
+
+    def _clip(self, text: str, keep_tail: bool = False) -> str:
+        """把文本裁剪到摘要 token 上限以内"""
+        while text and self.estimate_tokens(text) > self.summary_max_tokens:
+            cut = max(len(text) // 10, 1)
+            text = text[cut:] if keep_tail else text[:-cut]
+        return text
+
+
+def history_to_messages(history: Optional[List[Dict]]) -> List[Any]:
+    """
+    把历史消息还原为 LangChain 消息
+    带工具调用记录的 assistant 消息展开为：发起调用的 AIMessage、与之按调用ID配对的 ToolMessage、最终答案
+    调用记录带 step 时按发起调用的模型输出分组，还原出与当时相同的消息序列（前缀缓存要求逐字节一致）；
+    旧数据没有 step，同一轮中的调用合并为一条 AIMessage
+    """
+    messages = []
+    for msg in history or ():
+        role = msg["role"]
+        if role == "system":
+            messages.append(SystemMessage(content=msg["content"]))
+        elif role == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        elif role == "assistant":
+            steps: List[List[tuple]] = []
+            for position, invocation in enumerate(msg.get("tool_invocations") or []):
+                step = invocation.get("step")
+                if not steps or (step is not None and step != steps[-1][-1][1].get("step")):
+                    steps.append([])
+                steps[-1].append((position, invocation))
+            for step in steps:
+                calls = [
+                    {
+                        "name": invocation["name"],
+                        "args": invocation.get("args") or {},
+                        # 旧数据可能没有调用ID，按消息和顺序生成一个稳定的ID用于配对
+                        "id": invocation.get("tool_call_id") or f"call_{msg.get('id', '')}_{position}",
+                        "type": "tool_call",
+                    }
+                    for position, invocation in step
+                ]
+                messages.append(AIMessage(content="", tool_calls=calls))
+                for call, (_, invocation) in zip(calls, step):
+                    messages.append(ToolMessage(
+                        content=invocation.get("result") or "",
+                        tool_call_id=call["id"],
+                        name=call["name"],
+                        status="success" if invocation.get("status") == "success" else "error",
+                    ))
+            messages.append(AIMessage(content=msg["content"]))
+        elif role == "tool" and msg.get("content"):
+            messages.append(ToolMessage(content=msg["content"], tool_call_id=msg.get("tool_call_id", "")))
+    return messages
+
+
+def collect_tool_invocations(
+    tool_calls: List[Dict], tool_messages: Dict[str, ToolMessage], steps: Optional[Dict[str, int]] = None
+) -> List[Dict]:
+    """
+    把本轮的工具调用与对应的 ToolMessage、中间件记录的耗时合并为调用记录（写入 tool_invocations）
+    steps 为 调用ID => 发起调用的模型输出在本轮中的序号
+    """
+    steps = steps or {}
+    turn = current_turn.get()
+    timings = turn.tool_timings if turn is not None else {}
+    invocations = []
+    for call in tool_calls:
+        call_id = call.get("id") or ""
+        message = tool_messages.get(call_id)
+        seconds, status = timings.get(call_id, (None, None))
+        if status is None:
+            status = (message.status or "success") if message is not None else "no_result"
+        result = None
+        if message is not None:
+            result = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+        invocations.append({
+            "tool_call_id": call_id or None,
+            "name": call.get("name", ""),
+            "args": call.get("args", {}),
+            "result": result,
+            "status": status,
+            "latency_ms": seconds * 1000 if seconds is not None else None,
+            "step": steps.get(call_id),
+        })
+    return invocations
+
+
 class AcademicResearchAgentService:
     """学术研究助手Agent 服务"""
 
-    def __init__(self):
+    def __init__(self, chat_model=None, tools=None):
         self.agent = None
-        self._initialize_agent()
+        self.context_manager = ConversationContextManager(
+            token_budget=settings.context_token_budget,
+            keep_turns=settings.context_keep_turns,
+            summary_max_tokens=settings.context_summary_max_tokens,
+            summary_batch_turns=settings.context_summary_batch_turns,
+        )
+        # 语义答案缓存（可选）：只用于没有历史上下文的问题
+        self.answer_cache = SemanticAnswerCache(
+            enabled=settings.answer_cache_enabled,
+            threshold=settings.answer_cache_threshold,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            max_entries=settings.answer_cache_max_entries,
+        )
+        # 有界线程池：仅当Agent不支持 ainvoke/astream 时，用于把同步调用移出事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.agent_executor_workers,
+            thread_name_prefix="agent-worker",
+        )
+        # 所有请求共用的模型 HTTP 客户端（连接池 + keep-alive），在第一次构建 Agent 时创建
+        self._http_client = None
+        self._http_async_client = None
+        # 构建 Agent 时确定的系统提示词（此后不再变化）
+        self.system_prompt: Optional[str] = None
+        # arXiv 预取（可选），在构建 Agent 时按工具创建
+        self.prefetcher: Optional[ArxivPrefetcher] = None
+        self.init_error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        self._init_lock = asyncio.Lock()
+        # 显式传入模型或工具时立即构建；否则延迟到 warm_up()（应用启动时）或第一个请求
+        if chat_model is not None or tools is not None:
+            self._initialize_agent(chat_model, tools)
+
+    @property
+    def ready(self) -> bool:
+        return self.agent is not None
+
+    async def warm_up(self) -> bool:
+        """
+        构建 Agent（导入模型依赖、加载工具、编译图），放在线程池中执行以免阻塞事件循环
+        并发调用只会构建一次；失败时记录错误供就绪检查返回，下次调用会重试
+        """
+        if self.agent is not None:
+            return True
+        async with self._init_lock:
+            if self.agent is not None:
+                return True
+            started = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._initialize_agent)
+            except Exception as e:
+                self.init_error = str(e)
+                return False
+            self.init_error = None
+            self.init_seconds = time.perf_counter() - started
+            logger.info(f"Agent预热完成，耗时 {self.init_seconds:.2f}s")
+            return True
+
+    async def _ensure_agent(self) -> None:
+        if not await self.warm_up():
+            raise RuntimeError(f"Agent未就绪: {self.init_error}")
 
-    def _initialize_agent(self):
-        """初始化学术研究助手Agent"""
+    def _http_clients(self):
+        """创建（或复用）访问模型服务的 HTTP 客户端，限制连接数并保持长连接"""
+        if self._http_async_client is None:
+            import httpx
+            limits = httpx.Limits(
+                max_connections=settings.llm_http_max_connections,
+                max_keepalive_connections=settings.llm_http_max_connections,
+                keepalive_expiry=settings.llm_http_keepalive_seconds,
+            )
+            timeout = httpx.Timeout(settings.llm_http_timeout_seconds)
+            self._http_client = httpx.Client(limits=limits, timeout=timeout)
+            self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._http_client, self._http_async_client
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 连接池"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_client.close()
+            self._http_async_client = self._http_client = None
+
+    def _initialize_agent(self, chat_model=None, tools=None):
+        """初始化学术研究助手Agent（可注入聊天模型和工具，便于测试与压测）"""
+        # 模型 SDK 与 Agent 框架导入较慢，延迟到构建时导入，加快应用启动
+        from langchain.agents import create_agent
+        from langchain.chat_models import init_chat_model
+        from langchain_community.agent_toolkits.load_tools import load_tools
         try:
             # 1.初始化聊天模型
-            chat_model = init_chat_model(
-                model=settings.BAI_LIAN_MODEL,
-                model_provider="openai",
-                api_key=settings.BAI_LIAN_API_KEY,
-                base_url=settings.BAI_LIAN_BASE_URL,
-                temperature=settings.agent_temperature,
-                max_tokens=settings.agent_max_tokens,
-            )
-            # 2.加载学术工具
-            tools = load_tools(
-                ["arxiv"],
-                llm=chat_model
+            if chat_model is None:
+                http_client, http_async_client = self._http_clients()
+                chat_model = init_chat_model(
+                    model=settings.BAI_LIAN_MODEL,
+                    model_provider="openai",
+                    api_key=settings.BAI_LIAN_API_KEY,
+                    base_url=settings.BAI_LIAN_BASE_URL,
+                    temperature=settings.agent_temperature,
+                    max_tokens=settings.agent_max_tokens,
+                    stream_usage=True,   # 流式输出时也返回 token 用量
+                    http_client=http_client,
+                    http_async_client=http_async_client,
                 )
+            self.context_manager.chat_model = chat_model
+            # 2.加载学术工具
+            if tools is None:
+                tools = research_tools(load_tools(
+                    ["arxiv"],
+                    llm=chat_model
+                    ))
+            self.tools = tools
+            arxiv_tool = next((tool for tool in tools if tool.name == "arxiv"), None)
+            self.prefetcher = ArxivPrefetcher(
+                arxiv_tool,
+                max_queries=settings.arxiv_prefetch_max_queries,
+                threshold=settings.arxiv_prefetch_match_threshold,
+            ) if settings.arxiv_prefetch_enabled and arxiv_tool is not None else None
             # 3.创建Agent
-            system_prompt = """你是一个专业的研究助手，专门帮助用户查找、理解和总结学术论文。
-            你可以使用以下工具：
-            1. arxiv - 在arXiv上搜索和获取学术论文
-            
-            请按照以下步骤帮助用户：
-            1. 理解用户的研究需求
-            2. 使用合适的工具搜索相关论文
-            3. 提供论文的关键信息：标题、作者、摘要、关键贡献
-            4. 如果用户要求，可以提供论文的详细总结
-            5. 保持回答专业、准确、有用
-            
-            **重要提示**：
-            - 优先搜索最近2-3年的论文
-            - 使用具体的搜索词，避免过于宽泛的查询
-            - 最多搜索2-3次，避免过多API调用
-            
-            记住：始终用中文回答，除非用户特别要求使用其他语言。
-            """
+            self.system_prompt = build_system_prompt(tools)
             self.agent = create_agent(
                 model=chat_model,
                 tools=tools,
-                system_prompt=system_prompt
+                system_prompt=self.system_prompt,
+                middleware=[ToolExecutionMiddleware(
+                    max_concurrency=settings.tool_max_concurrency,
+                    timeout_seconds=settings.tool_timeout_seconds,
+                    timeouts=parse_tool_timeouts(settings.tool_timeouts),
+                    prefetcher=self.prefetcher,
+                )]
                 )
                         
-            logger.info("Agent初始化成功")
+            prompt_digest = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()[:12]
+            logger.info(f"Agent初始化成功，系统提示词 {prompt_digest}")
             
         except Exception as e:
             logger.error(f"Agent初始化失败: {e}")
             raise
 
-    async def process_message(self, message: str, history: List[Dict] = None) -> Dict[str, Any]:
+    async def _ainvoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """异步调用Agent：优先使用 ainvoke，否则放入有界线程池执行，避免阻塞事件循环"""
+        if hasattr(self.agent, "ainvoke"):
+            return await self.agent.ainvoke(input_data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.agent.invoke, input_data)
+
+    async def _astream(self, input_data: Dict[str, Any], stream_mode: str = "messages") -> AsyncIterator[Any]:
+        """
+        异步流式调用Agent：优先使用 astream，否则在线程池中迭代同步 stream 并通过队列转发
+        消费方提前结束（客户端断开、出错或取消）时通知线程在下一项之前停止，不等待同步调用跑完
+        """
+        if hasattr(self.agent, "astream"):
+            async for chunk in self.agent.astream(input_data, stream_mode=stream_mode):
+                yield chunk
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def emit(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()   # 事件循环已关闭
+
+        def produce():
+            stream = None
+            try:
+                stream = self.agent.stream(input_data, stream_mode=stream_mode)
+                for item in stream:
+                    if stop.is_set():
+                        break
+                    emit(item)
+            except Exception as e:
+                emit(e)
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                emit(done)
+
+        def log_error(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception():
+                logger.warning(f"同步流式调用在消费方结束后出错: {future.exception()}")
+
+        future = loop.run_in_executor(self._executor, produce)
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if finished:
+                await future
+            else:
+                stop.set()
+                future.add_done_callback(log_error)
+
+    def _assemble_prompt(self, history: Optional[List[Dict]], message: str) -> Tuple[List[Any], HumanMessage]:
+        """
+        组装本轮发给 Agent 的消息：系统提示词由 Agent 固定在最前面，其后是（摘要 +）按原样还原的历史，
+        最后是本轮的用户消息；同样的历史总是得到逐字节相同的消息序列，相邻两轮之间只在末尾追加
+        开启预取时按用户消息的 ID 发起 arXiv 预取（与第一次模型调用并发）
+        """
+        messages = history_to_messages(history)
+        human = HumanMessage(content=message, id=str(uuid.uuid4()))
+        messages.append(human)
+        if self.prefetcher is not None:
+            self.prefetcher.start(human.id, message)
+        return messages, human
+
+    def _finish_turn(self, human: Optional[HumanMessage]) -> None:
+        if human is not None and self.prefetcher is not None:
+            self.prefetcher.finish(human.id)
+
+    def _use_answer_cache(self, history: Optional[List[Dict]], use_cache: bool) -> bool:
+        """答案与上下文相关，只有开启缓存、未被绕过且没有历史消息时才使用缓存"""
+        return self.answer_cache.enabled and use_cache and not history
+
+    async def process_message(self, message: str, history: List[Dict] = None, use_cache: bool = True) -> Dict[str, Any]:
         """处理用户消息（非流式）"""
+        human = None
         try:
-            if not self.agent:
-                self._initialize_agent()
-            
-            # 准备消息历史
-            langchain_messages = []
-            if history:
-                for msg in history:
-                    if msg["role"] == "user":
-                        langchain_messages.append(HumanMessage(content=msg["content"]))
-                    elif msg["role"] == "assistant":
-                        langchain_messages.append(AIMessage(content=msg["content"]))
-                    elif msg["role"] == "tool" and msg.get("content"):
-                        langchain_messages.append(ToolMessage(
-                            content=msg["content"],
-                            tool_call_id=msg.get("tool_call_id", "")
-                        ))
-            
-            # 添加当前消息
-            langchain_messages.append(HumanMessage(content=message))
+            await self._ensure_agent()
+
+            cacheable = self._use_answer_cache(history, use_cache)
+            if cacheable:
+                cached = await self.answer_cache.alookup(message)
+                if cached:
+                    return {**cached, "from_cache": True}
+            
+            # 历史（工具调用与结果按调用ID配对还原）+ 当前消息
+            langchain_messages, human = self._assemble_prompt(history, message)
             
             # 调用Agent（非流式）
             input_data = {"messages": langchain_messages}
-            result = self.agent.invoke(input_data)
+            result = await self._ainvoke(input_data)
             
             # 提取最后一条消息内容
             messages = result.get("messages", [])
             last_message = messages[-1] if messages else None
             content = last_message.content if hasattr(last_message, 'content') else ""
             
-            # 提取工具调用信息
+            # 提取工具调用信息（只看本轮新产生的消息）
+            messages = messages[len(langchain_messages):]
             tool_calls = []
             tool_results = {}
+            tool_messages = {}
+            steps = {}   # 调用ID => 发起调用的 AIMessage 在本轮中的序号
             
+            turn = current_turn.get()
             for msg in messages:
                 if isinstance(msg, AIMessage):
+                    if turn is not None:
+                        turn.add_usage(msg.usage_metadata)
                     if hasattr(msg, 'tool_calls') and msg.tool_calls:
+                        step = max(steps.values(), default=-1) + 1
                         for tool_call in msg.tool_calls:
+                            steps[tool_call.get('id', '')] = step
                             tool_info = {
                                 "name": tool_call.get('name', ''),
                                 "args": tool_call.get('args', {}),
@@ -115,100 +564,106 @@ class AcademicResearchAgentService:
                 
                 elif isinstance(msg, ToolMessage):
                     tool_results[msg.tool_call_id] = msg.content
+                    tool_messages[msg.tool_call_id] = msg
             
-            # 将tool_calls和tool_results转换为字符串存储
+            # tool_calls 的简要列表供前端展示；完整的调用记录写入 tool_invocations 表
             tool_calls_str = json.dumps(tool_calls) if tool_calls else None
             tool_results_str = json.dumps(tool_results) if tool_results else None
             
-            return {
+            response = {
                 "content": content,
                 "tool_calls": tool_calls_str,
-                "tool_results": tool_results_str
+                "tool_results": tool_results_str,
+                "tool_invocations": collect_tool_invocations(tool_calls, tool_messages, steps),
             }
+            if cacheable:
+                await self.answer_cache.astore(message, response)
+            return response
                 
         except Exception as e:
             logger.error(f"处理消息失败: {e}", exc_info=True)
-            return {"content": f"处理消息时出错: {str(e)}", "tool_calls": None, "tool_results": None}
+            return {"content": f"处理消息时出错: {str(e)}", "tool_calls": None, "tool_results": None, "error": str(e)}
+        finally:
+            self._finish_turn(human)
     
-    async def process_stream(self, message: str, history: List[Dict] = None):
+    async def _replay_cached(self, cached: Dict[str, Any]):
+        """把缓存的答案按固定大小切块，以与实时生成相同的格式回放"""
+        content = cached["content"]
+        size = max(settings.answer_cache_replay_chunk_chars, 1)
+        for start in range(0, len(content), size):
+            yield {"content": content[start:start + size], "is_final": False, "tool_calls": None}
+        yield {
+            "content": "",
+            "is_final": True,
+            "tool_calls": json.loads(cached["tool_calls"]) if cached.get("tool_calls") else None,
+            "from_cache": True
+        }
+
+    async def process_stream(self, message: str, history: List[Dict] = None, use_cache: bool = True):
         """真正的流式处理用户消息"""
+        human = None
         try:
-            if not self.agent:
-                self._initialize_agent()
-            
-            # 准备消息历史
-            langchain_messages = []
-            if history:
-                for msg in history:
-                    if msg["role"] == "user":
-                        langchain_messages.append(HumanMessage(content=msg["content"]))
-                    elif msg["role"] == "assistant":
-                        langchain_messages.append(AIMessage(content=msg["content"]))
-                    elif msg["role"] == "tool" and msg.get("content"):
-                        langchain_messages.append(ToolMessage(
-                            content=msg["content"],
-                            tool_call_id=msg.get("tool_call_id", "")
-                        ))
-            
-            # 添加当前消息
-            langchain_messages.append(HumanMessage(content=message))
-            
-            logger.info(f"开始真正的流式处理，消息: {message[:100]}...")
+            await self._ensure_agent()
+
+            cacheable = self._use_answer_cache(history, use_cache)
+            if cacheable:
+                cached = await self.answer_cache.alookup(message)
+                if cached:
+                    async for chunk in self._replay_cached(cached):
+                        yield chunk
+                    return
             
-            # 转换消息格式
-            input_messages = []
-            for msg in langchain_messages:
-                if isinstance(msg, HumanMessage):
-                    input_messages.append({"role": "user", "content": msg.content})
-                elif isinstance(msg, AIMessage):
-                    input_messages.append({"role": "assistant", "content": msg.content})
-                elif isinstance(msg, ToolMessage):
-                    input_messages.append({"role": "tool", "content": msg.content, "tool_call_id": msg.tool_call_id})
+            # 历史（工具调用与结果按调用ID配对还原）+ 当前消息
+            input_messages, human = self._assemble_prompt(history, message)
             
+            logger.info(f"开始真正的流式处理，消息: {message[:100]}...")
             logger.info(f"输入消息数量: {len(input_messages)}")
             
-            # 使用 agent.stream() 实现真正的流式
-            # 参考您提供的代码：for chunk in agent.stream(... , stream_mode="messages")
-            full_content = ""
-            accumulated_tool_calls = []
+            # 使用 agent.astream() 实现真正的流式（不支持时回退到线程池中的 agent.stream()）
+            content_parts = []
+            # 按消息 id 合并工具调用分片，结束时再解析，避免逐块构造工具调用字典
+            tool_call_messages: Dict[str, AIMessage] = {}
+            tool_messages: Dict[str, ToolMessage] = {}
+            turn = current_turn.get()
             
             try:
                 # 这里的关键：使用 stream_mode="messages"
-                for chunk in self.agent.stream(
+                async for chunk in self._astream(
                     {"messages": input_messages},
                     stream_mode="messages"  # token by token
                 ):
                     # chunk 是一个元组 (message_chunk, metadata)
-                    if chunk and len(chunk) > 0:
-                        message_chunk = chunk[0]
-                        
-                        # 记录chunk类型用于调试
-                        chunk_type = type(message_chunk).__name__
-                        
-                        # 检查是否是 AIMessageChunk
-                        if hasattr(message_chunk, 'content'):
-                            chunk_content = message_chunk.content or ""
-                            if chunk_content:
-                                full_content += chunk_content
-                                logger.debug(f"流式chunk内容: {chunk_content}")
-                                
-                                # 发送内容块
-                                yield {
-                                    "content": chunk_content,
-                                    "is_final": False,
-                                    "tool_calls": None
-                                }
-                        
-                        # 提取工具调用信息（如果有）
-                        if hasattr(message_chunk, 'tool_calls') and message_chunk.tool_calls:
-                            for tool_call in message_chunk.tool_calls:
-                                tool_info = {
-                                    "name": tool_call.get('name', ''),
-                                    "args": tool_call.get('args', {}),
-                                    "id": tool_call.get('id', '')
-                                }
-                                accumulated_tool_calls.append(tool_info)
-                                logger.info(f"流式工具调用: {tool_info}")
+                    if not chunk:
+                        continue
+                    message_chunk = chunk[0]
+                    if turn is not None:
+                        turn.add_usage(getattr(message_chunk, "usage_metadata", None))
+                    
+                    # 只转发模型输出；工具结果（ToolMessage）不属于答案正文，留作调用记录
+                    if isinstance(message_chunk, ToolMessage):
+                        tool_messages[message_chunk.tool_call_id] = message_chunk
+                        continue
+                    if not isinstance(message_chunk, AIMessage):
+                        continue
+                    
+                    chunk_content = message_chunk.content
+                    if chunk_content and isinstance(chunk_content, str):
+                        content_parts.append(chunk_content)
+                        # 发送内容块
+                        yield {
+                            "content": chunk_content,
+                            "is_final": False,
+                            "tool_calls": None
+                        }
+                    
+                    if isinstance(message_chunk, AIMessageChunk):
+                        if message_chunk.tool_call_chunks:
+                            key = message_chunk.id or ""
+                            merged = tool_call_messages.get(key)
+                            tool_call_messages[key] = message_chunk if merged is None else merged + message_chunk
+                    elif message_chunk.tool_calls:
+                        # 不支持流式的模型会直接给出完整的 AIMessage
+                        tool_call_messages[message_chunk.id or str(len(tool_call_messages))] = message_chunk
             
             except StopIteration:
                 # 流式自然结束
@@ -219,12 +674,33 @@ class AcademicResearchAgentService:
                 logger.error(f"流式处理过程中出错: {e}", exc_info=True)
                 raise
             
+            full_content = "".join(content_parts)
+            accumulated_tool_calls = [
+                {"name": tool_call.get("name", ""), "args": tool_call.get("args", {}), "id": tool_call.get("id", "")}
+                for merged in tool_call_messages.values()
+                for tool_call in merged.tool_calls
+            ]
+            for tool_info in accumulated_tool_calls:
+                logger.info(f"流式工具调用: {tool_info}")
+            steps = {
+                tool_call.get("id", ""): step
+                for step, merged in enumerate(tool_call_messages.values())
+                for tool_call in merged.tool_calls
+            }
+            
+            if cacheable:
+                await self.answer_cache.astore(message, {
+                    "content": full_content,
+                    "tool_calls": json.dumps(accumulated_tool_calls) if accumulated_tool_calls else None,
+                })
+
             # 发送最终消息
             logger.info(f"流式处理完成，总内容长度: {len(full_content)}")
             yield {
                 "content": "",
                 "is_final": True,
-                "tool_calls": accumulated_tool_calls if accumulated_tool_calls else None
+                "tool_calls": accumulated_tool_calls if accumulated_tool_calls else None,
+                "tool_invocations": collect_tool_invocations(accumulated_tool_calls, tool_messages, steps),
             }
             
         except Exception as e:
@@ -232,8 +708,36 @@ class AcademicResearchAgentService:
             yield {
                 "content": f"错误: {str(e)}",
                 "is_final": True,
-                "tool_calls": None
+                "tool_calls": None,
+                "error": str(e),
             }
+        finally:
+            self._finish_turn(human)
 
 # 创建全局Agent实例
-agent_service = AcademicResearchAgentService()
\ No newline at end of file
+agent_service = AcademicResearchAgentService()
+
+
+def _cache_metrics():
+    """
+    在 /metrics 中导出 arXiv 缓存与语义答案缓存的累计查询次数（counter，可直接用 rate()）
+    每次渲染新建指标，按各实例当前的累计值 inc 一次；多个缓存实例的计数相加
+    arXiv 预取的次数由 prefetch 模块的 arxiv_prefetch_total 导出，
+    命中率为 rate(arxiv_prefetch_total{result="hit"}) / rate(arxiv_prefetch_total{result=~"hit|miss"})
+    """
+    arxiv = Counter("arxiv_cache_lookups_total", "arXiv tool cache lookups by result", ["result"])
+    for tool in getattr(agent_service, "tools", None) or []:
+        if isinstance(tool, CachedArxivTool):
+            stats = tool.stats()
+            arxiv.inc(stats["memory_hits"], result="memory_hit")
+            arxiv.inc(stats["shared_hits"], result="shared_hit")
+            arxiv.inc(stats["db_hits"], result="db_hit")
+            arxiv.inc(stats["coalesced"], result="coalesced")
+            arxiv.inc(stats["misses"], result="miss")
+    answers = Counter("answer_cache_lookups_total", "Semantic answer cache operations by result", ["result"])
+    for name, value in agent_service.answer_cache.stats().items():
+        answers.inc(value, result=name)
+    return [arxiv, answers]
+
+
+REGISTRY.register_collector(_cache_metrics)
\ No newline at end of file
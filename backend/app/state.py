@@ -0,0 +1,438 @@
+# backend/app/state.py
+"""
+多 worker 共享状态后端
+- 键值缓存（带过期时间）：跨进程共享的缓存条目与缓存版本号
+- 租约锁：同一会话的轮次在所有 worker 之间串行执行，持有者定期续约，进程崩溃后租约自动过期
+- 流事件缓冲：流式轮次的事件写入共享缓冲，客户端重连到任意 worker 都能回放并继续接收
+
+实现：
+- MemoryStateBackend：进程内（默认，单 worker）
+- SQLiteStateBackend：独立的 SQLite 文件（WAL），同一台机器上的多个 worker 共享
+- RedisStateBackend：Redis 或兼容的服务（可选依赖 redis），可传入任何兼容的异步客户端（例如测试用的假客户端）
+通过 STATE_BACKEND=memory|sqlite|redis 选择
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend:
+    """共享状态后端接口；所有方法都是异步的"""
+
+    shared = False   # 是否在进程之间共享
+
+    # ---------- 键值缓存 ----------
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    # ---------- 租约锁 ----------
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """锁空闲或租约已过期时获取成功"""
+        raise NotImplementedError
+
+    async def refresh_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """仍由 owner 持有时续约"""
+        raise NotImplementedError
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        raise NotImplementedError
+
+    def lock(self, name: str, ttl: Optional[float] = None) -> "SharedLock":
+        return SharedLock(self, name, ttl or settings.state_lock_ttl_seconds)
+
+    # ---------- 流事件缓冲 ----------
+    async def append_event(self, stream: str, event_id: int, data: str, ttl: float) -> None:
+        await self.append_events(stream, [(event_id, data)], ttl)
+
+    async def append_events(self, stream: str, events: List[Tuple[int, str]], ttl: float) -> None:
+        """按顺序追加一批事件 (事件ID, 数据)，一次写入"""
+        raise NotImplementedError
+
+    async def read_events(self, stream: str, start: int = 0) -> List[Tuple[int, str]]:
+        """返回第 start 个（从 0 开始）及之后的事件 (事件ID, 数据)"""
+        raise NotImplementedError
+
+    async def close_stream(self, stream: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def stream_state(self, stream: str) -> Optional[bool]:
+        """None：缓冲中没有该流；False：仍在进行；True：已结束"""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SharedLock:
+    """
+    基于租约的锁：获取时轮询，持有期间后台任务每 ttl/3 续约一次
+    """
+
+    def __init__(self, backend: StateBackend, name: str, ttl: float):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.owner = uuid.uuid4().hex
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delay = 0.005
+        while not await self.backend.acquire_lock(self.name, self.owner, self.ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(delay if deadline is None else min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 0.2)
+        self._refresher = asyncio.create_task(self._refresh())
+        return True
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await self.backend.refresh_lock(self.name, self.owner, self.ttl):
+                    logger.warning(f"共享锁 {self.name} 的租约已丢失")
+                    return
+            except Exception as e:
+                logger.warning(f"共享锁 {self.name} 续约失败: {e}")
+
+    async def release(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        await self.backend.release_lock(self.name, self.owner)
+
+    async def __aenter__(self) -> "SharedLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
+
+
+# ===================== 进程内实现 =====================
+class MemoryStateBackend(StateBackend):
+    """进程内实现：单 worker 部署的默认选项"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._streams: Dict[str, List[Tuple[int, str]]] = {}
+        self._stream_state: Dict[str, Tuple[bool, float]] = {}
+
+    def _expired(self, expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at <= time.monotonic()
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._values.get(key)
+        if item is None or self._expired(item[1]):
+            self._values.pop(key, None)
+            return None
+        return item[0]
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._values[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        held = self._locks.get(name)
+        if held is not None and held[0] != owner and not self._expired(held[1]):
+            return False
+        self._locks[name] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def refresh_lock(self, name: str, owner: str, ttl: float) -> bool:
+        held = self._locks.get(name)
+        if held is None or held[0] != owner:
+            return False
+        self._locks[name] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        held = self._locks.get(name)
+        if held is not None and held[0] == owner:
+            del self._locks[name]
+
+    def _purge_streams(self) -> None:
+        for stream, (_, expires_at) in list(self._stream_state.items()):
+            if self._expired(expires_at):
+                self._stream_state.pop(stream, None)
+                self._streams.pop(stream, None)
+
+    async def append_events(self, stream: str, events: List[Tuple[int, str]], ttl: float) -> None:
+        self._streams.setdefault(stream, []).extend(events)
+        self._stream_state[stream] = (False, time.monotonic() + ttl)
+
+    async def read_events(self, stream: str, start: int = 0) -> List[Tuple[int, str]]:
+        return self._streams.get(stream, [])[start:]
+
+    async def close_stream(self, stream: str, ttl: float) -> None:
+        self._purge_streams()
+        self._streams.setdefault(stream, [])
+        self._stream_state[stream] = (True, time.monotonic() + ttl)
+
+    async def stream_state(self, stream: str) -> Optional[bool]:
+        state = self._stream_state.get(stream)
+        if state is None or self._expired(state[1]):
+            return None
+        return state[0]
+
+
+# ===================== SQLite 文件实现 =====================
+class SQLiteStateBackend(StateBackend):
+    """
+    同一台机器上多个 worker 共享的实现：独立的 SQLite 文件，WAL 模式下读写互不阻塞
+    过期时间使用墙钟时间（time.time），各进程一致
+    """
+
+    shared = True
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL);
+    CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS stream_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT, stream TEXT NOT NULL, event_id INTEGER NOT NULL, data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_stream_events_stream ON stream_events (stream, seq);
+    CREATE TABLE IF NOT EXISTS streams (stream TEXT PRIMARY KEY, closed INTEGER NOT NULL, expires_at REAL NOT NULL);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._purge()
+            return cursor.rowcount
+
+    def _purge(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+        expired = "SELECT stream FROM streams WHERE expires_at <= ?"
+        self._conn.execute(f"DELETE FROM stream_events WHERE stream IN ({expired})", (now,))
+        self._conn.execute("DELETE FROM streams WHERE expires_at <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[str]:
+        def run():
+            row = self._execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+            return row[0] if row else None
+        return await asyncio.to_thread(run)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at),
+        )
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._write, "DELETE FROM kv WHERE key = ?", (key,))
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        # 不存在时插入；已存在时只有过期或本来就是自己持有才覆盖
+        changed = await asyncio.to_thread(
+            self._write,
+            "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE locks.expires_at <= ? OR locks.owner = excluded.owner",
+            (name, owner, now + ttl, now),
+        )
+        return changed > 0
+
+    async def refresh_lock(self, name: str, owner: str, ttl: float) -> bool:
+        changed = await asyncio.to_thread(
+            self._write, "UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?", (time.time() + ttl, name, owner)
+        )
+        return changed > 0
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        await asyncio.to_thread(self._write, "DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    async def append_events(self, stream: str, events: List[Tuple[int, str]], ttl: float) -> None:
+        def run():
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "INSERT INTO stream_events (stream, event_id, data) VALUES (?, ?, ?)",
+                        [(stream, event_id, data) for event_id, data in events],
+                    )
+                    self._conn.execute(
+                        "INSERT INTO streams (stream, closed, expires_at) VALUES (?, 0, ?) "
+                        "ON CONFLICT(stream) DO UPDATE SET expires_at = excluded.expires_at",
+                        (stream, time.time() + ttl),
+                    )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        await asyncio.to_thread(run)
+
+    async def read_events(self, stream: str, start: int = 0) -> List[Tuple[int, str]]:
+        def run():
+            rows = self._execute(
+                "SELECT event_id, data FROM stream_events WHERE stream = ? ORDER BY seq LIMIT -1 OFFSET ?",
+                (stream, start),
+            ).fetchall()
+            return [(row[0], row[1]) for row in rows]
+        return await asyncio.to_thread(run)
+
+    async def close_stream(self, stream: str, ttl: float) -> None:
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO streams (stream, closed, expires_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(stream) DO UPDATE SET closed = 1, expires_at = excluded.expires_at",
+            (stream, time.time() + ttl),
+        )
+
+    async def stream_state(self, stream: str) -> Optional[bool]:
+        def run():
+            row = self._execute(
+                "SELECT closed FROM streams WHERE stream = ? AND expires_at > ?", (stream, time.time())
+            ).fetchone()
+            return None if row is None else bool(row[0])
+        return await asyncio.to_thread(run)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ===================== Redis 实现 =====================
+class RedisStateBackend(StateBackend):
+    """
+    Redis（或协议兼容的服务）实现，跨机器共享
+    client 为 redis.asyncio.Redis 或任何提供相同异步方法的对象
+    """
+
+    shared = True
+
+    # 比较持有者后再删除 / 续约，在服务端原子执行
+    _RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    )
+    _REFRESH_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) "
+        "else return 0 end"
+    )
+
+    def __init__(self, client: Any, prefix: str = "academic-agent:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStateBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis 需要安装 redis 包（pip install redis）") from e
+        return cls(redis.from_url(url))
+
+    @staticmethod
+    def _text(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._text(await self.client.get(self.prefix + key))
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self.prefix}lock:{name}"
+        if await self.client.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        return self._text(await self.client.get(key)) == owner
+
+    async def refresh_lock(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self.prefix}lock:{name}"
+        return bool(await self.client.eval(self._REFRESH_SCRIPT, 1, key, owner, int(ttl * 1000)))
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        await self.client.eval(self._RELEASE_SCRIPT, 1, f"{self.prefix}lock:{name}", owner)
+
+    async def append_events(self, stream: str, events: List[Tuple[int, str]], ttl: float) -> None:
+        if not events:
+            return
+        key = f"{self.prefix}stream:{stream}"
+        await self.client.rpush(key, *(json.dumps([event_id, data]) for event_id, data in events))
+        await self.client.pexpire(key, int(ttl * 1000))
+
+    async def read_events(self, stream: str, start: int = 0) -> List[Tuple[int, str]]:
+        items = await self.client.lrange(f"{self.prefix}stream:{stream}", start, -1)
+        return [tuple(json.loads(self._text(item))) for item in items]
+
+    async def close_stream(self, stream: str, ttl: float) -> None:
+        key = f"{self.prefix}stream:{stream}"
+        await self.client.set(f"{key}:closed", "1", px=int(ttl * 1000))
+        await self.client.pexpire(key, int(ttl * 1000))
+
+    async def stream_state(self, stream: str) -> Optional[bool]:
+        key = f"{self.prefix}stream:{stream}"
+        if await self.client.get(f"{key}:closed") is not None:
+            return True
+        return False if await self.client.exists(key) else None
+
+    async def aclose(self) -> None:
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+def create_state_backend() -> StateBackend:
+    """按 STATE_BACKEND 配置创建共享状态后端"""
+    kind = settings.state_backend.lower()
+    if kind == "sqlite":
+        return SQLiteStateBackend(settings.state_sqlite_path)
+    if kind == "redis":
+        return RedisStateBackend.from_url(settings.redis_url)
+    if kind != "memory":
+        logger.warning(f"未知的 STATE_BACKEND={settings.state_backend}，使用进程内实现")
+    return MemoryStateBackend()
+
+
+# 全局共享状态后端
+state_backend = create_state_backend()
@@ -0,0 +1,110 @@
+# backend/app/streaming.py
+"""
+SSE 流式输出工具
+- encode_frame：把字典编码成一条 "data: ...\n\n" 帧（优先使用 orjson）
+- coalesce：按时间窗口 / 字符数把相邻的内容块合并成一帧，减少序列化次数和 socket 写入
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库
+    orjson = None
+    import json
+
+DONE_FRAME = b"data: [DONE]\n\n"
+
+
+def encode_frame(data: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    """编码一条 SSE data 帧；给出 event_id 时带上 id 行，客户端重连时以 Last-Event-ID 回传"""
+    prefix = b"id: %d\n" % event_id if event_id is not None else b""
+    if orjson is not None:
+        return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+    return prefix + f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+_END = object()
+
+
+async def coalesce(
+    chunks: AsyncIterator[Dict[str, Any]],
+    window_ms: int = 0,
+    max_chars: int = 0,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    合并 process_stream 产出的内容块
+    - 首个内容块立即发出，首 token 时间不受窗口影响
+    - 之后缓冲的内容满 max_chars 个字符，或距第一个缓冲块超过 window_ms 时发出一块
+    - 最终块（is_final）到达前先发出缓冲内容
+    window_ms 与 max_chars 都为 0 时原样透传
+    """
+    if window_ms <= 0 and max_chars <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    # 由独立任务拉取上游，窗口到期时即使上游没有新 token 也能按时发出缓冲内容
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    task = asyncio.create_task(pump())
+    window = window_ms / 1000 if window_ms > 0 else None
+    parts = []
+    size = 0
+    started: Optional[float] = None
+    first_sent = False
+    try:
+        while True:
+            # 队列中已有数据时直接取，只有缓冲非空且需要等待时才设置超时
+            if not queue.empty():
+                item = queue.get_nowait()
+            elif not parts or window is None:
+                item = await queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(started + window - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    yield {"content": "".join(parts), "is_final": False, "tool_calls": None}
+                    parts, size, started = [], 0, None
+                    continue
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item.get("is_final"):
+                if parts:
+                    yield {"content": "".join(parts), "is_final": False, "tool_calls": None}
+                    parts, size, started = [], 0, None
+                yield item
+                continue
+
+            content = item.get("content") or ""
+            if not content:
+                continue
+            if not first_sent:
+                first_sent = True
+                yield item
+                continue
+            if not parts:
+                started = time.monotonic()
+            parts.append(content)
+            size += len(content)
+            if (max_chars > 0 and size >= max_chars) or (window is not None and time.monotonic() - started >= window):
+                yield {"content": "".join(parts), "is_final": False, "tool_calls": None}
+                parts, size, started = [], 0, None
+
+        if parts:
+            yield {"content": "".join(parts), "is_final": False, "tool_calls": None}
+    finally:
+        task.cancel()
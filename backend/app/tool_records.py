@@ -0,0 +1,96 @@
+# backend/app/tool_records.py
+"""
+工具调用记录
+- 写入：把一轮中的工具调用拆成 ToolInvocation 行，结果内容交给 blobs 模块去重、压缩后写入 content_blobs
+- 读取：把调用记录还原为 {tool_call_id, name, args, result, status, latency_ms, step}，用于重建历史
+  （step 相同的调用由同一条模型输出发起，重建时按原样分组，发给模型的历史与当时一致）
+- 迁移：解析旧版本存放在 chat_messages.tool_calls / tool_results 中的 JSON
+crud（异步写入、组提交）与 database（启动迁移）共用这里的构造逻辑
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .blobs import blob_row
+from .models import ToolInvocation, utcnow
+
+
+def build_invocations(
+    message_id: str, session_id: str, records: List[Dict[str, Any]], created_at=None
+) -> Tuple[List[ToolInvocation], List[Dict[str, Any]]]:
+    """构造一条消息的工具调用行，返回 (调用行, 去重后的结果行)"""
+    created_at = created_at or utcnow()
+    invocations: List[ToolInvocation] = []
+    blobs: Dict[str, Dict[str, Any]] = {}
+    for position, record in enumerate(records):
+        result = record.get("result")
+        digest = None
+        if result is not None:
+            if not isinstance(result, str):
+                result = json.dumps(result, ensure_ascii=False)
+            row = blob_row(result, created_at)
+            digest = row["hash"]
+            blobs[digest] = row
+        args = record.get("args")
+        invocations.append(ToolInvocation(
+            message_id=message_id,
+            session_id=session_id,
+            position=position,
+            step=record.get("step"),
+            tool_call_id=record.get("tool_call_id") or None,
+            tool_name=record.get("name") or "unknown",
+            args=json.dumps(args, ensure_ascii=False) if args is not None else None,
+            result_hash=digest,
+            status=record.get("status") or ("success" if digest else "no_result"),
+            latency_ms=record.get("latency_ms"),
+            created_at=created_at,
+        ))
+    return invocations, list(blobs.values())
+
+
+def invocation_record(
+    invocation: ToolInvocation, result: Optional[str], result_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """把调用行（及其结果内容）还原为调用记录；result 可能是截断后的内容，result_size 为原文长度"""
+    record = {
+        "tool_call_id": invocation.tool_call_id,
+        "name": invocation.tool_name,
+        "args": json.loads(invocation.args) if invocation.args else None,
+        "result": result,
+        "status": invocation.status,
+        "latency_ms": invocation.latency_ms,
+        "step": invocation.step,
+    }
+    if result_size is not None:
+        record["result_size"] = result_size
+        record["result_truncated"] = result is not None and len(result) < result_size
+    return record
+
+
+def legacy_records(tool_calls: Optional[str], tool_results: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    解析旧版本的 JSON 列：tool_calls 为 [{name, args, id}]，tool_results 为 {调用ID: 结果}
+    无法解析的内容忽略；没有对应调用的结果记为名称未知的调用
+    """
+    def parse(raw: Optional[str], expected: type):
+        try:
+            value = json.loads(raw) if raw else None
+        except (TypeError, ValueError):
+            return expected()
+        return value if isinstance(value, expected) else expected()
+
+    calls = parse(tool_calls, list)
+    results = parse(tool_results, dict)
+    records = []
+    for call in calls:
+        if not isinstance(call, dict):
+            continue
+        call_id = call.get("id") or None
+        records.append({
+            "tool_call_id": call_id,
+            "name": call.get("name"),
+            "args": call.get("args"),
+            "result": results.pop(call_id, None) if call_id else None,
+        })
+    for call_id, result in results.items():
+        records.append({"tool_call_id": call_id, "name": None, "args": None, "result": result})
+    return records
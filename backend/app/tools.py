@@ -0,0 +1,410 @@
+# backend/app/tools.py
+"""
+Agent 工具的封装
+- CachedArxivTool：为 arXiv 工具加上两级缓存（内存 LRU + SQLite 表），相同查询不再重复访问网络
+- ToolExecutionMiddleware：同一条模型输出中的多个工具调用并发执行，限制并发数并为每个调用加超时
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain.agents.middleware.types import ToolCallRequest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import ConfigDict, PrivateAttr
+from sqlalchemy import delete
+
+from .database import SessionLocal
+from .metrics import current_turn
+from .models import ArxivCacheEntry, utcnow
+from .state import state_backend
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询：小写、去标点、去重并排序词项（arXiv 检索与词序无关）"""
+    words = _PUNCTUATION.sub(" ", query.lower()).split()
+    return " ".join(sorted(set(words)))
+
+
+def query_key(query: str) -> str:
+    """归一化查询的哈希，作为缓存键"""
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """带 TTL 的线程安全 LRU 缓存"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (stored_at if stored_at is not None else time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CachedArxivTool(BaseTool):
+    """
+    带缓存的 arXiv 工具
+    对外与被包装的工具同名、同参数，模型无感知；查询先经过内存 LRU，再查 SQLite 表，最后才访问网络
+    配置了共享状态后端时，异步路径在查 SQLite 之前先查共享缓存（其他机器上的 worker 写入的结果）
+    异步路径上相同的查询正在进行时（并发的轮次、批量问答中的相近问题），等待同一个结果而不是重复访问网络
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = "arxiv"
+    description: str = ""
+    inner: BaseTool
+    ttl_seconds: int = 86400
+    max_entries: int = 512
+    session_factory: Any = SessionLocal
+
+    _memory: LRUCache = PrivateAttr()
+    _stats: Dict[str, int] = PrivateAttr()
+    _stats_lock: threading.Lock = PrivateAttr()
+    _inflight: Dict[str, asyncio.Future] = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._memory = LRUCache(self.max_entries, self.ttl_seconds)
+        self._stats = {"memory_hits": 0, "shared_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+        self._inflight = {}
+
+    @classmethod
+    def wrap(cls, inner: BaseTool, **kwargs: Any) -> "CachedArxivTool":
+        """包装一个 arXiv 工具，沿用其名称、描述和参数结构"""
+        fields = {"name": inner.name, "description": inner.description, "inner": inner}
+        if inner.args_schema is not None:
+            fields["args_schema"] = inner.args_schema
+        fields.update(kwargs)
+        return cls(**fields)
+
+    # ---------- 统计 ----------
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["shared_hits"] + stats["db_hits"] + stats["coalesced"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+    # ---------- 缓存读写 ----------
+    def _load(self, key: str) -> Optional[str]:
+        """依次查询内存和 SQLite，SQLite 命中时回填内存"""
+        result = self._memory.get(key)
+        if result is not None:
+            self._count("memory_hits")
+            return result
+
+        with self.session_factory() as db:
+            entry = db.get(ArxivCacheEntry, key)
+            if entry is not None:
+                age = (utcnow() - entry.created_at).total_seconds()
+                if age <= self.ttl_seconds:
+                    self._memory.set(key, entry.result, stored_at=time.time() - age)
+                    self._count("db_hits")
+                    return entry.result
+        return None
+
+    def _store(self, key: str, query: str, result: str) -> None:
+        """写入两级缓存，并顺带清理已过期的持久化条目"""
+        self._memory.set(key, result)
+        try:
+            with self.session_factory() as db:
+                db.merge(ArxivCacheEntry(key=key, query=normalize_query(query), result=result, created_at=utcnow()))
+                expired_before = utcnow() - timedelta(seconds=self.ttl_seconds)
+                db.execute(delete(ArxivCacheEntry).where(ArxivCacheEntry.created_at < expired_before))
+                db.commit()
+        except Exception as e:
+            # 持久化失败不影响本次查询结果
+            logger.warning(f"arXiv 缓存写入失败: {e}")
+
+    @staticmethod
+    def _cacheable(result: Any) -> bool:
+        """arXiv 工具出错时返回的是错误文本，不能缓存"""
+        return isinstance(result, str) and bool(result) and not result.startswith("Arxiv exception")
+
+    # ---------- 工具调用 ----------
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        key = query_key(query)
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+        self._count("misses")
+        result = self.inner.invoke(query)
+        if self._cacheable(result):
+            self._store(key, query, result)
+        return result
+
+    async def _shared_load(self, key: str) -> Optional[str]:
+        if not state_backend.shared:
+            return None
+        try:
+            result = await state_backend.get(f"arxiv:{key}")
+        except Exception as e:
+            logger.warning(f"读取共享 arXiv 缓存失败: {e}")
+            return None
+        if result is not None:
+            self._memory.set(key, result)
+            self._count("shared_hits")
+        return result
+
+    async def _shared_store(self, key: str, result: str) -> None:
+        if not state_backend.shared:
+            return
+        try:
+            await state_backend.set(f"arxiv:{key}", result, ttl=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"写入共享 arXiv 缓存失败: {e}")
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        key = query_key(query)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._count("coalesced")
+        else:
+            pending = self._inflight[key] = asyncio.ensure_future(self._afetch(key, query))
+            pending.add_done_callback(lambda future: self._fetched(key, future))
+        # 某个调用方超时被取消时，不影响等待同一查询的其他调用方
+        return await asyncio.shield(pending)
+
+    def _fetched(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()   # 调用方都已取消时避免 "exception was never retrieved"
+
+    async def _afetch(self, key: str, query: str) -> str:
+        cached = await self._shared_load(key)
+        if cached is None:
+            cached = await asyncio.to_thread(self._load, key)
+        if cached is not None:
+            return cached
+        self._count("misses")
+        result = await self.inner.ainvoke(query)
+        if self._cacheable(result):
+            await asyncio.to_thread(self._store, key, query, result)
+            await self._shared_store(key, result)
+        return result
+
+
+def parse_tool_timeouts(spec: str) -> Dict[str, float]:
+    """解析 TOOL_TIMEOUTS（"arxiv=20,local_papers=2"）为 工具名 => 超时秒数；格式错误的项忽略并记录警告"""
+    timeouts: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = 0.0
+        if not name.strip() or seconds <= 0:
+            logger.warning(f"忽略无效的工具超时配置: {item!r}")
+            continue
+        timeouts[name.strip()] = seconds
+    return timeouts
+
+
+class ToolExecutionMiddleware(AgentMiddleware):
+    """
+    工具执行中间件
+    ToolNode 会把同一条 AIMessage 中的全部工具调用一起调度（异步路径为 asyncio.gather，结果按原顺序合并），
+    这里按发起调用的 AIMessage 分组，限制每组的并发数，并为每个调用设置超时（timeouts 中按工具名覆盖）；
+    超时的调用返回错误状态的 ToolMessage，不影响同组其他调用
+    提供 prefetcher（见 prefetch.ArxivPrefetcher）时，arxiv 调用优先使用本轮预取的匹配结果
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        timeout_seconds: float,
+        prefetcher: Any = None,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        super().__init__()
+        self.max_concurrency = max(max_concurrency, 1)
+        self.timeout_seconds = timeout_seconds
+        self.timeouts = dict(timeouts or {})
+        self.prefetcher = prefetcher
+        # 发起调用的 AIMessage => [信号量, 尚未完成的调用数]
+        self._batches: Dict[int, list] = {}
+        self._batches_lock = threading.Lock()
+
+    @staticmethod
+    def _issuing_message(request: ToolCallRequest) -> Optional[AIMessage]:
+        """找到发起本次工具调用的 AIMessage"""
+        state = request.state
+        messages = state.get("messages", []) if isinstance(state, dict) else getattr(state, "messages", [])
+        for msg in reversed(messages):
+            if isinstance(msg, AIMessage) and msg.tool_calls:
+                return msg
+        return None
+
+    def _acquire_batch(self, request: ToolCallRequest, factory: Callable[[int], Any]) -> Tuple[int, Any]:
+        message = self._issuing_message(request)
+        key = id(message) if message is not None else id(request)
+        size = len(message.tool_calls) if message is not None else 1
+        with self._batches_lock:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = [factory(self.max_concurrency), size]
+            return key, batch[0]
+
+    def _release_batch(self, key: int) -> None:
+        with self._batches_lock:
+            batch = self._batches.get(key)
+            if batch is not None:
+                batch[1] -= 1
+                if batch[1] <= 0:
+                    del self._batches[key]
+
+    @staticmethod
+    def _turn_message_id(request: ToolCallRequest) -> Optional[str]:
+        """本轮用户消息的 ID（预取按它登记）"""
+        state = request.state
+        messages = state.get("messages", []) if isinstance(state, dict) else getattr(state, "messages", [])
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                return msg.id
+        return None
+
+    async def _prefetched(self, request: ToolCallRequest) -> Optional[ToolMessage]:
+        """arxiv 调用与本轮预取的查询匹配时，直接用预取结果构造 ToolMessage"""
+        call = request.tool_call
+        if self.prefetcher is None or call.get("name") != "arxiv":
+            return None
+        turn_id = self._turn_message_id(request)
+        if not self.prefetcher.active(turn_id):
+            return None
+        args = call.get("args") or {}
+        query = args.get("query") if isinstance(args, dict) else str(args)
+        if not query:
+            return None
+        result = await self.prefetcher.take(turn_id, query)
+        if result is None:
+            return None
+        return ToolMessage(content=result, tool_call_id=call.get("id", ""), name=call.get("name"))
+
+    async def _acall(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        served = await self._prefetched(request)
+        if served is not None:
+            return served
+        return await handler(request)
+
+    @staticmethod
+    def _record(request: ToolCallRequest, started: float, status: str) -> None:
+        """把本次工具调用的耗时记入当前轮次的指标"""
+        turn = current_turn.get()
+        if turn is not None:
+            call = request.tool_call
+            turn.add_tool_call(
+                call.get("name", ""), started, time.perf_counter() - started, status, call_id=call.get("id")
+            )
+
+    def timeout_for(self, name: Optional[str]) -> float:
+        return self.timeouts.get(name, self.timeout_seconds)
+
+    def _timeout_message(self, request: ToolCallRequest) -> ToolMessage:
+        call = request.tool_call
+        logger.warning(f"工具调用超时: {call.get('name')} {call.get('args')}")
+        return ToolMessage(
+            content=(
+                f"Tool '{call.get('name')}' timed out after {self.timeout_for(call.get('name')):g}s, "
+                "try a narrower query."
+            ),
+            tool_call_id=call.get("id", ""),
+            name=call.get("name"),
+            status="error",
+        )
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        key, semaphore = self._acquire_batch(request, asyncio.Semaphore)
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                status = "success"
+                try:
+                    result = await asyncio.wait_for(
+                        self._acall(request, handler), timeout=self.timeout_for(request.tool_call.get("name"))
+                    )
+                    status = getattr(result, "status", None) or "success"
+                    return result
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                    return self._timeout_message(request)
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    self._record(request, started, status)
+        finally:
+            self._release_batch(key)
+
+    def wrap_tool_call(self, request: ToolCallRequest, handler: Callable[[ToolCallRequest], Any]) -> Any:
+        # 同步回退路径：ToolNode 在线程池中并发执行，这里只限制并发数（同步调用无法安全地中断）
+        key, semaphore = self._acquire_batch(request, threading.BoundedSemaphore)
+        try:
+            with semaphore:
+                started = time.perf_counter()
+                status = "error"
+                try:
+                    result = handler(request)
+                    status = getattr(result, "status", None) or "success"
+                    return result
+                finally:
+                    self._record(request, started, status)
+        finally:
+            self._release_batch(key)
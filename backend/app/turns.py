@@ -0,0 +1,160 @@
+# backend/app/turns.py
+"""
+可断线续传的流式轮次
+- StreamTurn：一次生成的事件缓冲；事件 ID 为已发送内容的字符偏移，单调递增
+- StreamTurnRegistry：进程内登记正在运行（及刚结束）的轮次，生成任务与 HTTP 连接解耦，
+  客户端断开不会取消生成，重连时先回放缓冲的事件再继续接收实时事件
+- 配置了共享状态后端时，事件同时写入共享缓冲，重连到其他 worker 时由 follow_shared() 回放并跟随；
+  共享缓冲的写入按 STREAM_SHARED_FLUSH_MS 合并成批，而不是每个 token 写一次
+"""
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Coroutine, Dict, List, Optional, Tuple
+
+from .config import settings
+from .state import StateBackend, state_backend
+
+logger = logging.getLogger(__name__)
+
+
+class StreamTurn:
+    """一次流式生成的事件缓冲"""
+
+    def __init__(self, turn_id: str, session_id: str, backend: Optional[StateBackend] = None):
+        self.id = turn_id
+        self.backend = backend if backend is not None else state_backend
+        self.session_id = session_id
+        self.events: List[Tuple[int, Dict[str, Any]]] = []
+        self.content_parts: List[str] = []
+        self.offset = 0          # 已发布内容的总字符数，即最新内容事件的 ID
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+        self._pending: List[Tuple[int, str]] = []      # 尚未写入共享缓冲的事件
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    async def publish(self, data: Dict[str, Any], final: bool = False) -> int:
+        """追加一个事件并唤醒订阅者，返回事件 ID"""
+        if final:
+            event_id = self.offset + 1
+        else:
+            content = data.get("content") or ""
+            self.content_parts.append(content)
+            self.offset += len(content)
+            event_id = self.offset
+        async with self._condition:
+            self.events.append((event_id, data))
+            self._condition.notify_all()
+        if self.backend.shared:
+            self._pending.append((event_id, json.dumps(data)))
+            if self._flusher is None:
+                self._flusher = asyncio.create_task(self._flush())
+        return event_id
+
+    async def _flush(self) -> None:
+        """等待合并窗口后把积累的事件一次写入共享缓冲；同一时间只有一个写入任务，保证顺序"""
+        try:
+            while self._pending:
+                await asyncio.sleep(settings.stream_shared_flush_ms / 1000)
+                batch, self._pending = self._pending, []
+                try:
+                    await self.backend.append_events(self.id, batch, settings.stream_turn_retention_seconds)
+                except Exception as e:
+                    logger.warning(f"流事件写入共享缓冲失败: {e}")
+        finally:
+            self._flusher = None
+
+    async def close(self) -> None:
+        async with self._condition:
+            self.done = True
+            self._condition.notify_all()
+        if self.backend.shared:
+            # 先写完剩余事件再标记结束，跟随者看到结束时所有事件都已可读
+            if self._flusher is not None:
+                await asyncio.shield(self._flusher)
+            try:
+                await self.backend.close_stream(self.id, settings.stream_turn_retention_seconds)
+            except Exception as e:
+                logger.warning(f"关闭共享流缓冲失败: {e}")
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """先回放 ID 大于 after 的缓冲事件，再等待新事件，直到生成结束"""
+        index = 0
+        while True:
+            while index < len(self.events):
+                event_id, data = self.events[index]
+                index += 1
+                if event_id > after:
+                    yield event_id, _trim(event_id, data, after)
+            if self.done:
+                return
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.done or len(self.events) > index)
+
+
+def _trim(event_id: int, data: Dict[str, Any], after: int) -> Dict[str, Any]:
+    """
+    after 落在该事件中间（例如来自数据库检查点的偏移）时，只保留未收到的部分；
+    最终块的内容（错误信息）不计入偏移，原样返回
+    """
+    content = data.get("content") or ""
+    start = event_id - len(content)
+    if content and not data.get("is_final") and start < after:
+        return {**data, "content": content[after - start:]}
+    return data
+
+
+async def follow_shared(
+    turn_id: str, after: int = 0, backend: Optional[StateBackend] = None, poll_seconds: float = 0.05
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """从共享缓冲回放另一个 worker 上的轮次，并轮询跟随新事件直到结束"""
+    backend = backend if backend is not None else state_backend
+    position = 0
+    while True:
+        closed = await backend.stream_state(turn_id)
+        events = await backend.read_events(turn_id, position)
+        position += len(events)
+        for event_id, raw in events:
+            if event_id > after:
+                yield event_id, _trim(event_id, json.loads(raw), after)
+        # 读取事件之前已经结束，说明所有事件都已读到
+        if closed or closed is None:
+            return
+        await asyncio.sleep(poll_seconds)
+
+
+class StreamTurnRegistry:
+    """进程内的流式轮次登记表"""
+
+    def __init__(self):
+        self._turns: Dict[str, StreamTurn] = {}
+
+    def get(self, turn_id: str) -> Optional[StreamTurn]:
+        return self._turns.get(turn_id)
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def start(self, turn: StreamTurn, producer: Coroutine) -> StreamTurn:
+        """在后台任务中运行生成过程；结束后保留一段时间供断线重连回放"""
+        self._turns[turn.id] = turn
+        turn.task = asyncio.create_task(producer)
+
+        def on_done(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception():
+                logger.error(f"流式轮次 {turn.id} 异常结束: {task.exception()}")
+            asyncio.get_running_loop().call_later(
+                settings.stream_turn_retention_seconds, self._turns.pop, turn.id, None
+            )
+
+        turn.task.add_done_callback(on_done)
+        return turn
+
+
+# 全局登记表
+stream_turns = StreamTurnRegistry()
@@ -0,0 +1,6 @@
+# backend/benchmarks/__init__.py
+"""
+基准测试与压测工具包
+使用确定性的假聊天模型和假 arXiv 工具驱动服务，无需消耗真实模型配额
+运行方式（在 backend 目录下）：python -m benchmarks.<脚本名>
+"""
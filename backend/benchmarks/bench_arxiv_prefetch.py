@@ -0,0 +1,105 @@
+# backend/benchmarks/bench_arxiv_prefetch.py
+"""
+arXiv 预取基准：假模型在第一次调用中“思考” think_latency 秒后发起 arxiv 调用，假工具按固定延迟返回
+问题集混合了几类情况：
+- 关键词与模型查询一致（预取命中，工具延迟与模型思考重叠）
+- 模型改写了查询（预取未命中，多出一次被取消的查询）
+- 纯中文问题（不预取）
+分别在关闭与开启预取时跑完整个问题集，比较每轮耗时、命中率、节省的时间与实际发起的工具调用数
+
+运行：python -m benchmarks.bench_arxiv_prefetch --rounds 5 --think-latency 0.8 --tool-latency 1.0
+"""
+import os
+import tempfile
+
+# 必须在导入 app 之前设置，使基准使用临时数据库而不是开发数据库
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_prefetch.db"
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.config import settings
+from app.services import AcademicResearchAgentService
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+# 问题 => 模型发起的查询
+QUESTIONS = {
+    "graph neural networks for drug discovery": "graph neural networks drug discovery",
+    "Find recent papers about retrieval augmented generation evaluation": "retrieval augmented generation evaluation",
+    'Papers on "mixture of experts" routing': "mixture of experts",
+    "帮我找一下 contrastive learning 在 speech representation 上的论文": "contrastive learning speech representation",
+    "有哪些关于 diffusion model 视频生成的工作": "video diffusion models",
+    "How do people make transformers cheaper at inference time?": "efficient transformer inference",
+    "大模型的幻觉问题有哪些解决办法": "LLM hallucination mitigation",
+}
+
+
+async def run_case(enabled: bool, args, stream: bool) -> dict:
+    settings.arxiv_prefetch_enabled = enabled
+    tool = FakeArxivTool(latency=args.tool_latency)
+    service = AcademicResearchAgentService(
+        FakeResearchChatModel(think_latency=args.think_latency, token_interval=0.0, tool_queries=QUESTIONS),
+        [tool],
+    )
+    timings = []
+    for _ in range(args.rounds):
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            if stream:
+                async for chunk in service.process_stream(question):
+                    if chunk["is_final"]:
+                        assert chunk.get("tool_invocations"), chunk
+            else:
+                result = await service.process_message(question)
+                assert result["tool_results"], result["content"]
+            timings.append(time.perf_counter() - started)
+    # 让被取消的预取结束，工具调用计数才完整
+    await asyncio.sleep(0)
+    stats = service.prefetcher.stats() if service.prefetcher else {}
+    turns = len(timings)
+    return {
+        "turn_mean_s": statistics.mean(timings),
+        "turn_p50_s": statistics.median(timings),
+        "tool_calls_per_turn": tool.calls / turns,
+        "hit_rate": stats.get("hit_rate", 0.0),
+        "saved_s_per_turn": stats.get("saved_seconds", 0.0) / turns,
+        "prefetch": {k: v for k, v in stats.items() if k not in ("hit_rate", "saved_seconds")},
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for mode in ("message", "stream"):
+        for enabled in (False, True):
+            results[f"{mode}/{'prefetch' if enabled else 'off'}"] = await run_case(enabled, args, mode == "stream")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="arXiv 预取：每轮耗时、命中率与节省的时间")
+    parser.add_argument("--rounds", type=int, default=5, help="问题集重复的轮数")
+    parser.add_argument("--think-latency", type=float, default=0.8, help="每次模型调用的思考时间（秒）")
+    parser.add_argument("--tool-latency", type=float, default=1.0, help="arxiv 查询的延迟（秒）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    print(f"{'case':<20}{'mean s':>9}{'p50 s':>9}{'tools/turn':>12}{'hit rate':>10}{'saved s/turn':>14}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['turn_mean_s']:>9.3f}{r['turn_p50_s']:>9.3f}{r['tool_calls_per_turn']:>12.2f}"
+              f"{r['hit_rate']:>10.2f}{r['saved_s_per_turn']:>14.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# backend/benchmarks/bench_batch.py
+"""
+批量问答基准：一组问题（多个问题属于同一主题，模型会发出相同的 arXiv 查询）用两种方式提交
+- sequential：现在的做法，逐个 POST /sessions + POST /api/chat/message
+- batch：一次 POST /api/chat/batch（不同并发数），按行读取 NDJSON
+统计总耗时、吞吐、第一条结果的时间、实际访问 arXiv 的次数与写库事务数
+arXiv 工具为带缓存的假工具，每种方式开始前清空缓存
+
+运行：python -m benchmarks.bench_batch --topics 20 --per-topic 3 --concurrency 4,8 --output batch.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+from sqlalchemy import delete
+
+from benchmarks.harness import app, serve
+from app.config import settings
+from app.database import SessionLocal, create_tables
+from app.models import ArxivCacheEntry
+from app.services import agent_service
+from app.tools import CachedArxivTool
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+TOPICS = [
+    "diffusion models video generation", "retrieval augmented generation evaluation",
+    "graph neural networks molecules", "efficient attention long context",
+    "reinforcement learning human feedback", "speech self-supervised learning",
+    "language model reasoning benchmarks", "federated learning privacy attacks",
+    "neural radiance fields", "code generation models", "mixture of experts routing",
+    "contrastive image text pretraining", "protein structure prediction", "time series forecasting transformers",
+    "model quantization inference", "continual learning forgetting", "adversarial robustness certification",
+    "multi-agent reinforcement learning", "tabular deep learning", "knowledge graph completion",
+]
+TEMPLATES = ["Survey of {}", "Recent advances in {}", "Open problems in {}", "Key papers on {}"]
+
+
+def build_questions(topics: int, per_topic: int) -> dict:
+    """问题 => 模型发出的查询（同一主题的问题查询相同）"""
+    questions = {}
+    for topic in TOPICS[:topics]:
+        for template in TEMPLATES[:per_topic]:
+            questions[template.format(topic)] = topic
+    return questions
+
+
+def reset_agent(args, questions: dict) -> FakeArxivTool:
+    """每种方式使用新的工具实例与空的 arXiv 缓存"""
+    with SessionLocal() as db:
+        db.execute(delete(ArxivCacheEntry))
+        db.commit()
+    tool = FakeArxivTool(latency=args.tool_latency)
+    agent_service._initialize_agent(
+        FakeResearchChatModel(
+            think_latency=args.think_latency, token_interval=0.005, answer_tokens=args.answer_tokens,
+            tool_queries=questions,
+        ),
+        [CachedArxivTool.wrap(tool)],
+    )
+    return tool
+
+
+async def run_sequential(client: httpx.AsyncClient, questions: dict) -> dict:
+    started = time.perf_counter()
+    first = None
+    for question in questions:
+        session = (await client.post("/api/chat/sessions", json={"title": question})).json()
+        response = await client.post("/api/chat/message", json={"message": question, "session_id": session["id"]})
+        response.raise_for_status()
+        first = first or time.perf_counter() - started
+    return {"elapsed_seconds": time.perf_counter() - started, "first_result_seconds": first, "transactions": None}
+
+
+async def run_batch(client: httpx.AsyncClient, questions: dict, concurrency: int) -> dict:
+    started = time.perf_counter()
+    first, results, summary = None, 0, None
+    async with client.stream(
+        "POST", "/api/chat/batch", json={"questions": list(questions), "concurrency": concurrency}
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            item = json.loads(line)
+            if item["type"] == "summary":
+                summary = item
+                continue
+            assert item["status"] == "success", item
+            results += 1
+            first = first or time.perf_counter() - started
+    assert results == len(questions) and summary is not None
+    return {
+        "elapsed_seconds": time.perf_counter() - started,
+        "first_result_seconds": first,
+        "transactions": summary["transactions"],
+    }
+
+
+async def run(args, base_url: str) -> dict:
+    questions = build_questions(args.topics, args.per_topic)
+    cases = [("sequential", None)] + [(f"batch c={c}", c) for c in (int(n) for n in args.concurrency.split(","))]
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        for name, concurrency in cases:
+            tool = reset_agent(args, questions)
+            if concurrency is None:
+                result = await run_sequential(client, questions)
+            else:
+                result = await run_batch(client, questions, concurrency)
+            result["questions_per_second"] = len(questions) / result["elapsed_seconds"]
+            result["arxiv_requests"] = tool.calls
+            results[name] = result
+    return {"questions": len(questions), "cases": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量问答：吞吐、首条结果时间、arXiv 请求数与写库事务数")
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--per-topic", type=int, default=3, help="每个主题的问题数（共享同一查询）")
+    parser.add_argument("--concurrency", default="4,8", help="批量请求的并发数（逗号分隔）")
+    parser.add_argument("--think-latency", type=float, default=0.3, help="假模型每次调用的思考时间（秒）")
+    parser.add_argument("--tool-latency", type=float, default=0.8, help="arXiv 查询延迟（秒）")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    for name in ("app", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    settings.answer_cache_enabled = False
+    settings.batch_max_concurrency = max(settings.batch_max_concurrency, *(int(n) for n in args.concurrency.split(",")))
+    create_tables()
+    # 启动前先注入假模型，应用启动时的预热不会再构建真实的 Agent
+    reset_agent(args, build_questions(args.topics, args.per_topic))
+
+    with serve() as base_url:
+        report = asyncio.run(run(args, base_url))
+
+    print(f"{report['questions']} 个问题")
+    print(f"{'case':<14}{'total s':>10}{'q/s':>8}{'first s':>10}{'arxiv':>8}{'commits':>9}")
+    for name, r in report["cases"].items():
+        commits = "-" if r["transactions"] is None else str(r["transactions"])
+        print(f"{name:<14}{r['elapsed_seconds']:>10.2f}{r['questions_per_second']:>8.2f}"
+              f"{r['first_result_seconds']:>10.2f}{r['arxiv_requests']:>8}{commits:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
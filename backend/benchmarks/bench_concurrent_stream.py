@@ -0,0 +1,77 @@
+# backend/benchmarks/bench_concurrent_stream.py
+"""
+并发流式请求基准：N 个 /api/chat/stream 请求同时发出，
+在 Agent 不阻塞事件循环时，总耗时应接近单个请求的耗时
+（超过全局并发上限 AGENT_MAX_CONCURRENT_RUNS 时按批次计：ceil(N / 上限) 个单请求耗时）
+总耗时超出预期 --max-ratio 倍时以非零状态退出，生成退化为串行时可以直接发现
+
+运行：python -m benchmarks.bench_concurrent_stream --concurrency 10
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+from typing import Tuple
+
+import httpx
+
+from benchmarks.harness import app, setup_app
+from app.scheduler import agent_scheduler
+
+
+async def stream_once(client: httpx.AsyncClient, session_id: str) -> float:
+    start = time.perf_counter()
+    async with client.stream(
+        "POST", "/api/chat/stream",
+        json={"session_id": session_id, "message": "diffusion models for video", "stream": True},
+    ) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_lines():
+            pass
+    return time.perf_counter() - start
+
+
+def expected_seconds(single: float, concurrency: int) -> float:
+    """并发请求的预期总耗时：受全局并发上限约束，按批次运行"""
+    return single * math.ceil(concurrency / agent_scheduler.max_concurrent)
+
+
+async def run(concurrency: int) -> Tuple[float, float]:
+    """返回 (单个请求耗时, concurrency 个并发请求的总耗时)"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        session_ids = []
+        for i in range(concurrency):
+            res = await client.post("/api/chat/sessions", json={"title": f"bench-{i}"})
+            session_ids.append(res.json()["id"])
+
+        single = await stream_once(client, session_ids[0])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(stream_once(client, sid) for sid in session_ids))
+        total = time.perf_counter() - start
+    return single, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="并发 /api/chat/stream 基准")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--think-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.3)
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="总耗时 / 预期耗时 的上限")
+    args = parser.parse_args()
+
+    setup_app(args.think_latency, args.tool_latency)
+    single, total = asyncio.run(run(args.concurrency))
+    expected = expected_seconds(single, args.concurrency)
+
+    print(f"单个请求耗时: {single:.3f}s")
+    print(f"{args.concurrency} 个并发请求总耗时: {total:.3f}s (比值 {total / single:.2f}，预期 {expected:.3f}s)")
+    if total > expected * args.max_ratio:
+        print(f"并发请求总耗时超过预期的 {args.max_ratio} 倍，生成可能被串行化")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
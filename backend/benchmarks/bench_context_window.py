@@ -0,0 +1,82 @@
+# backend/benchmarks/bench_context_window.py
+"""
+对话上下文基准：对 10 / 100 / 1000 轮的会话逐轮模拟，
+对比"全部历史"与"滚动摘要 + 最近轮次"两种方式下最后一轮的提示词大小
+
+运行：python -m benchmarks.bench_context_window
+"""
+import os
+import tempfile
+
+# 必须在导入 app 之前设置，使基准使用临时数据库而不是开发数据库
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_context.db"
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.services import ConversationContextManager
+
+
+def make_message(index: int, role: str, start: datetime) -> dict:
+    if role == "user":
+        content = f"第{index}个问题：请帮我查找关于扩散模型在视频生成中的最新论文，并比较它们的方法。"
+    else:
+        content = ("Published: 2024-01-01\nTitle: Video Diffusion Models\nAuthors: Alice Zhang\n"
+                   "Summary: 本文提出了一种新的视频扩散模型。 " * 8)
+    return {"id": f"{index:06d}-{role}", "created_at": start + timedelta(seconds=index), "role": role, "content": content}
+
+
+async def simulate(turns: int, manager: ConversationContextManager) -> dict:
+    start = datetime(2024, 1, 1)
+    messages = []
+    summary = None
+    summarized = 0          # 已折叠进摘要的消息数（相当于持久化的摘要游标）
+    summary_updates = 0
+    window = None
+
+    for i in range(turns):
+        messages.append(make_message(i, "user", start))
+        # 与 API 一致：历史为摘要游标之后、本轮用户消息之前的消息
+        window = await manager.prepare(messages[summarized:-1], summary)
+        if window["summary_updated"]:
+            summary = window["summary"]
+            summarized = messages.index(window["summarized_through"]) + 1
+            summary_updates += 1
+        messages.append(make_message(i, "assistant", start))
+
+    full_tokens = sum(manager.estimate_tokens(m["content"]) for m in messages[:-2])
+    return {
+        "turns": turns,
+        "full_history_tokens": full_tokens,
+        "window_tokens": window["prompt_tokens"],
+        "window_messages": len(window["history"]),
+        "summary_updates": summary_updates,
+    }
+
+
+async def run(turn_counts) -> None:
+    # 不注入模型，使用截断式摘要，结果可复现且不消耗模型配额
+    manager = ConversationContextManager(
+        token_budget=settings.context_token_budget,
+        keep_turns=settings.context_keep_turns,
+        summary_max_tokens=settings.context_summary_max_tokens,
+        summary_batch_turns=settings.context_summary_batch_turns,
+    )
+    print(f"{'turns':>6}{'full tokens':>14}{'window tokens':>16}{'window msgs':>14}{'summaries':>11}")
+    for turns in turn_counts:
+        r = await simulate(turns, manager)
+        print(f"{r['turns']:>6}{r['full_history_tokens']:>14}{r['window_tokens']:>16}"
+              f"{r['window_messages']:>14}{r['summary_updates']:>11}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对话上下文窗口提示词大小基准")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    asyncio.run(run(args.turns))
+
+
+if __name__ == "__main__":
+    main()
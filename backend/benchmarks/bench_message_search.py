@@ -0,0 +1,235 @@
+# backend/benchmarks/bench_message_search.py
+"""
+会话历史全文检索基准
+- 生成一个大库（默认 100 万条消息、5 万个会话）：正文词频服从 Zipf 分布，
+  部分 assistant 消息带 arXiv 工具结果（论文标题从固定的池中抽取，会在不同会话中重复出现）
+  表结构与索引由 create_tables 创建，消息与索引行用 sqlite3 批量写入（与 crud 写入的内容一致）
+- 通过 app.search.asearch_messages（与 GET /api/chat/search 相同的路径）测量各类查询的 p50/p95：
+  罕见词、论文标题短语、中频词、高频词、多词、带停用词、前缀、按会话过滤、按时间排序、翻页
+
+运行：python -m benchmarks.bench_message_search --messages 1000000 --output search.json
+复用已生成的库：DATABASE_URL=sqlite:////tmp/search.db python -m benchmarks.bench_message_search
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_search.db")
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sqlite3
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import database
+from app.config import settings
+from app.database import AsyncSessionLocal, create_tables
+from app.search import asearch_messages, encode_cursor, match_expression, scope, tool_titles
+
+TOPIC_WORDS = (
+    "graph neural network attention transformer retrieval benchmark dataset training model language "
+    "representation learning optimization convergence gradient sparse dense embedding evaluation robust "
+    "generalization architecture scaling inference latency memory efficient contrastive supervised"
+).split()
+COMMON_WORDS = "the of and to in is that for with on this we are as by it be from an".split()
+SYLLABLES = "ka lo mi ra ne su to vi ze pa do ri mu lan ter gos vek".split()
+
+
+def vocabulary(rng: random.Random, size: int) -> tuple:
+    """常用词 + 主题词 + 合成词，权重按 Zipf 分布递减（返回词表与累计权重）"""
+    words = list(dict.fromkeys(COMMON_WORDS + TOPIC_WORDS))
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(words))))
+    return words, cum_weights
+
+
+def title_pool(rng: random.Random, words: list, size: int) -> list:
+    # 标题用词表尾部的低频词，使标题检索接近真实的“找某篇论文”
+    tail = words[len(words) // 2:]
+    return [" ".join(rng.choice(tail) for _ in range(rng.randint(4, 8))).title() for _ in range(size)]
+
+
+def arxiv_result(titles: list) -> str:
+    return "\n\n".join(
+        f"Published: 2023-05-01\nTitle: {title}\nAuthors: Author A, Author B\nSummary: ..." for title in titles
+    )
+
+
+def generate(path: str, args) -> float:
+    """批量写入会话、消息与索引行，返回耗时（秒）"""
+    rng = random.Random(args.seed)
+    words, cum_weights = vocabulary(rng, args.vocabulary)
+    titles = title_pool(rng, words, args.titles)
+    start = datetime(2024, 1, 1)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    rowid = 0
+    sessions = max(1, args.messages // args.session_length)
+    for s in range(sessions):
+        session_id = str(uuid.uuid4())
+        created = start + timedelta(minutes=s)
+        conn.execute(
+            "INSERT INTO chat_sessions(id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, " ".join(rng.choices(TOPIC_WORDS, k=3)), created.isoformat(" "), created.isoformat(" ")),
+        )
+        messages, index_rows = [], []
+        for i in range(args.session_length):
+            rowid += 1
+            role = "user" if i % 2 == 0 else "assistant"
+            length = rng.randint(8, 25) if role == "user" else rng.randint(40, 120)
+            content = " ".join(rng.choices(words, cum_weights=cum_weights, k=length))
+            results = []
+            if role == "assistant" and rng.random() < args.tool_ratio:
+                results.append(arxiv_result(rng.sample(titles, 3)))
+            messages.append((
+                rowid, str(uuid.uuid4()), session_id, role, content,
+                (created + timedelta(seconds=i)).isoformat(" ", timespec="microseconds"),
+            ))
+            index_rows.append((rowid, content, tool_titles(results), scope(session_id, role)))
+        conn.executemany(
+            "INSERT INTO chat_messages(rowid, id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            messages,
+        )
+        conn.executemany(
+            "INSERT INTO messages_fts(rowid, content, tool_titles, scope) VALUES (?, ?, ?, ?)", index_rows
+        )
+        if s % 1000 == 999:
+            conn.commit()
+            print(f"  已写入 {rowid} 条消息")
+    conn.commit()
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return time.perf_counter() - started
+
+
+def pick_queries(path: str, rng: random.Random) -> dict:
+    """按实际文档频率从库中挑选各类查询词"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.bench_vocab USING fts5vocab(main, messages_fts, 'col')")
+    by_doc = conn.execute(
+        "SELECT term, doc FROM temp.bench_vocab WHERE col = 'content' ORDER BY doc DESC"
+    ).fetchall()
+    total = conn.execute("SELECT count(*) FROM chat_messages").fetchone()[0]
+    title = conn.execute(
+        "SELECT tool_titles FROM messages_fts WHERE tool_titles != '' LIMIT 1 OFFSET ?", (rng.randint(0, 1000),)
+    ).fetchone()
+    session_id = conn.execute("SELECT session_id FROM chat_messages ORDER BY rowid DESC LIMIT 1").fetchone()[0]
+    conn.close()
+
+    def with_doc_ratio(low: float, high: float) -> str:
+        candidates = [term for term, doc in by_doc if low * total <= doc <= high * total and len(term) > 3]
+        return rng.choice(candidates) if candidates else by_doc[len(by_doc) // 2][0]
+
+    rare = with_doc_ratio(0, 0.0001)
+    medium = with_doc_ratio(0.005, 0.02)
+    common = by_doc[0][0]
+    queries = {
+        "rare_word": (rare, {}),
+        "title_phrase": (f'"{title[0].splitlines()[0]}"' if title else rare, {}),
+        "medium_word": (medium, {}),
+        "common_word": (common, {}),
+        "two_words": (f"{medium} {with_doc_ratio(0.005, 0.02)}", {}),
+        "with_stopwords": (f"the {medium} of {rare}", {}),
+        "prefix": (medium[:3] + "*", {}),
+        "common_in_session": (common, {"session_id": session_id}),
+        "common_recent": (common, {"order": "recent"}),
+        "medium_page_5": (medium, {"page": 5}),
+    }
+    return {"documents": total, "queries": queries}
+
+
+async def measure(query: str, options: dict, repeats: int, limit: int) -> dict:
+    options = dict(options)
+    page = options.pop("page", 1)
+    # 直接请求第 page 页（游标即偏移量）
+    cursor = encode_cursor(limit * (page - 1)) if page > 1 else None
+    timings, hits = [], 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            rows, _, _ = await asearch_messages(db, query, limit, cursor, **options)
+        timings.append(time.perf_counter() - started)
+        hits = len(rows)
+    async with AsyncSessionLocal() as db:
+        matches = (await db.execute(
+            text("SELECT count(*) FROM messages_fts WHERE messages_fts MATCH :expression"),
+            {"expression": match_expression(query)},
+        )).scalar()
+    ordered = sorted(timings)
+    return {
+        "query": query,
+        "options": options,
+        "page": page,
+        "matches": matches,      # 整个库中匹配的消息数（不含会话过滤）
+        "returned": hits,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="会话历史全文检索：大库上的查询延迟")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--session-length", type=int, default=20, help="每个会话的消息数")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--titles", type=int, default=20_000, help="论文标题池大小")
+    parser.add_argument("--tool-ratio", type=float, default=0.3, help="带 arXiv 结果的 assistant 消息比例")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    path = settings.DATABASE_URL.replace("sqlite:///", "", 1)
+    create_tables()
+    if not database.FTS5_AVAILABLE:
+        raise SystemExit("当前 SQLite 未编译 FTS5")
+    with sqlite3.connect(path) as conn:
+        existing = conn.execute("SELECT count(*) FROM chat_messages").fetchone()[0]
+    results = {"database": path}
+    if existing:
+        print(f"复用已有的库：{existing} 条消息")
+    else:
+        print(f"生成 {args.messages} 条消息 ...")
+        results["generate_seconds"] = generate(path, args)
+        print(f"生成耗时 {results['generate_seconds']:.0f}s")
+    results["db_bytes"] = os.path.getsize(path)
+
+    picked = pick_queries(path, random.Random(args.seed))
+    results["documents"] = picked["documents"]
+    results["queries"] = {}
+    print(f"\n{picked['documents']} 条消息，数据库 {results['db_bytes'] / 1e6:.0f} MB")
+    print(f"{'query':<20}{'matches':>10}{'p50 ms':>10}{'p95 ms':>10}  q")
+    for name, (query, options) in picked["queries"].items():
+        r = asyncio.run(measure(query, options, args.repeats, args.limit))
+        results["queries"][name] = r
+        print(f"{name:<20}{r['matches']:>10}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}  {query[:40]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# backend/benchmarks/bench_parallel_tools.py
+"""
+并行工具执行基准：假模型在一条输出中发起多个 arxiv 调用，假工具按固定延迟休眠
+并发执行时，一轮的工具耗时应接近单次调用而不是所有调用之和
+同时检查：
+- 重叠：各并发上限下的耗时接近 ceil(调用数 / 上限) 个单次调用
+- 顺序：后发起的调用先完成时，ToolMessage 仍按调用顺序排列，结果与查询一一对应
+- 超时：慢工具（TOOL_TIMEOUTS 中按工具覆盖的超时）返回超时的 ToolMessage，本轮不等待其完成
+任何一项不满足时以非零状态退出
+
+运行：python -m benchmarks.bench_parallel_tools --calls 3 --tool-latency 0.5
+"""
+import os
+import tempfile
+
+# 必须在导入 app 之前设置，使基准使用临时数据库而不是开发数据库
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_tools.db"
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import List
+
+from app.services import AcademicResearchAgentService
+from app.config import settings
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+QUESTION = "diffusion models for video"
+
+
+class StaggeredArxivTool(FakeArxivTool):
+    """后发起的调用延迟更短：第 i 个调用（查询以 " i" 结尾）休眠 latency * (calls - i) / calls"""
+
+    calls_per_turn: int = 3
+
+    async def _arun(self, query: str, run_manager=None) -> str:
+        suffix = query.rsplit(" ", 1)[-1]
+        index = int(suffix) if suffix.isdigit() else 0
+        await asyncio.sleep(self.latency * (self.calls_per_turn - index) / self.calls_per_turn)
+        return self._result(query)
+
+
+def _service(tool: FakeArxivTool, calls: int) -> AcademicResearchAgentService:
+    return AcademicResearchAgentService(
+        FakeResearchChatModel(think_latency=0.0, token_interval=0.0, tool_calls_per_turn=calls),
+        [tool],
+    )
+
+
+async def run_turn(service: AcademicResearchAgentService) -> tuple:
+    start = time.perf_counter()
+    result = await service.process_message(QUESTION)
+    elapsed = time.perf_counter() - start
+    assert result["tool_results"], result["content"]
+    return elapsed, result
+
+
+async def check_overlap(calls: int, tool_latency: float, timeout: float) -> List[dict]:
+    """各并发上限下一轮的耗时应接近 ceil(calls / 上限) 个单次调用"""
+    rows = []
+    for limit in sorted({1, max(calls // 2, 1), calls}):
+        settings.tool_max_concurrency = limit
+        settings.tool_timeout_seconds = timeout
+        settings.tool_timeouts = ""
+        tool = FakeArxivTool(latency=tool_latency)
+        elapsed, _ = await run_turn(_service(tool, calls))
+        expected = math.ceil(calls / limit) * tool_latency
+        rows.append({"limit": limit, "elapsed": elapsed, "expected": expected, "calls": tool.calls})
+        assert tool.calls == calls, rows[-1]
+        assert expected * 0.95 <= elapsed <= expected + tool_latency * 0.5 + 0.2, rows[-1]
+    return rows
+
+
+async def check_order(calls: int, tool_latency: float) -> float:
+    """后发起的调用先完成时，结果仍按调用顺序排列且与查询一一对应"""
+    settings.tool_max_concurrency = calls
+    settings.tool_timeouts = ""
+    tool = StaggeredArxivTool(latency=tool_latency, calls_per_turn=calls)
+    elapsed, result = await run_turn(_service(tool, calls))
+    tool_calls = json.loads(result["tool_calls"])
+    tool_results = json.loads(result["tool_results"])
+    assert list(tool_results) == [call["id"] for call in tool_calls], (tool_calls, list(tool_results))
+    for call in tool_calls:
+        assert f"Title: {call['args']['query']} paper 1" in tool_results[call["id"]]
+    assert elapsed < tool_latency * 1.5, elapsed
+    return elapsed
+
+
+async def check_timeout(tool_latency: float, timeout: float) -> float:
+    """arxiv 的超时按工具覆盖为 timeout 秒：调用返回超时的 ToolMessage，本轮在超时后继续"""
+    settings.tool_max_concurrency = 1
+    settings.tool_timeout_seconds = tool_latency * 10
+    settings.tool_timeouts = f"arxiv={timeout:g}"
+    try:
+        elapsed, result = await run_turn(_service(FakeArxivTool(latency=tool_latency), 1))
+    finally:
+        settings.tool_timeouts = ""
+    (content,) = json.loads(result["tool_results"]).values()
+    assert content.startswith(f"Tool 'arxiv' timed out after {timeout:g}s"), content
+    assert elapsed < tool_latency, elapsed
+    return elapsed
+
+
+async def run(calls: int, tool_latency: float, timeout: float) -> None:
+    print(f"{'max concurrency':>16}{'turn seconds':>14}{'expected':>10}{'tool calls':>12}")
+    for row in await check_overlap(calls, tool_latency, timeout):
+        print(f"{row['limit']:>16}{row['elapsed']:>14.3f}{row['expected']:>10.3f}{row['calls']:>12}")
+    print(f"乱序完成时结果保持调用顺序: {await check_order(calls, tool_latency):.3f}s")
+    print(f"慢工具按 TOOL_TIMEOUTS 超时: {await check_timeout(tool_latency, tool_latency / 5):.3f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="并行工具执行基准")
+    parser.add_argument("--calls", type=int, default=3)
+    parser.add_argument("--tool-latency", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.calls, args.tool_latency, args.timeout))
+    except AssertionError as e:
+        print(f"检查失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
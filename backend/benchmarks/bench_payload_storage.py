@@ -0,0 +1,222 @@
+# backend/benchmarks/bench_payload_storage.py
+"""
+大字段存储基准：在同一份合成语料上比较
+- before：旧布局，工具结果 JSON 与完整正文直接存放在 chat_messages 中
+- after：当前布局，工具结果与较长的正文按哈希去重、压缩存入 content_blobs
+输出数据库文件大小（VACUUM 后），以及读取整个会话并序列化为响应 JSON 的耗时和响应大小
+（after 分别测量 tool_payloads=exclude / truncate / full）
+
+语料：arXiv 摘要从固定大小的池中抽取，不同会话之间会重复出现；答案为较长的英文段落
+
+运行：python -m benchmarks.bench_payload_storage --sessions 200 --turns 5 --output payload.json
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_after.db"
+
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.api import _message_responses, _session_response
+from app.config import settings
+from app.database import AsyncSessionLocal, SessionLocal, create_tables
+from app.models import Base, ChatMessage, ChatSession
+from app.schemas import MessageCreate, SessionCreate
+
+WORDS = (
+    "graph neural network attention transformer retrieval benchmark dataset training model language "
+    "representation learning optimization convergence gradient sparse dense embedding evaluation robust "
+    "generalization architecture scaling inference latency memory efficient contrastive supervised"
+).split()
+
+def paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def abstract_pool(rng: random.Random, size: int) -> list:
+    pool = []
+    for i in range(size):
+        papers = []
+        for j in range(3):
+            papers.append(
+                f"Published: 20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}\n"
+                f"Title: {paragraph(rng, 8)}\nAuthors: Author {i}-{j}, Coauthor {j}\n"
+                f"Summary: {' '.join(paragraph(rng, 20) for _ in range(6))}"
+            )
+        pool.append("\n\n".join(papers))
+    return pool
+
+
+def build_corpus(args) -> list:
+    """[(会话ID, [消息字典])]；assistant 消息带 tool_invocations"""
+    rng = random.Random(args.seed)
+    pool = abstract_pool(rng, args.pool)
+    start = datetime(2024, 1, 1)
+    corpus = []
+    for s in range(args.sessions):
+        session_id = str(uuid.uuid4())
+        messages = []
+        for t in range(args.turns):
+            created = start + timedelta(minutes=s * 100 + t * 2)
+            messages.append({"role": "user", "content": paragraph(rng, 15), "created_at": created})
+            invocations = []
+            for k in range(args.tool_calls):
+                call_id = f"call_{uuid.uuid4().hex[:12]}"
+                invocations.append({
+                    "tool_call_id": call_id, "name": "arxiv", "args": {"query": paragraph(rng, 4)},
+                    "result": rng.choice(pool), "status": "success", "latency_ms": rng.uniform(200, 2000),
+                })
+            answer = "\n\n".join(paragraph(rng, 60) for _ in range(rng.randint(args.answer_paragraphs // 2, args.answer_paragraphs)))
+            messages.append({
+                "role": "assistant", "content": answer, "created_at": created + timedelta(seconds=30),
+                "invocations": invocations,
+            })
+        corpus.append((session_id, messages))
+    return corpus
+
+
+def write_before(path: str, corpus: list) -> None:
+    """旧布局：同样的表结构，但工具结果 JSON 与完整正文直接写在 chat_messages 中"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        for session_id, messages in corpus:
+            db.add(ChatSession(id=session_id, title="bench"))
+            for m in messages:
+                invocations = m.get("invocations") or []
+                tool_calls = [{"name": i["name"], "args": i["args"], "id": i["tool_call_id"]} for i in invocations]
+                tool_results = {i["tool_call_id"]: i["result"] for i in invocations}
+                db.add(ChatMessage(
+                    session_id=session_id, role=m["role"], content=m["content"], created_at=m["created_at"],
+                    tool_calls=json.dumps(tool_calls) if tool_calls else None,
+                    tool_results=json.dumps(tool_results) if tool_results else None,
+                ))
+        db.commit()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+
+
+def write_after(corpus: list) -> list:
+    create_tables()
+    session_ids = []
+    with SessionLocal() as db:
+        for _, messages in corpus:
+            db_session = crud.create_session(db, SessionCreate(title="bench"))
+            session_ids.append(db_session.id)
+            for m in messages:
+                invocations = m.get("invocations") or []
+                tool_calls = [{"name": i["name"], "args": i["args"], "id": i["tool_call_id"]} for i in invocations]
+                crud.create_message(db, MessageCreate(
+                    session_id=db_session.id, role=m["role"], content=m["content"],
+                    tool_calls=json.dumps(tool_calls) if tool_calls else None,
+                    tool_invocations=invocations or None,
+                ))
+    with sqlite3.connect(settings.DATABASE_URL.replace("sqlite:///", "", 1)) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    return session_ids
+
+
+async def load_before(path: str, session_ids: list) -> tuple:
+    """旧接口的等价过程：同样经过异步会话读取全部消息（含工具结果 JSON）并序列化"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    timings, sizes = [], []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        async with factory() as db:
+            db_session = await crud.aget_session(db, session_id)
+            messages = await crud.aget_messages_by_session(db, session_id)
+        body = _session_response(db_session, messages).model_dump_json()
+        timings.append(time.perf_counter() - started)
+        sizes.append(len(body))
+    await engine.dispose()
+    return timings, sizes
+
+
+async def load_after(session_ids: list, tool_payloads: str) -> tuple:
+    timings, sizes = [], []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            db_session = await crud.aget_session(db, session_id)
+            messages = await crud.aget_messages_by_session(db, session_id)
+            responses = await _message_responses(db, messages, tool_payloads)
+        body = _session_response(db_session, responses).model_dump_json()
+        timings.append(time.perf_counter() - started)
+        sizes.append(len(body))
+    return timings, sizes
+
+
+def summarize(timings: list, sizes: list) -> dict:
+    ordered = sorted(timings)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+        "avg_response_bytes": statistics.mean(sizes),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="大字段存储：数据库大小与会话读取耗时")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tool-calls", type=int, default=3, help="每轮的 arXiv 调用数")
+    parser.add_argument("--pool", type=int, default=150, help="不同 arXiv 结果的数量（越小重复越多）")
+    parser.add_argument("--answer-paragraphs", type=int, default=8)
+    parser.add_argument("--loads", type=int, default=100, help="测量读取的会话数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    corpus = build_corpus(args)
+    before_path = os.path.join(tempfile.mkdtemp(), "bench_before.db")
+    write_before(before_path, corpus)
+    session_ids = write_after(corpus)
+    after_path = settings.DATABASE_URL.replace("sqlite:///", "", 1)
+
+    rng = random.Random(args.seed)
+    picks = [rng.randrange(len(corpus)) for _ in range(args.loads)]
+    before_ids = [corpus[i][0] for i in picks]
+    after_ids = [session_ids[i] for i in picks]
+
+    results = {
+        "corpus": {k: getattr(args, k) for k in ("sessions", "turns", "tool_calls", "pool", "answer_paragraphs")},
+        "db_bytes": {"before": os.path.getsize(before_path), "after": os.path.getsize(after_path)},
+        "load": {"before": summarize(*asyncio.run(load_before(before_path, before_ids)))},
+    }
+    for mode in ("exclude", "truncate", "full"):
+        results["load"][f"after_{mode}"] = summarize(*asyncio.run(load_after(after_ids, mode)))
+
+    db_bytes = results["db_bytes"]
+    print(f"数据库大小: before {db_bytes['before'] / 1e6:.2f} MB, after {db_bytes['after'] / 1e6:.2f} MB "
+          f"({db_bytes['after'] / db_bytes['before']:.0%})")
+    print(f"{'load':<16}{'p50 ms':>10}{'p95 ms':>10}{'resp KB':>10}")
+    for name, r in results["load"].items():
+        print(f"{name:<16}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['avg_response_bytes'] / 1024:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
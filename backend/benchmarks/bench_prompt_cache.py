@@ -0,0 +1,183 @@
+# backend/benchmarks/bench_prompt_cache.py
+"""
+前缀缓存基准：在一个会话中连续进行多轮流式问答（/api/chat/stream，经过 uvicorn，与真实客户端相同），
+假模型用 FakePromptCache 模拟服务端前缀缓存（命中的输入 token 报告为 cached_tokens，未命中部分计预填充时间）
+每轮工具调用分两次发起，历史较长时按 token 预算折叠进摘要。比较两种消息组装：
+- legacy：旧的做法，同一轮的工具调用在历史中合并为一条 AIMessage，超出预算时每轮只折叠一轮（摘要每轮改写）
+- stable：按 step 还原工具调用序列，超出预算时至少折叠 CONTEXT_SUMMARY_BATCH_TURNS 轮
+统计每轮输入 token 的缓存命中比例、首 token 时间（客户端测量）与摘要改写次数
+
+运行：python -m benchmarks.bench_prompt_cache --turns 30 --output prompt_cache.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+import types
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import app, serve
+from app import services
+from app.config import settings
+from app.database import create_tables
+from app.services import agent_service
+from benchmarks.fakes import FakeArxivTool, FakePromptCache, FakeResearchChatModel
+
+QUESTIONS = [
+    "graph neural networks for molecules", "retrieval augmented generation evaluation",
+    "efficient attention for long context", "diffusion models for video generation",
+    "reinforcement learning from human feedback", "mixture of experts routing",
+]
+
+_stable_history_to_messages = services.history_to_messages
+
+
+def legacy_history_to_messages(history):
+    """旧的历史还原：不区分 step，同一轮的工具调用合并为一条 AIMessage"""
+    return _stable_history_to_messages([
+        {**msg, "tool_invocations": [{**i, "step": None} for i in msg.get("tool_invocations") or []]}
+        for msg in history or ()
+    ])
+
+
+async def legacy_prepare(self, history: List[Dict], summary: Optional[str] = None) -> Dict:
+    """旧的 prepare：超出预算时每次只折叠到刚好满足预算"""
+    turns = self.split_turns(history)
+    older = len(turns) - self.keep_turns
+    fold_count = older if older >= self.summary_batch_turns else 0
+    while fold_count < len(turns) - 1:
+        summary_tokens = self.summary_max_tokens if fold_count else self.estimate_tokens(summary)
+        if summary_tokens + self._turn_tokens(turns[fold_count:]) <= self.token_budget:
+            break
+        fold_count += 1
+    folded = [msg for turn in turns[:fold_count] for msg in turn]
+    window = [msg for turn in turns[fold_count:] for msg in turn]
+    if folded:
+        summary = await self.summarize(summary, folded)
+    messages = [{"role": "system", "content": f"以下是本会话较早对话的摘要：\n{summary}"}] if summary else []
+    messages.extend(window)
+    return {
+        "history": messages,
+        "summary": summary,
+        "summary_updated": bool(folded),
+        "summarized_through": folded[-1] if folded else None,
+        "prompt_tokens": sum(self.message_tokens(m) for m in messages),
+    }
+
+
+def setup_mode(mode: str, args) -> None:
+    """换上新的假模型（空的前缀缓存），并按模式切换消息组装"""
+    agent_service._initialize_agent(
+        FakeResearchChatModel(
+            think_latency=args.think_latency, token_interval=0.002, answer_tokens=args.answer_tokens,
+            tool_rounds=2, prompt_cache=FakePromptCache(prefill_seconds_per_1k=args.prefill_per_1k),
+        ),
+        [FakeArxivTool(latency=0.05)],
+    )
+    manager = agent_service.context_manager
+    if mode == "legacy":
+        services.history_to_messages = legacy_history_to_messages
+        manager.prepare = types.MethodType(legacy_prepare, manager)
+    else:
+        services.history_to_messages = _stable_history_to_messages
+        manager.__dict__.pop("prepare", None)
+
+
+async def run_turn(client: httpx.AsyncClient, session_id: str, question: str) -> dict:
+    started = time.perf_counter()
+    first, usage = None, None
+    async with client.stream(
+        "POST", "/api/chat/stream", json={"message": question, "session_id": session_id, "bypass_cache": True}
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("content") and not event.get("is_final") and first is None:
+                first = time.perf_counter() - started
+            if event.get("is_final"):
+                usage = event.get("usage")
+    return {"ttft": first, **(usage or {})}
+
+
+async def run_mode(client: httpx.AsyncClient, mode: str, args) -> dict:
+    setup_mode(mode, args)
+    manager = agent_service.context_manager
+    summarize, rewrites = manager.summarize, 0
+
+    async def counted_summarize(*a, **kw):
+        # 每次改写摘要，摘要之后的整个提示都不再能命中缓存
+        nonlocal rewrites
+        rewrites += 1
+        return await summarize(*a, **kw)
+
+    manager.summarize = counted_summarize
+    session_id = (await client.post("/api/chat/sessions", json={"title": mode})).json()["id"]
+    turns = []
+    try:
+        for i in range(args.turns):
+            turns.append(await run_turn(client, session_id, f"{QUESTIONS[i % len(QUESTIONS)]} (part {i})"))
+    finally:
+        manager.__dict__.pop("summarize", None)
+    # 前几轮历史很短，从第 warmup 轮开始统计
+    measured = turns[args.warmup:]
+    prompt = sum(t["prompt_tokens"] for t in measured)
+    return {
+        "cached_ratio": sum(t["cached_prompt_tokens"] for t in measured) / prompt if prompt else 0.0,
+        "prompt_tokens_per_turn": prompt / len(measured),
+        "ttft_p50_ms": statistics.median(t["ttft"] for t in measured) * 1000,
+        "ttft_mean_ms": statistics.mean(t["ttft"] for t in measured) * 1000,
+        "summary_rewrites": rewrites,
+        "per_turn_cached_ratio": [
+            round(t["cached_prompt_tokens"] / t["prompt_tokens"], 3) if t["prompt_tokens"] else 0.0 for t in turns
+        ],
+    }
+
+
+async def run(args, base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        return {mode: await run_mode(client, mode, args) for mode in ("legacy", "stable")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="前缀缓存：消息组装的前缀稳定性、缓存命中比例与首 token 时间")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=4, help="不计入统计的前几轮")
+    parser.add_argument("--think-latency", type=float, default=0.05, help="每次模型调用的固定延迟（秒）")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.1, help="未命中缓存的每 1k 输入 token 的预填充时间（秒）")
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--token-budget", type=int, default=2500, help="历史的 token 预算（较小时每轮都会超出预算）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    for name in ("app", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    settings.answer_cache_enabled = False
+    settings.arxiv_cache_enabled = False
+    manager = agent_service.context_manager
+    manager.token_budget = args.token_budget
+    create_tables()
+    # 启动前先注入假模型，应用启动时的预热不会再构建真实的 Agent
+    setup_mode("stable", args)
+
+    with serve() as base_url:
+        results = asyncio.run(run(args, base_url))
+
+    print(f"{'mode':<10}{'cached':>9}{'prompt tok':>12}{'ttft p50':>10}{'ttft mean':>11}{'summaries':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['cached_ratio']:>9.1%}{r['prompt_tokens_per_turn']:>12.0f}"
+              f"{r['ttft_p50_ms']:>10.1f}{r['ttft_mean_ms']:>11.1f}{r['summary_rewrites']:>11}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
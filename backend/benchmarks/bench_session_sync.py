@@ -0,0 +1,127 @@
+# backend/benchmarks/bench_session_sync.py
+"""
+会话增量同步基准：发送一轮（两条新消息）之后刷新当前会话，比较
+- full：旧的做法，重新请求会话列表与整个会话详情
+- delta：带 If-None-Match 请求会话列表，再用 messages?after=<游标> 只取新增的消息
+- unchanged：什么都没变时的刷新（列表与详情均为 304）
+另外测量 watermark 接口。按会话长度分别统计响应字节数与 p50/p95 耗时
+
+运行：python -m benchmarks.bench_session_sync --lengths 20,200,1000 --output sync.json
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_sync.db"
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app import crud
+from app.database import SessionLocal, create_tables
+from app.main import app
+from app.schemas import MessageCreate, SessionCreate
+
+WORDS = (
+    "graph neural network attention transformer retrieval benchmark dataset training model language "
+    "representation learning optimization convergence gradient sparse dense embedding evaluation"
+).split()
+
+
+def paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def add_turn(session_id: str, rng: random.Random) -> None:
+    with SessionLocal() as db:
+        crud.create_message(db, MessageCreate(session_id=session_id, role="user", content=paragraph(rng, 15)))
+        crud.create_message(db, MessageCreate(session_id=session_id, role="assistant", content=paragraph(rng, 200)))
+
+
+def summarize(timings: list, sizes: list) -> dict:
+    ordered = sorted(timings)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+        "avg_response_bytes": statistics.mean(sizes),
+    }
+
+
+def measure_length(client: TestClient, length: int, rounds: int, rng: random.Random) -> dict:
+    with SessionLocal() as db:
+        session_id = crud.create_session(db, SessionCreate(title="bench")).id
+    for _ in range(length // 2):
+        add_turn(session_id, rng)
+    base = f"/api/chat/sessions/{session_id}"
+
+    samples = {name: ([], []) for name in ("full", "delta", "unchanged", "watermark")}
+
+    def record(name: str, started: float, *responses) -> None:
+        samples[name][0].append(time.perf_counter() - started)
+        samples[name][1].append(sum(len(r.content) for r in responses))
+
+    detail = client.get(base)
+    cursor, detail_etag = detail.headers["x-sync-cursor"], detail.headers["etag"]
+    listing = client.get("/api/chat/sessions")
+    list_etag = listing.headers["etag"]
+    for _ in range(rounds):
+        add_turn(session_id, rng)
+
+        started = time.perf_counter()
+        record("full", started, client.get("/api/chat/sessions"), client.get(base))
+
+        started = time.perf_counter()
+        sessions = client.get("/api/chat/sessions", headers={"If-None-Match": list_etag})
+        delta = client.get(f"{base}/messages", params={"after": cursor})
+        record("delta", started, sessions, delta)
+        assert len(delta.json()) == 2, delta.text
+        cursor, list_etag = delta.headers["x-sync-cursor"], sessions.headers["etag"]
+        detail_etag = client.get(base).headers["etag"]
+
+        started = time.perf_counter()
+        sessions = client.get("/api/chat/sessions", headers={"If-None-Match": list_etag})
+        detail = client.get(base, headers={"If-None-Match": detail_etag})
+        record("unchanged", started, sessions, detail)
+        assert sessions.status_code == detail.status_code == 304
+
+        started = time.perf_counter()
+        record("watermark", started, client.get(f"{base}/watermark"))
+    return {name: summarize(*values) for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="会话增量同步：全量刷新与增量刷新的耗时和响应大小")
+    parser.add_argument("--lengths", default="20,200,1000", help="会话的消息数（逗号分隔）")
+    parser.add_argument("--rounds", type=int, default=30, help="每个会话测量的轮数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    create_tables()
+    rng = random.Random(args.seed)
+    results = {}
+    with TestClient(app) as client:
+        for length in (int(n) for n in args.lengths.split(",")):
+            results[length] = measure_length(client, length, args.rounds, rng)
+
+    print(f"{'messages':<10}{'refresh':<12}{'p50 ms':>10}{'p95 ms':>10}{'resp KB':>10}")
+    for length, by_mode in results.items():
+        for name, r in by_mode.items():
+            print(f"{length:<10}{name:<12}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                  f"{r['avg_response_bytes'] / 1024:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
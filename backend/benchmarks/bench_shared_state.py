@@ -0,0 +1,153 @@
+# backend/benchmarks/bench_shared_state.py
+"""
+共享状态后端基准
+- 吞吐：memory / sqlite / redis（默认使用进程内的 FakeRedis，传 --redis-url 时连接真实服务）
+  各自的 get/set、加锁/解锁、流事件逐个追加 / 按批追加（每批 --batch 个，StreamTurn 的合并写入）/读取的每秒操作数
+- 锁正确性：N 个子进程在 SQLite 后端的租约锁保护下对同一个计数器做“读-改-写”，
+  结束后计数器必须等于总次数（没有丢失更新）
+
+运行：python -m benchmarks.bench_shared_state --ops 2000 --processes 4 --increments 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.state import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend, StateBackend
+from benchmarks.fakes import FakeRedis
+
+
+async def measure(backend: StateBackend, ops: int, batch: int) -> dict:
+    result = {}
+
+    start = time.perf_counter()
+    for i in range(ops):
+        await backend.set(f"bench:{i % 100}", "x" * 64, ttl=60)
+        await backend.get(f"bench:{i % 100}")
+    result["kv_ops_per_sec"] = 2 * ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        lock = backend.lock(f"bench-lock:{i % 10}", ttl=10)
+        await lock.acquire(timeout=1)
+        await lock.release()
+    result["lock_cycles_per_sec"] = ops / (time.perf_counter() - start)
+
+    stream = f"bench-stream-{time.time_ns()}"
+    start = time.perf_counter()
+    for i in range(ops):
+        await backend.append_event(stream, i + 1, json.dumps({"content": "tok "}), 60)
+    result["append_per_sec"] = ops / (time.perf_counter() - start)
+
+    batched = f"{stream}-batched"
+    event = json.dumps({"content": "tok "})
+    start = time.perf_counter()
+    for i in range(0, ops, batch):
+        await backend.append_events(batched, [(j + 1, event) for j in range(i, min(i + batch, ops))], 60)
+    result["append_batched_per_sec"] = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    read = 0
+    while read < ops:
+        read += len(await backend.read_events(stream, read))
+    await backend.close_stream(stream, 60)
+    result["read_events_per_sec"] = ops / (time.perf_counter() - start)
+    return result
+
+
+async def increment_worker(path: str, increments: int) -> None:
+    backend = SQLiteStateBackend(path)
+    for _ in range(increments):
+        async with backend.lock("counter", ttl=10):
+            value = int(await backend.get("counter") or 0)
+            # 让出事件循环，放大“读-改-写”之间的竞争窗口
+            await asyncio.sleep(0)
+            await backend.set("counter", str(value + 1))
+    await backend.aclose()
+
+
+def lock_correctness(processes: int, increments: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    SQLiteStateBackend(path)   # 预先建表，避免子进程同时建表
+    start = time.perf_counter()
+    children = [
+        subprocess.Popen([
+            sys.executable, "-m", "benchmarks.bench_shared_state",
+            "--child", path, "--increments", str(increments),
+        ])
+        for _ in range(processes)
+    ]
+    for child in children:
+        if child.wait() != 0:
+            raise RuntimeError(f"子进程退出码 {child.returncode}")
+    elapsed = time.perf_counter() - start
+
+    backend = SQLiteStateBackend(path)
+    counter = int(asyncio.run(backend.get("counter")) or 0)
+    expected = processes * increments
+    return {
+        "processes": processes,
+        "expected": expected,
+        "counter": counter,
+        "lost_updates": expected - counter,
+        "locked_increments_per_sec": expected / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="共享状态后端吞吐与锁正确性基准")
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=20, help="按批追加时每批的事件数")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--increments", type=int, default=200)
+    parser.add_argument("--redis-url", help="连接真实的 Redis；默认使用进程内的 FakeRedis")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(increment_worker(args.child, args.increments))
+        return
+
+    backends = {
+        "memory": lambda: MemoryStateBackend(),
+        "sqlite": lambda: SQLiteStateBackend(os.path.join(tempfile.mkdtemp(), "state.db")),
+        "redis": lambda: (
+            RedisStateBackend.from_url(args.redis_url) if args.redis_url else RedisStateBackend(FakeRedis())
+        ),
+    }
+
+    async def run_all() -> dict:
+        results = {}
+        for name, factory in backends.items():
+            backend = factory()
+            try:
+                results[name] = await measure(backend, args.ops, args.batch)
+            finally:
+                await backend.aclose()
+        return results
+
+    results = {"throughput": asyncio.run(run_all())}
+    print(f"{'backend':<10}{'kv ops/s':>12}{'lock/s':>12}{'append/s':>12}{'batched/s':>12}{'read/s':>12}")
+    for name, r in results["throughput"].items():
+        print(f"{name:<10}{r['kv_ops_per_sec']:>12.0f}{r['lock_cycles_per_sec']:>12.0f}"
+              f"{r['append_per_sec']:>12.0f}{r['append_batched_per_sec']:>12.0f}{r['read_events_per_sec']:>12.0f}")
+
+    results["lock_correctness"] = check = lock_correctness(args.processes, args.increments)
+    print(f"\n锁正确性: {check['processes']} 个进程，期望 {check['expected']}，实际 {check['counter']}，"
+          f"丢失 {check['lost_updates']}，{check['locked_increments_per_sec']:.0f} 次/秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+    if check["lost_updates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_sqlite_profiles.py
+"""
+SQLite 写入吞吐基准：对比 default / wal 存储配置，以及是否开启组提交
+多个并发"轮次"各自写入消息，同时有一个读者不断读取会话消息
+
+运行：python -m benchmarks.bench_sqlite_profiles --writers 20 --messages 50
+"""
+import os
+import tempfile
+
+# 必须在导入 app 之前设置：导入 app.database 时会按 SQLITE_PROFILE 改写所连接的数据库（例如切换为 WAL）
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_profiles.db"
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app import crud
+from app.database import apply_sqlite_pragmas, resolve_sqlite_pragmas
+from app.models import Base
+from app.schemas import MessageCreate, SessionCreate
+
+
+async def run_case(profile: str, group_commit: bool, writers: int, messages: int) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", pool_size=writers + 1, max_overflow=0)
+    apply_sqlite_pragmas(engine.sync_engine, resolve_sqlite_pragmas(profile))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    committer = crud.MessageGroupCommitter(session_factory, window_ms=5, max_batch=64)
+
+    async with session_factory() as db:
+        session_ids = [(await crud.acreate_session(db, SessionCreate(title=f"s{i}"))).id for i in range(writers)]
+
+    async def write(message_create: MessageCreate) -> None:
+        if group_commit:
+            await committer.submit([message_create])
+        else:
+            async with session_factory() as db:
+                await crud.acreate_message(db, message_create)
+
+    async def writer(session_id: str) -> None:
+        for i in range(messages):
+            await write(MessageCreate(session_id=session_id, role="user", content=f"message {i} " * 20))
+
+    read_latencies = []
+    stop = asyncio.Event()
+
+    async def reader() -> None:
+        while not stop.is_set():
+            start = time.perf_counter()
+            async with session_factory() as db:
+                await crud.aget_messages_by_session(db, session_ids[0])
+            read_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.001)
+
+    reader_task = asyncio.create_task(reader())
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(sid) for sid in session_ids))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await reader_task
+    await engine.dispose()
+
+    read_latencies.sort()
+    return {
+        "profile": profile,
+        "group_commit": group_commit,
+        "messages": writers * messages,
+        "seconds": elapsed,
+        "messages_per_sec": writers * messages / elapsed,
+        "read_p50_ms": statistics.median(read_latencies) * 1000 if read_latencies else 0.0,
+        "read_p99_ms": read_latencies[int(len(read_latencies) * 0.99) - 1] * 1000 if read_latencies else 0.0,
+    }
+
+
+async def run(writers: int, messages: int) -> None:
+    print(f"{'profile':<10}{'group':<8}{'msgs/s':>10}{'read p50(ms)':>15}{'read p99(ms)':>15}")
+    for profile in ("default", "wal"):
+        for group_commit in (False, True):
+            r = await run_case(profile, group_commit, writers, messages)
+            print(f"{r['profile']:<10}{str(r['group_commit']):<8}{r['messages_per_sec']:>10.0f}"
+                  f"{r['read_p50_ms']:>15.2f}{r['read_p99_ms']:>15.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite 存储配置写入吞吐基准")
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.writers, args.messages))
+
+
+if __name__ == "__main__":
+    main()
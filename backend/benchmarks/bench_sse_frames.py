@@ -0,0 +1,82 @@
+# backend/benchmarks/bench_sse_frames.py
+"""
+SSE 编码微基准：对一个 N token 的答案，比较
+- 旧路径：每个 token 一次 json.dumps + f-string 帧，内容用 += 拼接
+- 新路径：coalesce 合并后 encode_frame（orjson）编码，内容用列表累积
+输出每秒帧数、每个答案的 CPU 时间和帧数
+
+运行：python -m benchmarks.bench_sse_frames --tokens 2000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.streaming import DONE_FRAME, coalesce, encode_frame
+
+
+async def token_stream(tokens: int):
+    for i in range(tokens):
+        yield {"content": f"tok{i % 97} ", "is_final": False, "tool_calls": None}
+    yield {"content": "", "is_final": True, "tool_calls": None}
+
+
+async def legacy_answer(tokens: int) -> int:
+    frames = 0
+    full_content = ""
+    async for chunk in token_stream(tokens):
+        if chunk["is_final"]:
+            data = {"content": "", "is_final": True, "tool_calls": None}
+        else:
+            full_content += chunk["content"]
+            data = {"content": chunk["content"], "is_final": False}
+        _ = f"data: {json.dumps(data)}\n\n".encode("utf-8")
+        frames += 1
+    _ = "data: [DONE]\n\n".encode("utf-8")
+    return frames + 1
+
+
+async def lean_answer(tokens: int, window_ms: int, max_chars: int) -> int:
+    frames = 0
+    parts = []
+    async for chunk in coalesce(token_stream(tokens), window_ms=window_ms, max_chars=max_chars):
+        if chunk["is_final"]:
+            data = {"content": "", "is_final": True, "tool_calls": None}
+        else:
+            parts.append(chunk["content"])
+            data = {"content": chunk["content"], "is_final": False}
+        _ = encode_frame(data)
+        frames += 1
+    _ = "".join(parts)
+    _ = DONE_FRAME
+    return frames + 1
+
+
+async def measure(name: str, factory, repeat: int) -> None:
+    frames = 0
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        frames += await factory()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    print(f"{name:<28}{frames // repeat:>10}{frames / wall:>14.0f}{cpu / repeat * 1000:>16.3f}")
+
+
+async def run(tokens: int, repeat: int) -> None:
+    print(f"{'mode':<28}{'frames/ans':>10}{'frames/sec':>14}{'cpu ms/answer':>16}")
+    await measure("per-token json.dumps", lambda: legacy_answer(tokens), repeat)
+    await measure("per-token orjson", lambda: lean_answer(tokens, 0, 0), repeat)
+    for chars in (32, 128, 512):
+        await measure(f"coalesced {chars} chars", lambda: lean_answer(tokens, 50, chars), repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE 帧编码与合并微基准")
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# backend/benchmarks/bench_startup.py
+"""
+启动基准：每次在全新的子进程中测量
+- import_seconds：import app.main 的耗时
+- startup_seconds：lifespan 启动（建表、恢复任务等）的耗时
+- ready_seconds：从 lifespan 启动到 /ready 返回 200 的耗时（后台预热真实的模型客户端、工具和 Agent 图）
+- agent_init_seconds：Agent 构建本身的耗时
+- first_request_seconds：第一个会话列表请求的耗时
+- first_message_seconds / warm_message_seconds：换成零延迟假模型后，第一个和第二个 /message 请求的耗时
+不会访问模型服务：未配置 BAI_LIAN_API_KEY 时使用占位密钥，只构建客户端不发请求
+
+运行：python -m benchmarks.bench_startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child() -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ.setdefault("BAI_LIAN_API_KEY", "bench-placeholder-key")
+    os.environ.setdefault("BAI_LIAN_BASE_URL", "http://127.0.0.1:9/v1")
+
+    start = time.perf_counter()
+    import app.main
+    import_seconds = time.perf_counter() - start
+
+    import asyncio
+    import logging
+    import httpx
+    from app.services import agent_service
+    from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    async def run() -> dict:
+        result = {"import_seconds": import_seconds}
+        application = app.main.app
+        started = time.perf_counter()
+        async with application.router.lifespan_context(application):
+            result["startup_seconds"] = time.perf_counter() - started
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                while (await client.get("/ready")).status_code != 200:
+                    if agent_service.init_error:
+                        raise RuntimeError(agent_service.init_error)
+                    await asyncio.sleep(0.005)
+                result["ready_seconds"] = time.perf_counter() - started
+                result["agent_init_seconds"] = agent_service.init_seconds
+
+                t = time.perf_counter()
+                (await client.get("/api/chat/sessions")).raise_for_status()
+                result["first_request_seconds"] = time.perf_counter() - t
+
+                agent_service._initialize_agent(
+                    FakeResearchChatModel(think_latency=0, token_interval=0),
+                    [FakeArxivTool(latency=0)],
+                )
+                session_id = (await client.post("/api/chat/sessions", json={"title": "startup"})).json()["id"]
+                for key in ("first_message_seconds", "warm_message_seconds"):
+                    t = time.perf_counter()
+                    response = await client.post("/api/chat/message", json={"session_id": session_id, "message": "q"})
+                    response.raise_for_status()
+                    result[key] = time.perf_counter() - t
+        return result
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="应用启动与首个请求耗时基准")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    print(f"{'metric':<24}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for key, value in summary.items():
+        values = [run[key] for run in runs]
+        print(f"{key:<24}{value * 1000:>12.1f}{min(values) * 1000:>10.1f}{max(values) * 1000:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs, "median": summary}, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
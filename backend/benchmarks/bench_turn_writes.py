@@ -0,0 +1,177 @@
+# backend/benchmarks/bench_turn_writes.py
+"""
+一轮对话的写入路径基准：每轮写入一条用户消息和一条带工具调用的 assistant 消息，统计每轮的
+SQL 语句数（executemany 记一次）、提交次数与耗时
+- before：旧的写入方式，每条消息 SELECT 会话 → INSERT → COMMIT → refresh SELECT（两条消息各一遍）
+- per_message：当前的 acreate_message 逐条写入（流式接口：用户消息先写，回答结束后写 assistant 消息）
+- turn：acreate_messages 一次写入整轮（非流式接口与后台任务）
+
+运行：python -m benchmarks.bench_turn_writes --turns 200 --output turn_writes.json
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_turns.db"
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import event, select, text
+
+from app import crud, database
+from app.blobs import blob_row, insert_blobs_stmt
+from app.config import settings
+from app.database import AsyncSessionLocal, async_engine, create_tables
+from app.models import ChatMessage, ChatSession, generate_uuid, utcnow
+from app.schemas import MessageCreate, SessionCreate
+from app.search import index_params
+from app.tool_records import build_invocations
+
+# 旧版本按消息ID查 rowid 的索引语句
+LEGACY_INDEX_SQL = text(
+    "INSERT INTO messages_fts(rowid, content, tool_titles, scope) "
+    "SELECT rowid, :content, :tool_titles, :scope FROM chat_messages WHERE id = :message_id"
+)
+
+
+async def legacy_create_message(db, message_create: MessageCreate) -> ChatMessage:
+    """旧的 acreate_message：先查询会话，flush 后按ID插入索引行，提交后 refresh"""
+    result = await db.execute(select(ChatSession).where(ChatSession.id == message_create.session_id))
+    if not result.scalars().first():
+        raise ValueError("会话不存在")
+    created_at = utcnow()
+    content = message_create.content
+    blobs, content_hash = [], None
+    if 0 < settings.message_blob_min_chars <= len(content):
+        row = blob_row(content, created_at)
+        blobs.append(row)
+        content_hash = row["hash"]
+    db_message = ChatMessage(
+        id=generate_uuid(), session_id=message_create.session_id, role=message_create.role,
+        content=content[:settings.message_inline_chars] if content_hash else content,
+        content_hash=content_hash, created_at=created_at, tool_calls=message_create.tool_calls,
+    )
+    invocations, invocation_blobs = build_invocations(
+        db_message.id, db_message.session_id, message_create.tool_invocations or [], created_at=created_at
+    )
+    blobs.extend(invocation_blobs)
+    if blobs:
+        await db.execute(insert_blobs_stmt(blobs))
+    db.add(db_message)
+    db.add_all(invocations)
+    if database.FTS5_AVAILABLE:
+        await db.flush()
+        params = index_params(0, db_message.session_id, db_message.role, content, message_create.tool_invocations)
+        params.pop("rowid")
+        await db.execute(LEGACY_INDEX_SQL, {**params, "message_id": db_message.id})
+    await db.commit()
+    await db.refresh(db_message)
+    return db_message
+
+
+def turn_messages(session_id: str, turn: int, tool_calls: int, answer_chars: int) -> list:
+    invocations = [
+        {
+            "tool_call_id": f"call_{uuid.uuid4().hex[:12]}", "name": "arxiv", "args": {"query": f"q{turn}-{k}"},
+            "result": f"Published: 2024-01-01\nTitle: Paper {turn}-{k}\nSummary: " + "abstract " * 150,
+            "status": "success", "latency_ms": 300.0,
+        }
+        for k in range(tool_calls)
+    ]
+    return [
+        MessageCreate(session_id=session_id, role="user", content=f"question {turn} about graph attention"),
+        MessageCreate(
+            session_id=session_id, role="assistant", content=("answer text " * answer_chars)[:answer_chars],
+            tool_calls=json.dumps([{"name": i["name"], "args": i["args"], "id": i["tool_call_id"]} for i in invocations]),
+            tool_invocations=invocations,
+        ),
+    ]
+
+
+async def write_before(db, messages: list) -> None:
+    for message_create in messages:
+        await legacy_create_message(db, message_create)
+
+
+async def write_per_message(db, messages: list) -> None:
+    for message_create in messages:
+        await crud.acreate_message(db, message_create)
+
+
+async def write_turn(db, messages: list) -> None:
+    await crud.acreate_messages(db, messages)
+
+
+async def run_case(name: str, writer, args, counts: Counter) -> dict:
+    async with AsyncSessionLocal() as db:
+        session_id = (await crud.acreate_session(db, SessionCreate(title=name))).id
+    timings, statements, commits = [], [], []
+    for turn in range(args.turns):
+        messages = turn_messages(session_id, turn, args.tool_calls, args.answer_chars)
+        counts.clear()
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await writer(db, messages)
+        timings.append(time.perf_counter() - started)
+        statements.append(counts["statements"])
+        commits.append(counts["commits"])
+    async with AsyncSessionLocal() as db:
+        stored = len(await crud.aget_messages_by_session(db, session_id))
+    ordered = sorted(timings)
+    return {
+        "statements_per_turn": statistics.mean(statements),
+        "commits_per_turn": statistics.mean(commits),
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+        "messages": stored,
+    }
+
+
+async def run(args) -> dict:
+    counts: Counter = Counter()
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        counts["statements"] += 1
+
+    @event.listens_for(async_engine.sync_engine, "commit")
+    def _count_commit(conn):
+        counts["commits"] += 1
+
+    results = {}
+    for name, writer in (("before", write_before), ("per_message", write_per_message), ("turn", write_turn)):
+        results[name] = await run_case(name, writer, args, counts)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="一轮对话的写入：每轮的语句数、提交次数与耗时")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--tool-calls", type=int, default=2, help="assistant 消息的工具调用数")
+    parser.add_argument("--answer-chars", type=int, default=3000)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    create_tables()
+    results = asyncio.run(run(args))
+    print(f"{'path':<14}{'stmts/turn':>12}{'commits':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['statements_per_turn']:>12.1f}{r['commits_per_turn']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
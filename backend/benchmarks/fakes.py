@@ -0,0 +1,329 @@
+# backend/benchmarks/fakes.py
+"""
+压测用的假聊天模型与假 arXiv 工具
+- FakeResearchChatModel：先返回 arxiv 工具调用（可分多次发起），拿到工具结果后按固定速率逐 token 输出答案
+- FakePromptCache：模拟模型服务的前缀缓存，命中的输入 token 在 usage 中报告为 cache_read，并缩短预填充时间
+- FakeArxivTool：按可配置的延迟返回固定格式的论文摘要
+- FakeRedis：进程内的异步 Redis 客户端替身，只实现 RedisStateBackend 用到的命令
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForLLMRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+
+class FakePromptCache:
+    """
+    模拟 OpenAI 兼容服务的前缀缓存：按消息逐条累计前缀哈希，
+    本次请求与之前某次请求相同的最长（按消息计）前缀视为命中（哈希是累计的，命中第 k 条即前 k 条都相同），
+    未命中的部分按 prefill_seconds_per_1k 计预填充时间
+    """
+
+    def __init__(self, prefill_seconds_per_1k: float = 0.1):
+        self.prefill_seconds_per_1k = prefill_seconds_per_1k
+        self._prefixes: set = set()
+
+    @staticmethod
+    def _serialize(message: BaseMessage) -> str:
+        tool_calls = getattr(message, "tool_calls", None) or []
+        return json.dumps([
+            message.type, str(message.content), getattr(message, "tool_call_id", None),
+            [[c["id"], c["name"], json.dumps(c["args"], ensure_ascii=False)] for c in tool_calls],
+        ], ensure_ascii=False)
+
+    def lookup(self, messages: List[BaseMessage]) -> tuple:
+        """返回 (命中的 token 数, 预填充耗时)，并登记本次请求的全部前缀"""
+        digest = hashlib.sha256()
+        total = cached = 0
+        for message in messages:
+            text = self._serialize(message)
+            digest.update(text.encode("utf-8"))
+            total += len(text) // 4
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                cached = total
+            self._prefixes.add(key)
+        return cached, (total - cached) / 1000 * self.prefill_seconds_per_1k
+
+
+class FakeResearchChatModel(BaseChatModel):
+    """确定性的假聊天模型：先发起工具调用，再流式输出答案"""
+
+    think_latency: float = 0.2      # 每次模型调用在输出第一个 token 前的等待时间（秒）
+    token_interval: float = 0.005   # 相邻 token 的间隔（秒）
+    answer_tokens: int = 50         # 答案的 token 数量
+    tool_calls_per_turn: int = 1    # 每次发起的 arxiv 工具调用数量
+    tool_rounds: int = 1            # 每轮分几次（几条 AIMessage）发起工具调用
+    tools_bound: bool = False       # 只有绑定了工具（作为 Agent 使用）时才发起工具调用
+    tool_queries: Dict[str, str] = {}   # 问题 => 模型改写后的查询词（不在其中的问题直接用原文查询）
+    prompt_cache: Any = None        # FakePromptCache：模拟服务端前缀缓存（为空时不模拟）
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-research-chat-model"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeResearchChatModel":
+        return self.model_copy(update={"tools_bound": True})
+
+    def _tool_round(self, messages: List[BaseMessage]) -> int:
+        """当前问题之后已经发起过几次工具调用"""
+        rounds = 0
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                break
+            if isinstance(msg, AIMessage) and msg.tool_calls:
+                rounds += 1
+        return rounds
+
+    def _needs_tool_call(self, messages: List[BaseMessage]) -> bool:
+        # 当前问题之后发起的工具调用次数还不够时，继续发起工具调用
+        if not self.tools_bound or self.tool_calls_per_turn <= 0:
+            return False
+        return self._tool_round(messages) < self.tool_rounds
+
+    def _prefill(self, messages: List[BaseMessage]) -> tuple:
+        """返回 (命中前缀缓存的 token 数, 输出第一个 token 前的等待时间)"""
+        if self.prompt_cache is None:
+            return 0, self.think_latency
+        cached, prefill = self.prompt_cache.lookup(messages)
+        return cached, self.think_latency + prefill
+
+    def _question(self, messages: List[BaseMessage]) -> str:
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                return str(msg.content)
+        return ""
+
+    def _tool_call_message(self, messages: List[BaseMessage]) -> AIMessage:
+        question = self._question(messages)
+        query = self.tool_queries.get(question, question)
+        step = self._tool_round(messages)
+        if step:
+            query = f"{query} step{step}"
+        tool_calls = [
+            {
+                "name": "arxiv",
+                "args": {"query": f"{query} {i}" if i else query},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "tool_call",
+            }
+            for i in range(self.tool_calls_per_turn)
+        ]
+        return AIMessage(content="", tool_calls=tool_calls)
+
+    def _tool_call_chunk(self, messages: List[BaseMessage], cached: int) -> ChatGenerationChunk:
+        message = self._tool_call_message(messages)
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(message.tool_calls)
+            ],
+            usage_metadata=self._usage(messages, 0, cached),
+        ))
+
+    def _answer_tokens(self) -> List[str]:
+        return [f"token{i} " for i in range(self.answer_tokens)]
+
+    def _usage(self, messages: List[BaseMessage], completion_tokens: int, cached: int = 0) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if self.prompt_cache is not None:
+            usage["input_token_details"] = {"cache_read": min(cached, prompt_tokens)}
+        return usage
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        cached, latency = self._prefill(messages)
+        time.sleep(latency)
+        if self._needs_tool_call(messages):
+            message = self._tool_call_message(messages)
+            message.usage_metadata = self._usage(messages, 0, cached)
+        else:
+            tokens = self._answer_tokens()
+            time.sleep(self.token_interval * len(tokens))
+            message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens), cached))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        cached, latency = self._prefill(messages)
+        await asyncio.sleep(latency)
+        if self._needs_tool_call(messages):
+            message = self._tool_call_message(messages)
+            message.usage_metadata = self._usage(messages, 0, cached)
+        else:
+            tokens = self._answer_tokens()
+            await asyncio.sleep(self.token_interval * len(tokens))
+            message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens), cached))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        cached, latency = self._prefill(messages)
+        time.sleep(latency)
+        if self._needs_tool_call(messages):
+            yield self._tool_call_chunk(messages, cached)
+            return
+        tokens = self._answer_tokens()
+        for token in tokens:
+            time.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens), cached)))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        cached, latency = self._prefill(messages)
+        await asyncio.sleep(latency)
+        if self._needs_tool_call(messages):
+            yield self._tool_call_chunk(messages, cached)
+            return
+        tokens = self._answer_tokens()
+        for token in tokens:
+            await asyncio.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens), cached)))
+
+
+class FakeArxivTool(BaseTool):
+    """假 arXiv 工具：按固定延迟返回与真实 arxiv 工具相同格式的结果"""
+
+    name: str = "arxiv"
+    description: str = "A wrapper around Arxiv.org. Input should be a search query."
+    latency: float = 0.3
+    calls: int = 0
+
+    def _result(self, query: str) -> str:
+        self.calls += 1
+        return "\n\n".join(
+            f"Published: 2024-01-0{i + 1}\n"
+            f"Title: {query} paper {i + 1}\n"
+            f"Authors: Alice Zhang, Bob Li\n"
+            f"Summary: A synthetic abstract about {query} number {i + 1}."
+            for i in range(3)
+        )
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        time.sleep(self.latency)
+        return self._result(query)
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        await asyncio.sleep(self.latency)
+        return self._result(query)
+
+
+class FakeRedis:
+    """进程内的异步 Redis 替身：字符串、列表与毫秒级过期"""
+
+    def __init__(self):
+        self._data: dict = {}
+        self._expires: dict = {}
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if not self._alive(key):
+            return None
+        return self._data[key].encode("utf-8")
+
+    async def set(self, key: str, value: str, nx: bool = False, px: Optional[int] = None) -> bool:
+        if nx and self._alive(key):
+            return False
+        self._data[key] = value
+        if px:
+            self._expires[key] = time.monotonic() + px / 1000
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    async def delete(self, key: str) -> int:
+        existed = self._alive(key)
+        self._data.pop(key, None)
+        self._expires.pop(key, None)
+        return int(existed)
+
+    async def exists(self, key: str) -> int:
+        return int(self._alive(key))
+
+    async def pexpire(self, key: str, ms: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + ms / 1000
+        return True
+
+    async def rpush(self, key: str, *values: str) -> int:
+        self._alive(key)
+        items = self._data.setdefault(key, [])
+        items.extend(values)
+        return len(items)
+
+    async def eval(self, script: str, numkeys: int, *args: Any) -> int:
+        """只支持“比较持有者后删除 / 续约”两种脚本；单线程事件循环中天然原子"""
+        key, owner = args[0], str(args[numkeys])
+        value = await self.get(key)
+        if value is None or value.decode("utf-8") != owner:
+            return 0
+        if "'pexpire'" in script:
+            return int(await self.pexpire(key, int(args[numkeys + 1])))
+        if "'del'" in script:
+            return await self.delete(key)
+        raise NotImplementedError(script)
+
+    async def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        if not self._alive(key):
+            return []
+        items = self._data[key]
+        stop = len(items) if end == -1 else end + 1
+        return [item.encode("utf-8") for item in items[start:stop]]
+
+    async def aclose(self) -> None:
+        self._data.clear()
+        self._expires.clear()
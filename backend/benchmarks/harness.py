@@ -0,0 +1,68 @@
+# backend/benchmarks/harness.py
+"""
+压测公共环境：临时数据库、假模型/假工具注入，以及在后台线程中启动 uvicorn
+导入本模块会把 DATABASE_URL 指向临时目录，必须先于 app 导入
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# 必须在导入 app 之前设置，使压测使用临时数据库而不是开发数据库
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import uvicorn
+
+from app.main import app
+from app.database import create_tables
+from app.services import agent_service
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+
+def setup_app(
+    think_latency: float,
+    tool_latency: float,
+    token_interval: float = 0.005,
+    answer_tokens: int = 50,
+    tool_calls_per_turn: int = 1,
+) -> None:
+    """创建临时数据库表，并用假模型/假工具替换 Agent"""
+    create_tables()
+    agent_service._initialize_agent(
+        FakeResearchChatModel(
+            think_latency=think_latency,
+            token_interval=token_interval,
+            answer_tokens=answer_tokens,
+            tool_calls_per_turn=tool_calls_per_turn,
+        ),
+        [FakeArxivTool(latency=tool_latency)],
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(port: int = 0) -> Iterator[str]:
+    """在后台线程中启动 uvicorn，返回服务的 base_url；退出时关闭服务"""
+    port = port or _free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("uvicorn 启动失败")
+        time.sleep(0.02)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,300 @@
+# backend/benchmarks/loadtest.py
+"""
+可复现的混合流量压测：用 uvicorn 启动 app.main:app，Agent 换成确定性的假模型和假 arXiv 工具，
+多个并发 worker 按权重发送 /api/chat/message、/api/chat/stream 和会话列表请求，
+统计吞吐量、p50/p95/p99 延迟和流式首 token 时间（TTFT），结果保存为 JSON
+
+运行：python -m benchmarks.loadtest --concurrency 16 --duration 20 --output results.json
+对比：python -m benchmarks.loadtest --baseline results.json --tolerance 0.2
+      任一接口的 p95 比基线慢超过 tolerance 时以非零状态退出
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.harness import app, serve, setup_app
+from app.config import settings
+
+QUESTIONS = [
+    "diffusion models for video generation",
+    "retrieval augmented generation evaluation",
+    "graph neural networks for molecules",
+    "efficient attention for long context",
+    "reinforcement learning from human feedback",
+    "自监督学习在语音识别中的应用",
+    "large language model reasoning benchmarks",
+    "federated learning privacy attacks",
+]
+
+OPERATIONS = ("message", "stream", "sessions")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩法百分位数，q 取 0~100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 "stream=5,message=3,sessions=2" 形式的流量权重"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"未知的请求类型: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def do_message(client: httpx.AsyncClient, session_id: str, question: str) -> Tuple[float, None]:
+    start = time.perf_counter()
+    response = await client.post("/api/chat/message", json={"session_id": session_id, "message": question})
+    response.raise_for_status()
+    return time.perf_counter() - start, None
+
+
+async def do_stream(client: httpx.AsyncClient, session_id: str, question: str) -> Tuple[float, Optional[float]]:
+    start = time.perf_counter()
+    ttft = None
+    async with client.stream(
+        "POST", "/api/chat/stream",
+        json={"session_id": session_id, "message": question, "stream": True},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if ttft is None and line.startswith("data: {"):
+                frame = json.loads(line[6:])
+                if frame.get("content") and not frame.get("is_final"):
+                    ttft = time.perf_counter() - start
+    return time.perf_counter() - start, ttft
+
+
+async def do_sessions(client: httpx.AsyncClient, session_id: str, question: str) -> Tuple[float, None]:
+    start = time.perf_counter()
+    response = await client.get("/api/chat/sessions", params={"limit": 20})
+    response.raise_for_status()
+    return time.perf_counter() - start, None
+
+
+HANDLERS = {"message": do_message, "stream": do_stream, "sessions": do_sessions}
+
+
+async def worker(
+    worker_id: int,
+    client: httpx.AsyncClient,
+    session_ids: List[str],
+    mix: Dict[str, float],
+    deadline: float,
+    max_requests: Optional[int],
+    counter: List[int],
+    seed: int,
+    samples: Dict[str, list],
+) -> None:
+    rng = random.Random(seed * 1000 + worker_id)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        if max_requests is not None:
+            if counter[0] >= max_requests:
+                return
+            counter[0] += 1
+        op = rng.choices(names, weights)[0]
+        session_id = rng.choice(session_ids)
+        question = f"{rng.choice(QUESTIONS)} #{rng.randrange(10_000)}"
+        try:
+            latency, ttft = await HANDLERS[op](client, session_id, question)
+            samples[op].append((latency, ttft, None))
+        except Exception as e:
+            samples[op].append((None, None, type(e).__name__))
+
+
+def summarize(samples: Dict[str, list], elapsed: float) -> Dict[str, dict]:
+    """按请求类型汇总吞吐量与延迟分布（秒）"""
+    report = {}
+    all_latencies = []
+    total_errors = 0
+    for op, rows in sorted(samples.items()):
+        latencies = [r[0] for r in rows if r[0] is not None]
+        ttfts = [r[1] for r in rows if r[1] is not None]
+        errors = defaultdict(int)
+        for r in rows:
+            if r[2]:
+                errors[r[2]] += 1
+        all_latencies.extend(latencies)
+        total_errors += sum(errors.values())
+        entry = {
+            "requests": len(rows),
+            "errors": dict(errors),
+            "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+            "latency": _distribution(latencies),
+        }
+        if op == "stream":
+            entry["ttft"] = _distribution(ttfts)
+        report[op] = entry
+    report["total"] = {
+        "requests": len(all_latencies) + total_errors,
+        "errors": total_errors,
+        "throughput_rps": len(all_latencies) / elapsed if elapsed else 0.0,
+        "latency": _distribution(all_latencies),
+    }
+    return report
+
+
+def _distribution(values: List[float]) -> dict:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values) if values else None,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args: argparse.Namespace, base_url: Optional[str]) -> Dict[str, dict]:
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency * 2))
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+    async with client:
+        session_ids = []
+        for i in range(args.sessions):
+            response = await client.post("/api/chat/sessions", json={"title": f"loadtest-{i}"})
+            response.raise_for_status()
+            session_ids.append(response.json()["id"])
+
+        samples: Dict[str, list] = defaultdict(list)
+        counter = [0]
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            worker(i, client, session_ids, args.mix, deadline, args.requests, counter, args.seed, samples)
+            for i in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return {"elapsed_seconds": elapsed, "endpoints": summarize(samples, elapsed)}
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    def ms(value):
+        return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"{'endpoint':<10}{'reqs':>7}{'errs':>6}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'ttft p50':>10}{'ttft p95':>10}")
+    for op, entry in report["endpoints"].items():
+        errors = entry["errors"] if isinstance(entry["errors"], int) else sum(entry["errors"].values())
+        ttft = entry.get("ttft", {})
+        lat = entry["latency"]
+        print(f"{op:<10}{entry['requests']:>7}{errors:>6}{entry['throughput_rps']:>8.2f}"
+              f"{ms(lat['p50'])} {ms(lat['p95'])} {ms(lat['p99'])} {ms(ttft.get('p50'))} {ms(ttft.get('p95'))}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """返回 p95 延迟或首 token 时间比基线退化超过 tolerance 的条目"""
+    regressions = []
+    for op, entry in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(op)
+        if not base:
+            continue
+        for metric in ("latency", "ttft"):
+            current = entry.get(metric, {}).get("p95")
+            previous = base.get(metric, {}).get("p95")
+            if current and previous and current > previous * (1 + tolerance):
+                regressions.append(f"{op} {metric} p95: {previous * 1000:.1f}ms -> {current * 1000:.1f}ms")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="假模型 + 假 arXiv 的混合流量压测")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发 worker 数量")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="总请求数上限，达到后提前结束")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("stream=5,message=3,sessions=2"),
+                        help="请求类型权重，例如 stream=5,message=3,sessions=2")
+    parser.add_argument("--sessions", type=int, default=16, help="预先创建的会话数量")
+    parser.add_argument("--think-latency", type=float, default=0.2, help="假模型首 token 前的延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="假模型输出速率")
+    parser.add_argument("--answer-tokens", type=int, default=50, help="每个答案的 token 数")
+    parser.add_argument("--tool-calls", type=int, default=1, help="每轮发起的 arxiv 调用数")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="假 arXiv 工具延迟（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同种子产生相同的请求序列")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒）")
+    parser.add_argument("--in-process", action="store_true", 
+                        help="通过 ASGI transport 直连，不启动 uvicorn（响应会被整体缓冲，TTFT 不可信）")
+    parser.add_argument("--with-caches", action="store_true", help="保留 arXiv 工具缓存（默认关闭以保证可复现）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--baseline", help="用于对比的基线结果 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的 p95 退化比例")
+    parser.add_argument("--verbose", action="store_true", help="输出应用的 INFO 日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        for name in ("app", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    if not args.with_caches:
+        settings.arxiv_cache_enabled = False
+        settings.answer_cache_enabled = False
+    setup_app(
+        think_latency=args.think_latency,
+        tool_latency=args.tool_latency,
+        token_interval=1 / args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        tool_calls_per_turn=args.tool_calls,
+    )
+
+    if args.in_process:
+        result = asyncio.run(run(args, None))
+    else:
+        with serve() as base_url:
+            result = asyncio.run(run(args, base_url))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "verbose")},
+        **result,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
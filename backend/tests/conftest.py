@@ -0,0 +1,42 @@
+# backend/tests/conftest.py
+"""
+测试公共环境：与压测共用 benchmarks.harness（导入时把 DATABASE_URL 指向临时目录，必须先于 app 导入）
+Agent 使用 benchmarks.fakes 中的假模型与假工具，不访问模型服务和 arXiv
+异步逻辑在同步测试中用 asyncio.run 执行
+"""
+from typing import Iterator, List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import app
+from app.config import settings
+from app.database import create_tables
+from app.services import agent_service
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+create_tables()
+
+
+@pytest.fixture
+def use_agent(monkeypatch):
+    """用给定的模型与工具替换全局 Agent；默认是不等待的假模型与假 arXiv 工具，关闭语义答案缓存"""
+    monkeypatch.setattr(settings, "answer_cache_enabled", False)
+    monkeypatch.setattr(agent_service.answer_cache, "enabled", False)
+
+    def install(model: Optional[FakeResearchChatModel] = None, tools: Optional[List] = None):
+        model = model or FakeResearchChatModel(think_latency=0.0, token_interval=0.0, answer_tokens=5)
+        tools = tools if tools is not None else [FakeArxivTool(latency=0.0)]
+        agent_service._initialize_agent(model, tools)
+        return model, tools
+
+    return install
+
+
+@pytest.fixture
+def client(use_agent) -> Iterator[TestClient]:
+    """注入假 Agent 后启动应用（启动时的预热不会再构建真实的 Agent）"""
+    use_agent()
+    with TestClient(app) as test_client:
+        yield test_client
+
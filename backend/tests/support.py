@@ -0,0 +1,31 @@
+# backend/tests/support.py
+"""测试共用的辅助函数"""
+import json
+import tempfile
+from typing import List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import FTS_DDL
+from app.models import Base
+from app.search import FTS_DDL as MESSAGES_FTS_DDL
+
+
+def sse_events(response) -> List[dict]:
+    """读取 SSE 响应中的全部数据帧（不含结束标记）"""
+    return [
+        json.loads(line[len("data: "):])
+        for line in response.iter_lines()
+        if line.startswith("data: ") and line != "data: [DONE]"
+    ]
+
+
+def temp_session_factory():
+    """指向一个新的空数据库（已建表和全文索引）的同步会话工厂，用于需要隔离数据的测试"""
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/test.db")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for ddl in FTS_DDL + MESSAGES_FTS_DDL:
+            conn.execute(text(ddl))
+    return sessionmaker(bind=engine)
@@ -0,0 +1,118 @@
+# backend/tests/test_answer_cache.py
+"""语义答案缓存：相似度阈值、过期、计数，以及请求级 bypass_cache 与会话级 answer_cache_bypass"""
+import threading
+
+import pytest
+
+from app.answer_cache import HashingEmbedder, SemanticAnswerCache
+from app.services import agent_service
+from tests.support import temp_session_factory
+
+QUESTION = "graph neural networks for molecular property prediction"
+PARAPHRASE = "Graph neural networks for molecular property prediction?"
+UNRELATED = "speech recognition with self-supervised learning"
+ANSWER = {"content": "cached answer", "tool_calls": None, "tool_results": None}
+
+
+def _cache(**kwargs) -> SemanticAnswerCache:
+    options = {"enabled": True, "threshold": 0.9, "ttl_seconds": 3600, "max_entries": 100}
+    options.update(kwargs)
+    return SemanticAnswerCache(session_factory=temp_session_factory(), **options)
+
+
+def test_similar_question_hits_and_unrelated_misses():
+    cache = _cache()
+    cache.store(QUESTION, ANSWER)
+
+    assert cache.lookup(PARAPHRASE)["content"] == "cached answer"
+    assert cache.lookup(UNRELATED) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "stores": 1}
+
+
+def test_threshold_is_inclusive_lower_bound():
+    embedder = HashingEmbedder()
+    question = "efficient attention for long context transformers"
+    partial = "efficient attention for long documents"
+    score = embedder.similarity(embedder.embed(question), embedder.embed(partial))
+    assert 0 < score < 1
+
+    above = _cache(threshold=score)
+    above.store(question, ANSWER)
+    assert above.lookup(partial) is not None
+
+    below = _cache(threshold=score + 0.01)
+    below.store(question, ANSWER)
+    assert below.lookup(partial) is None
+
+
+def test_entries_persist_and_expire():
+    factory = temp_session_factory()
+    SemanticAnswerCache(True, 0.9, 3600, 100, session_factory=factory).store(QUESTION, ANSWER)
+
+    assert SemanticAnswerCache(True, 0.9, 3600, 100, session_factory=factory).lookup(QUESTION) is not None
+    assert SemanticAnswerCache(True, 0.9, 0, 100, session_factory=factory).lookup(QUESTION) is None
+
+
+def test_stats_are_consistent_under_concurrent_lookups():
+    cache = _cache()
+    cache.store(QUESTION, ANSWER)
+    threads = [
+        threading.Thread(target=lambda q=q: [cache.lookup(q) for _ in range(50)])
+        for q in (QUESTION, UNRELATED) * 4
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats() == {"hits": 200, "misses": 200, "stores": 1}
+
+
+@pytest.fixture
+def answer_cache(client, monkeypatch):
+    """启用语义答案缓存（独立的空数据库）的应用"""
+    cache = _cache()
+    monkeypatch.setattr(agent_service, "answer_cache", cache)
+    return cache
+
+
+def _ask(client, message: str, **options) -> dict:
+    session_id = client.post("/api/chat/sessions", json={"title": "cache"}).json()["id"]
+    if options.pop("session_bypass", False):
+        client.patch(f"/api/chat/sessions/{session_id}", json={"answer_cache_bypass": True})
+    response = client.post("/api/chat/message", json={"message": message, "session_id": session_id, **options})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_new_session_reuses_cached_answer(client, answer_cache):
+    assert not _ask(client, QUESTION)["from_cache"]
+    cached = _ask(client, PARAPHRASE)
+
+    assert cached["from_cache"]
+    assert answer_cache.stats()["hits"] == 1
+
+
+def test_request_bypass_skips_cache(client, answer_cache):
+    _ask(client, QUESTION)
+
+    assert not _ask(client, QUESTION, bypass_cache=True)["from_cache"]
+    assert answer_cache.stats()["hits"] == 0
+
+
+def test_session_bypass_skips_cache(client, answer_cache):
+    _ask(client, QUESTION)
+
+    assert not _ask(client, QUESTION, session_bypass=True)["from_cache"]
+    assert answer_cache.stats()["hits"] == 0
+
+
+def test_lookup_counts_are_exported_as_counters(client, answer_cache):
+    _ask(client, QUESTION)
+    _ask(client, PARAPHRASE)
+
+    metrics = client.get("/metrics").text
+    assert "# TYPE answer_cache_lookups_total counter" in metrics
+    assert 'answer_cache_lookups_total{result="hits"} 1' in metrics
+    assert 'answer_cache_lookups_total{result="stores"} 1' in metrics
+    assert "# TYPE arxiv_cache_lookups_total counter" in metrics
@@ -0,0 +1,119 @@
+# backend/tests/test_arxiv_cache.py
+"""CachedArxivTool：内存 LRU、SQLite、共享缓存三级缓存，进行中的相同查询合并，过期后重新查询"""
+import asyncio
+import time
+import uuid
+
+from app import tools as tools_module
+from app.state import RedisStateBackend
+from app.tools import CachedArxivTool
+from benchmarks.fakes import FakeArxivTool, FakeRedis
+from tests.support import temp_session_factory
+
+
+def _query() -> str:
+    # 各测试共用一个临时数据库，查询词互不相同
+    return f"graph neural networks {uuid.uuid4().hex[:8]}"
+
+
+def test_repeated_query_reaches_tool_once():
+    inner = FakeArxivTool(latency=0.0)
+    tool = CachedArxivTool.wrap(inner)
+    query = _query()
+
+    first = tool.invoke(query)
+    assert tool.invoke(query) == first
+    assert asyncio.run(tool.ainvoke(query)) == first
+
+    assert inner.calls == 1
+    stats = tool.stats()
+    assert stats["misses"] == 1 and stats["memory_hits"] == 2
+
+
+def test_sqlite_tier_survives_a_new_instance():
+    query = _query()
+    CachedArxivTool.wrap(FakeArxivTool(latency=0.0)).invoke(query)
+
+    inner = FakeArxivTool(latency=0.0)
+    tool = CachedArxivTool.wrap(inner)
+    tool.invoke(query)
+    asyncio.run(tool.ainvoke(query))
+
+    assert inner.calls == 0
+    assert tool.stats()["db_hits"] == 1 and tool.stats()["memory_hits"] == 1
+
+
+def test_lru_evicts_oldest_entry_to_sqlite():
+    inner = FakeArxivTool(latency=0.0)
+    tool = CachedArxivTool.wrap(inner, max_entries=2)
+    queries = [_query() for _ in range(3)]
+    for query in queries:
+        tool.invoke(query)
+
+    assert tool.stats()["memory_entries"] == 2
+    tool.invoke(queries[0])
+    assert inner.calls == 3
+    assert tool.stats()["db_hits"] == 1
+
+
+def test_concurrent_identical_queries_are_coalesced():
+    inner = FakeArxivTool(latency=0.2)
+    tool = CachedArxivTool.wrap(inner)
+    query = _query()
+
+    async def run():
+        return await asyncio.gather(*(tool.ainvoke(query) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert len(set(results)) == 1
+    assert inner.calls == 1
+    assert tool.stats()["coalesced"] == 4
+
+
+def test_cancelled_caller_does_not_cancel_shared_lookup():
+    inner = FakeArxivTool(latency=0.2)
+    tool = CachedArxivTool.wrap(inner)
+    query = _query()
+
+    async def run():
+        impatient = asyncio.ensure_future(tool.ainvoke(query))
+        patient = asyncio.ensure_future(tool.ainvoke(query))
+        await asyncio.sleep(0.05)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(run())
+    assert inner.calls == 1
+
+
+def test_shared_tier_serves_other_workers(monkeypatch):
+    monkeypatch.setattr(tools_module, "state_backend", RedisStateBackend(FakeRedis()))
+    query = _query()
+    asyncio.run(CachedArxivTool.wrap(FakeArxivTool(latency=0.0)).ainvoke(query))
+
+    # 另一台机器上的 worker：本地 SQLite 中没有该条目，只能从共享缓存读到
+    inner = FakeArxivTool(latency=0.0)
+    other = CachedArxivTool.wrap(inner, session_factory=temp_session_factory())
+    asyncio.run(other.ainvoke(query))
+
+    assert inner.calls == 0
+    assert other.stats()["shared_hits"] == 1
+
+
+def test_expired_entries_are_fetched_again():
+    inner = FakeArxivTool(latency=0.0)
+    tool = CachedArxivTool.wrap(inner, ttl_seconds=1)
+    query = _query()
+
+    tool.invoke(query)
+    tool.invoke(query)
+    assert inner.calls == 1
+    time.sleep(1.1)
+    tool.invoke(query)
+    asyncio.run(tool.ainvoke(query))
+
+    # 内存与 SQLite 中的条目都已过期，各重新查询一次后再次命中内存
+    assert inner.calls == 2
+    assert tool.stats()["misses"] == 2
+
@@ -0,0 +1,49 @@
+# backend/tests/test_batch.py
+"""批量问答：成功与失败的问题都写入各自的会话，与 NDJSON 结果一致"""
+import json
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import FakeResearchChatModel
+
+
+class SelectiveBrokenChatModel(FakeResearchChatModel):
+    """问题中含有 "boom" 时调用失败的模型"""
+
+    def _check(self, messages):
+        if any(isinstance(m, HumanMessage) and "boom" in m.content for m in messages):
+            raise RuntimeError("model unavailable")
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check(messages)
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check(messages)
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+def test_batch_persists_failed_questions(client, use_agent):
+    use_agent(SelectiveBrokenChatModel(think_latency=0, token_interval=0, answer_tokens=5))
+    questions = ["graph neural networks", "boom question", "diffusion models"]
+
+    response = client.post("/api/chat/batch", json={"questions": questions, "concurrency": 2})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {r["index"]: r for r in lines if r["type"] == "result"}
+    summary = lines[-1]
+
+    assert summary["type"] == "summary"
+    assert (summary["succeeded"], summary["failed"]) == (2, 1)
+    assert [results[i]["status"] for i in range(3)] == ["success", "error", "success"]
+    for index, result in results.items():
+        assert result["session_id"] and result["message_id"], result
+        messages = client.get(f"/api/chat/sessions/{result['session_id']}/messages").json()
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[0]["content"] == questions[index]
+        assert messages[1]["id"] == result["message_id"]
+        if result["status"] == "success":
+            assert messages[1]["content"] == result["content"]
+        else:
+            assert "model unavailable" in result["error"]
+            assert messages[1]["content"] == f"错误: {result['error']}"
@@ -0,0 +1,53 @@
+# backend/tests/test_concurrent_stream.py
+"""
+并发的流式请求应并行生成：N 个请求（不超过全局并发上限）的总耗时接近单个请求；
+同步 Agent 的流式调用在消费方提前结束时不等待整轮跑完
+"""
+import asyncio
+import time
+
+from app.services import AcademicResearchAgentService
+from benchmarks.bench_concurrent_stream import expected_seconds, run
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+
+def test_concurrent_streams_finish_in_about_one_request_time(use_agent):
+    # 每轮约 0.2s 模型等待 + 0.2s 工具 + 0.2s 答案；串行化时 4 个请求约需 2.4s
+    use_agent(
+        FakeResearchChatModel(think_latency=0.1, token_interval=0.01, answer_tokens=20),
+        [FakeArxivTool(latency=0.2)],
+    )
+    single, total = asyncio.run(run(4))
+
+    assert total < expected_seconds(single, 4) * 1.5, (single, total)
+
+
+class SyncOnlyAgent:
+    """只有同步 stream 的 Agent：每 0.05s 产出一项，共 100 项"""
+
+    def __init__(self):
+        self.produced = 0
+
+    def stream(self, input_data, stream_mode="messages"):
+        for i in range(100):
+            time.sleep(0.05)
+            self.produced += 1
+            yield i
+
+
+def test_early_close_does_not_wait_for_sync_stream():
+    service = AcademicResearchAgentService(FakeResearchChatModel(), [FakeArxivTool(latency=0)])
+    service.agent = SyncOnlyAgent()
+
+    async def run_early_close():
+        stream = service._astream({"messages": []})
+        assert await stream.__anext__() == 0
+        start = time.perf_counter()
+        await stream.aclose()
+        closed_in = time.perf_counter() - start
+        # 线程在下一项之前停止
+        await asyncio.sleep(0.2)
+        return closed_in
+
+    assert asyncio.run(run_early_close()) < 0.5
+    assert service.agent.produced < 10
@@ -0,0 +1,48 @@
+# backend/tests/test_data_migrations.py
+"""数据迁移按 PRAGMA user_version 只执行一次：旧格式时间戳的补齐不会在每次启动时整表更新"""
+from sqlalchemy import text
+
+from app import database
+
+LEGACY = "2024-01-01 10:00:00"
+
+
+def _insert_legacy_session(session_id: str) -> None:
+    with database.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO chat_sessions (id, title, created_at, updated_at, message_count) "
+            "VALUES (:id, 'legacy', :ts, :ts, 0)"
+        ), {"id": session_id, "ts": LEGACY})
+
+
+def _created_at(session_id: str) -> str:
+    with database.engine.connect() as conn:
+        return conn.execute(
+            text("SELECT created_at FROM chat_sessions WHERE id = :id"), {"id": session_id}
+        ).scalar()
+
+
+def _user_version() -> int:
+    with database.engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def test_timestamp_normalization_runs_once():
+    latest = database.DATA_MIGRATIONS[-1][0]
+    database.create_tables()
+    assert _user_version() == latest
+
+    # 已迁移的库再次启动：不再执行整表更新
+    _insert_legacy_session("legacy-after-migration")
+    database.create_tables()
+    assert _created_at("legacy-after-migration") == LEGACY
+
+    # 版本号落后时执行一次并更新版本号
+    with database.engine.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {latest - 1}"))
+    database.create_tables()
+    assert _created_at("legacy-after-migration") == LEGACY + ".000000"
+    assert _user_version() == latest
+
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM chat_sessions WHERE id = 'legacy-after-migration'"))
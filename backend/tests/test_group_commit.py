@@ -0,0 +1,51 @@
+# backend/tests/test_group_commit.py
+"""组提交：同一批次中某个调用方已取消时，其余调用方的消息照常写入"""
+import asyncio
+
+from app import crud
+from app.database import AsyncSessionLocal
+from app.schemas import MessageCreate, SessionCreate
+
+
+def _turn(session_id: str) -> list:
+    return [
+        MessageCreate(session_id=session_id, role="user", content="question"),
+        MessageCreate(session_id=session_id, role="assistant", content="answer"),
+    ]
+
+
+def test_cancelled_caller_does_not_fail_the_batch():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            sessions = [(await crud.acreate_session(db, SessionCreate(title="group"))).id for _ in range(2)]
+        committer = crud.MessageGroupCommitter(AsyncSessionLocal, window_ms=50, max_batch=16)
+
+        # 会话不存在的调用方在提交窗口内取消
+        cancelled = asyncio.create_task(committer.submit(_turn("missing-session")))
+        writers = [asyncio.create_task(committer.submit(_turn(session_id))) for session_id in sessions]
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+
+        results = await asyncio.gather(*writers)
+        assert [[m.role for m in messages] for messages in results] == [["user", "assistant"]] * 2
+        async with AsyncSessionLocal() as db:
+            for session_id in sessions:
+                assert len(await crud.aget_messages_by_session(db, session_id)) == 2
+
+    asyncio.run(run())
+
+
+def test_missing_session_fails_only_its_caller():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            session_id = (await crud.acreate_session(db, SessionCreate(title="group"))).id
+        committer = crud.MessageGroupCommitter(AsyncSessionLocal, window_ms=20, max_batch=16)
+
+        missing, written = await asyncio.gather(
+            committer.submit(_turn("missing-session")), committer.submit(_turn(session_id)),
+            return_exceptions=True,
+        )
+        assert isinstance(missing, ValueError)
+        assert len(written) == 2
+
+    asyncio.run(run())
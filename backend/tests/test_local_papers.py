@@ -0,0 +1,51 @@
+# backend/tests/test_local_papers.py
+"""本地论文库：arXiv 联网结果自动入库，local_papers 工具与 /api/papers/search 能检索到"""
+import uuid
+
+from app.config import settings
+from app.models import Paper
+from app.papers import LocalPapersTool, index_arxiv_output, paper_id
+from app.services import research_tools
+from benchmarks.fakes import FakeArxivTool
+from tests.support import temp_session_factory
+
+
+def test_agent_turn_indexes_arxiv_results(client, use_agent, monkeypatch):
+    monkeypatch.setattr(settings, "local_papers_enabled", True)
+    monkeypatch.setattr(settings, "arxiv_cache_enabled", True)
+    inner = FakeArxivTool(latency=0.0)
+    tools = research_tools([inner])
+    assert [tool.name for tool in tools] == ["local_papers", "arxiv"]
+    use_agent(tools=tools)
+
+    # 假模型直接用问题原文作为 arxiv 查询，结果标题为 "<查询> paper N"
+    topic = f"quantum error correction {uuid.uuid4().hex[:8]}"
+    session_id = client.post("/api/chat/sessions", json={"title": "papers"}).json()["id"]
+    response = client.post("/api/chat/message", json={"message": topic, "session_id": session_id})
+    assert response.status_code == 200, response.text
+    assert inner.calls == 1
+
+    local = tools[0].invoke(topic)
+    assert f"Title: {topic} paper 1" in local
+    assert "Authors: Alice Zhang, Bob Li" in local
+
+    hits = client.get("/api/papers/search", params={"q": topic}).json()
+    assert {hit["title"] for hit in hits} >= {f"{topic} paper {i}" for i in (1, 2, 3)}
+
+
+def test_reindexing_keeps_one_row_and_longer_abstract():
+    factory = temp_session_factory()
+    output = FakeArxivTool(latency=0.0).invoke("sparse autoencoders")
+    assert index_arxiv_output(output, factory) == 3
+    longer = output.replace("number 1.", "number 1. With a longer abstract.")
+    index_arxiv_output(longer, factory)
+
+    with factory() as db:
+        assert db.query(Paper).count() == 3
+        assert db.get(Paper, paper_id("sparse autoencoders paper 1")).abstract.endswith("longer abstract.")
+
+
+def test_local_papers_falls_back_when_nothing_matches():
+    tool = LocalPapersTool(session_factory=temp_session_factory())
+
+    assert tool.invoke("protein folding").startswith("No local papers found")
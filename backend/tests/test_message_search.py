@@ -0,0 +1,56 @@
+# backend/tests/test_message_search.py
+"""会话历史检索：相关度排序窗口的上限与截断标记，按时间排序可以遍历全部命中"""
+import uuid
+
+import pytest
+
+from app import database
+from app.config import settings
+
+pytestmark = pytest.mark.skipif(not database.FTS5_AVAILABLE, reason="SQLite 未编译 FTS5")
+
+
+@pytest.fixture
+def term(client):
+    """写入 5 条包含同一个罕见词的用户消息（假工具的结果标题也包含该词，检索时按 role=user 过滤）"""
+    word = f"zebrafish{uuid.uuid4().hex[:8]}"
+    session_id = client.post("/api/chat/sessions", json={"title": "search"}).json()["id"]
+    for i in range(5):
+        response = client.post("/api/chat/message", json={"message": f"{word} regeneration {i}", "session_id": session_id})
+        assert response.status_code == 200, response.text
+    return word
+
+
+def test_relevance_reports_truncation_beyond_rank_window(client, term, monkeypatch):
+    monkeypatch.setattr(settings, "search_rank_window", 3)
+    response = client.get("/api/chat/search", params={"q": term, "role": "user", "limit": 2})
+
+    assert response.headers["X-Search-Rank-Window"] == "3"
+    assert response.headers["X-Search-Truncated"] == "true"
+    second = client.get("/api/chat/search", params={"q": term, "role": "user", "limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    # 只能翻到窗口末尾：窗口内的 3 条命中之后没有下一页
+    assert len(response.json()) + len(second.json()) == 3
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_relevance_within_window_is_complete(client, term, monkeypatch):
+    monkeypatch.setattr(settings, "search_rank_window", 10)
+    response = client.get("/api/chat/search", params={"q": term, "role": "user", "limit": 10})
+
+    assert response.headers["X-Search-Truncated"] == "false"
+    assert len(response.json()) == 5
+
+
+def test_recent_order_reaches_every_hit(client, term, monkeypatch):
+    monkeypatch.setattr(settings, "search_rank_window", 3)
+    hits, cursor = [], None
+    while True:
+        params = {"q": term, "role": "user", "limit": 2, "order": "recent", **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/chat/search", params=params)
+        assert "X-Search-Truncated" not in response.headers
+        hits.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(hits) == 5
@@ -0,0 +1,88 @@
+# backend/tests/test_shared_state.py
+"""共享状态后端：Redis 租约的比较后释放 / 续约是原子的；流事件按批写入共享缓冲"""
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+
+from app.state import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend
+from app.turns import StreamTurn, follow_shared
+from benchmarks.fakes import FakeRedis
+
+
+class CountingBackend(MemoryStateBackend):
+    """记录批量写入次数的进程内后端，按共享后端对待"""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    async def append_events(self, stream, events, ttl):
+        self.batches.append(len(events))
+        await super().append_events(stream, events, ttl)
+
+
+def test_redis_release_keeps_a_lease_taken_over_by_another_owner():
+    async def run():
+        backend = RedisStateBackend(FakeRedis())
+        assert await backend.acquire_lock("session", "first", ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert await backend.acquire_lock("session", "second", ttl=10)
+
+        # 过期的持有者续约和释放都不影响新的持有者
+        assert not await backend.refresh_lock("session", "first", ttl=10)
+        await backend.release_lock("session", "first")
+        assert not await backend.acquire_lock("session", "third", ttl=10)
+
+        assert await backend.refresh_lock("session", "second", ttl=10)
+        await backend.release_lock("session", "second")
+        assert await backend.acquire_lock("session", "third", ttl=10)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "redis"])
+def test_append_events_keeps_order_across_batches(kind):
+    async def run():
+        if kind == "memory":
+            backend = MemoryStateBackend()
+        elif kind == "sqlite":
+            backend = SQLiteStateBackend(os.path.join(tempfile.mkdtemp(), "state.db"))
+        else:
+            backend = RedisStateBackend(FakeRedis())
+        try:
+            await backend.append_events("s", [(1, "a"), (2, "b")], ttl=60)
+            await backend.append_event("s", 3, "c", ttl=60)
+            await backend.append_events("s", [(4, "d")], ttl=60)
+            assert await backend.read_events("s") == [(1, "a"), (2, "b"), (3, "c"), (4, "d")]
+            assert await backend.read_events("s", 2) == [(3, "c"), (4, "d")]
+            assert await backend.stream_state("s") is False
+        finally:
+            await backend.aclose()
+
+    asyncio.run(run())
+
+
+def test_stream_turn_coalesces_shared_writes():
+    async def run():
+        backend = CountingBackend()
+        turn = StreamTurn("turn-coalesce", "session", backend=backend)
+        for i in range(200):
+            await turn.publish({"content": f"t{i} "})
+            await asyncio.sleep(0)
+        await turn.publish({"content": "", "is_final": True}, final=True)
+        await turn.close()
+
+        assert sum(backend.batches) == 201
+        assert len(backend.batches) < 20, backend.batches
+        assert await backend.stream_state(turn.id) is True
+        replayed = [event async for event in follow_shared(turn.id, backend=backend)]
+        assert [event_id for event_id, _ in replayed] == [event_id for event_id, _ in turn.events]
+        assert "".join(data["content"] for _, data in replayed) == turn.content
+        assert json.dumps(replayed[-1][1]) == json.dumps({"content": "", "is_final": True})
+
+    asyncio.run(run())
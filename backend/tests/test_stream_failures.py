@@ -0,0 +1,52 @@
+# backend/tests/test_stream_failures.py
+"""Agent 出错时，流式轮次与后台任务应按失败处理，而不是保存为空的成功答案"""
+import asyncio
+
+from app.database import AsyncSessionLocal
+from app import crud
+from benchmarks.fakes import FakeResearchChatModel
+from tests.support import sse_events
+
+
+class BrokenChatModel(FakeResearchChatModel):
+    """每次调用都失败的模型"""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("model unavailable")
+        yield
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("model unavailable")
+
+
+async def _turn(turn_id: str):
+    async with AsyncSessionLocal() as db:
+        return await crud.aget_turn(db, turn_id)
+
+
+def test_stream_failure_marks_turn_failed(client, use_agent):
+    use_agent(BrokenChatModel())
+    session_id = client.post("/api/chat/sessions", json={"title": "broken"}).json()["id"]
+
+    with client.stream("POST", "/api/chat/stream", json={"message": "hello", "session_id": session_id}) as response:
+        turn_id = response.headers["X-Turn-Id"]
+        events = sse_events(response)
+
+    final = events[-1]
+    assert final["is_final"]
+    assert "model unavailable" in final["content"]
+    assert asyncio.run(_turn(turn_id)).status == "failed"
+    # 只保存了用户消息，没有空的 assistant 消息
+    messages = client.get(f"/api/chat/sessions/{session_id}/messages").json()
+    assert [m["role"] for m in messages] == ["user"]
+
+
+def test_stream_success_marks_turn_completed(client):
+    session_id = client.post("/api/chat/sessions", json={"title": "ok"}).json()["id"]
+
+    with client.stream("POST", "/api/chat/stream", json={"message": "hello", "session_id": session_id}) as response:
+        turn_id = response.headers["X-Turn-Id"]
+        events = sse_events(response)
+
+    assert "".join(e["content"] for e in events if not e["is_final"])
+    assert asyncio.run(_turn(turn_id)).status == "completed"
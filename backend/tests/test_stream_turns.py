@@ -0,0 +1,78 @@
+# backend/tests/test_stream_turns.py
+"""流式轮次的检查点心跳，以及被判定为中断后原进程不再覆盖状态、不重复保存 assistant 消息"""
+import asyncio
+
+from app import api, crud
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.schemas import MessageCreate, SessionCreate
+from app.turns import StreamTurn
+
+
+async def _new_turn():
+    async with AsyncSessionLocal() as db:
+        session = await crud.acreate_session(db, SessionCreate(title="turns"))
+        return session.id, (await crud.acreate_turn(db, session.id)).id
+
+
+async def _turn(turn_id: str):
+    async with AsyncSessionLocal() as db:
+        return await crud.aget_turn(db, turn_id)
+
+
+async def _assistant_messages(session_id: str):
+    async with AsyncSessionLocal() as db:
+        messages = await crud.aget_messages_by_session(db, session_id)
+    return [m for m in messages if m.role == "assistant"]
+
+
+def test_checkpoint_heartbeat_refreshes_idle_turn(monkeypatch):
+    monkeypatch.setattr(settings, "stream_checkpoint_seconds", 0.05)
+
+    async def run():
+        session_id, turn_id = await _new_turn()
+        created = (await _turn(turn_id)).updated_at
+        # 没有任何内容（例如模型在规划或工具调用中）时也定期刷新
+        task = asyncio.create_task(api._checkpoint_stream_turn(StreamTurn(turn_id, session_id)))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        db_turn = await _turn(turn_id)
+        assert db_turn.status == "running"
+        assert db_turn.updated_at > created
+
+    asyncio.run(run())
+
+
+def test_finish_after_interrupt_keeps_interrupted_turn():
+    async def run():
+        session_id, turn_id = await _new_turn()
+        async with AsyncSessionLocal() as db:
+            await crud.acheckpoint_turn(db, turn_id, "partial", 7)
+            assert await crud.ainterrupt_turn(db, await crud.aget_turn(db, turn_id))
+
+        async with AsyncSessionLocal() as db:
+            finished = await crud.afinish_turn(
+                db, turn_id, "completed", "partial answer", 15,
+                message=MessageCreate(session_id=session_id, role="assistant", content="partial answer"),
+            )
+        assert not finished
+        db_turn = await _turn(turn_id)
+        assert (db_turn.status, db_turn.content) == ("interrupted", "partial")
+        assert [m.content for m in await _assistant_messages(session_id)] == ["partial"]
+
+    asyncio.run(run())
+
+
+def test_finish_running_turn_saves_message():
+    async def run():
+        session_id, turn_id = await _new_turn()
+        async with AsyncSessionLocal() as db:
+            assert await crud.afinish_turn(
+                db, turn_id, "completed", "answer", 7,
+                message=MessageCreate(session_id=session_id, role="assistant", content="answer"),
+            )
+        (message,) = await _assistant_messages(session_id)
+        db_turn = await _turn(turn_id)
+        assert (db_turn.status, db_turn.assistant_message_id) == ("completed", message.id)
+
+    asyncio.run(run())
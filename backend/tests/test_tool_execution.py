@@ -0,0 +1,92 @@
+# backend/tests/test_tool_execution.py
+"""工具执行中间件：同一条模型输出中的调用并发执行、结果保持调用顺序、按工具的超时"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.config import settings
+from app.services import AcademicResearchAgentService
+from app.tools import ToolExecutionMiddleware, parse_tool_timeouts
+from benchmarks.fakes import FakeArxivTool, FakeResearchChatModel
+
+QUESTION = "diffusion models for video"
+
+
+class OutOfOrderArxivTool(FakeArxivTool):
+    """后发起的调用先完成：第 i 个调用（查询以 " i" 结尾）休眠 latency * (3 - i) / 3"""
+
+    async def _arun(self, query: str, run_manager=None) -> str:
+        suffix = query.rsplit(" ", 1)[-1]
+        index = int(suffix) if suffix.isdigit() else 0
+        await asyncio.sleep(self.latency * (3 - index) / 3)
+        return self._result(query)
+
+
+def _run_turn(tool: FakeArxivTool, calls: int) -> tuple:
+    """用假模型（一条输出中发起 calls 个 arxiv 调用）跑一轮，返回 (耗时, 结果)"""
+    service = AcademicResearchAgentService(
+        FakeResearchChatModel(think_latency=0.0, token_interval=0.0, tool_calls_per_turn=calls), [tool]
+    )
+    start = time.perf_counter()
+    result = asyncio.run(service.process_message(QUESTION))
+    return time.perf_counter() - start, result
+
+
+@pytest.fixture
+def tool_settings(monkeypatch):
+    def configure(max_concurrency: int, timeout_seconds: float = 30, timeouts: str = "") -> None:
+        monkeypatch.setattr(settings, "tool_max_concurrency", max_concurrency)
+        monkeypatch.setattr(settings, "tool_timeout_seconds", timeout_seconds)
+        monkeypatch.setattr(settings, "tool_timeouts", timeouts)
+    return configure
+
+
+@pytest.mark.parametrize("limit", [1, 3])
+def test_calls_overlap_up_to_the_concurrency_limit(tool_settings, limit):
+    tool_settings(max_concurrency=limit)
+    tool = FakeArxivTool(latency=0.2)
+
+    elapsed, result = _run_turn(tool, calls=3)
+
+    assert tool.calls == 3
+    assert len(json.loads(result["tool_results"])) == 3
+    # 耗时接近 ceil(3 / limit) 个单次调用
+    expected = -(-3 // limit) * 0.2
+    assert expected * 0.95 <= elapsed <= expected + 0.3, elapsed
+
+
+def test_results_keep_call_order_when_calls_finish_out_of_order(tool_settings):
+    tool_settings(max_concurrency=3)
+
+    elapsed, result = _run_turn(OutOfOrderArxivTool(latency=0.3), calls=3)
+
+    tool_calls = json.loads(result["tool_calls"])
+    tool_results = json.loads(result["tool_results"])
+    assert list(tool_results) == [call["id"] for call in tool_calls]
+    for call in tool_calls:
+        assert f"Title: {call['args']['query']} paper 1" in tool_results[call["id"]]
+    assert elapsed < 0.45, elapsed
+
+
+def test_slow_tool_times_out_with_per_tool_override(tool_settings):
+    tool_settings(max_concurrency=1, timeout_seconds=5, timeouts="arxiv=0.1")
+
+    elapsed, result = _run_turn(FakeArxivTool(latency=0.5), calls=1)
+
+    (content,) = json.loads(result["tool_results"]).values()
+    assert content.startswith("Tool 'arxiv' timed out after 0.1s"), content
+    assert elapsed < 0.5, elapsed
+
+
+def test_parse_tool_timeouts_ignores_invalid_entries():
+    assert parse_tool_timeouts("arxiv=20, local_papers=2.5,bad,=3,x=0,y=abc") == {"arxiv": 20.0, "local_papers": 2.5}
+    assert parse_tool_timeouts("") == {}
+
+
+def test_timeout_for_falls_back_to_default():
+    middleware = ToolExecutionMiddleware(max_concurrency=2, timeout_seconds=30, timeouts={"arxiv": 5})
+
+    assert middleware.timeout_for("arxiv") == 5
+    assert middleware.timeout_for("local_papers") == 30